@@ -1,16 +1,26 @@
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import aioredis
 import os
 import asyncio
 from routes import router as api_router
+from utils.yelp_utils import init_yelp_session, close_yelp_session
+from services.reddit_store_service import ensure_reddit_indexes
+from services.model_registry import model_registry, get_model_stats, MODEL_LAZY_LOAD, MODEL_WARMUP
+from services.RAG.indexing_service import (
+    load_index_snapshot, save_index_snapshot, run_periodic_snapshots, run_periodic_eviction
+)
 
 # Load environment variables
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://mongo:27017")
 MONGO_DB_NAME = os.getenv("MONGO_DB", "fastapi_db")
 REDIS_HOST = os.getenv("REDIS_HOST", "redis")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+# Backoff (seconds) while waiting for the inference server (INFERENCE_SERVER_SOCKET) to come up
+INFERENCE_SERVER_RETRY_DELAY = float(os.getenv("INFERENCE_SERVER_RETRY_DELAY", 1))
+INFERENCE_SERVER_RETRY_MAX_DELAY = float(os.getenv("INFERENCE_SERVER_RETRY_MAX_DELAY", 30))
 
 # FastAPI App
 app = FastAPI(
@@ -39,11 +49,39 @@ app.add_middleware(
 mongo_client = None
 db = None
 redis = None
+snapshot_task = None
+eviction_task = None
+models_task = None
+models_ready = False
+
+
+async def prepare_models():
+    """
+    Load (and warm up) every model in the background; /ready passes once done.
+    Behind an inference server, retries with backoff until the server answers.
+    """
+    global models_ready
+    delay = INFERENCE_SERVER_RETRY_DELAY
+    while True:
+        try:
+            await asyncio.to_thread(model_registry.preload, None, MODEL_WARMUP)
+            if os.getenv("INFERENCE_SERVER_SOCKET"):
+                await asyncio.to_thread(model_registry.get("embedder").ping)
+            models_ready = True
+            print("[INFO] Models loaded; worker ready.")
+            return
+        except (ConnectionError, FileNotFoundError) as e:
+            print(f"[WARN] Inference server not reachable ({e}); retrying in {delay:.0f} seconds...")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, INFERENCE_SERVER_RETRY_MAX_DELAY)
+        except Exception as e:
+            print(f"[ERROR] Failed to preload models: {e}")
+            return
 
 
 @app.on_event("startup")
 async def startup_event():
-    global mongo_client, db, redis
+    global mongo_client, db, redis, snapshot_task, eviction_task, models_task, models_ready
     max_retries = 5
     retry_interval = 5  # seconds
 
@@ -67,6 +105,9 @@ async def startup_event():
                 print("[INFO] Creating 'library' collection...")
                 await db.create_collection("library")
 
+            # Reddit post/comment store
+            await ensure_reddit_indexes()
+
             print("[INFO] Connected to MongoDB.")
             break
         except Exception as e:
@@ -88,10 +129,41 @@ async def startup_event():
     else:
         print("[ERROR] Unable to connect to Redis after multiple attempts.")
 
+    # Shared Yelp HTTP client (pooled keep-alive connections)
+    await init_yelp_session()
+    print("[INFO] Yelp HTTP client ready.")
+
+    # Models load from the local cache in parallel while the worker starts up;
+    # with MODEL_LAZY_LOAD=true they load on first use instead
+    if MODEL_LAZY_LOAD:
+        models_ready = True
+    else:
+        models_task = asyncio.create_task(prepare_models())
+
+    # Restore the FAISS index from its last snapshot + append log
+    try:
+        await asyncio.to_thread(load_index_snapshot)
+    except Exception as e:
+        print(f"[ERROR] Failed to load FAISS snapshot: {e}")
+    snapshot_task = asyncio.create_task(run_periodic_snapshots())
+    # Expire stale reviews and keep the index within its memory budget
+    eviction_task = asyncio.create_task(run_periodic_eviction())
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
     global mongo_client, redis
+    if snapshot_task:
+        snapshot_task.cancel()
+    if eviction_task:
+        eviction_task.cancel()
+    if models_task:
+        models_task.cancel()
+    try:
+        await asyncio.to_thread(save_index_snapshot)
+    except Exception as e:
+        print(f"[ERROR] Failed to save FAISS snapshot: {e}")
+
     if mongo_client:
         mongo_client.close()
         print("[INFO] MongoDB connection closed.")
@@ -100,6 +172,9 @@ async def shutdown_event():
         await redis.close()
         print("[INFO] Redis connection closed.")
 
+    await close_yelp_session()
+    print("[INFO] Yelp HTTP client closed.")
+
 
 # Include the centralized router
 app.include_router(api_router)
@@ -108,3 +183,13 @@ app.include_router(api_router)
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the Dish Recommender API"}
+
+
+@app.get("/ready")
+def readiness():
+    """
+    Readiness probe: 503 until the models are loaded (and warmed up).
+    """
+    if not models_ready:
+        return JSONResponse(status_code=503, content={"status": "loading", "models": get_model_stats()})
+    return {"status": "ready"}
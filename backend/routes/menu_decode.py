@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Query, HTTPException
 from models.dish_model import DishModel
 from services.RAG.rag_service import process_rag_pipeline
-from utils.yelp_utils import fetch_yelp_data, fetch_yelp_reviews_for_businesses
+from utils.yelp_utils import fetch_yelp_data, gather_yelp_reviews
 from services.RAG.indexing_service import update_faiss_index
 from services.llm_service import generate_customizations, generate_suggestions
 from asyncio import gather, wait_for, TimeoutError
@@ -24,15 +24,13 @@ async def decode_menu(
 
         yelp_data = await fetch_yelp_data(dish_name, location, limit)
         business_ids = [business["id"] for business in yelp_data]
-        tasks = [fetch_yelp_reviews_for_businesses([business_id]) for business_id in business_ids]
-        yelp_reviews_list = await gather(*tasks)
-        yelp_reviews = [review for sublist in yelp_reviews_list for review in sublist]
+        yelp_reviews = await gather_yelp_reviews(business_ids)
 
         # Update FAISS index
-        update_faiss_index(yelp_reviews)
+        await update_faiss_index(yelp_reviews, [], metadata={"location": location, "dish": dish_name})
 
         # Perform RAG Pipeline
-        response = await process_rag_pipeline(dish_name, yelp_reviews)
+        response = await process_rag_pipeline(dish_name, yelp_reviews, [], filters={"location": location})
         
         # Generate customizations
         customizations, suggestions = await gather(
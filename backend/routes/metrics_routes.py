@@ -0,0 +1,48 @@
+from fastapi import APIRouter
+from utils.rate_limiter import get_rate_limiter_stats
+from services.RAG.embedding_cache import get_embedding_cache_stats
+from services.RAG.document_store import document_store
+from services.RAG.rerank_cache import get_rerank_cache_stats
+from services.model_registry import get_model_stats
+
+router = APIRouter()
+
+
+@router.get("/metrics/rate-limits")
+async def fetch_rate_limit_metrics():
+    """
+    Per-provider rate limiter counters (requests, queued, throttled, retries).
+    """
+    return get_rate_limiter_stats()
+
+
+@router.get("/metrics/embedding-cache")
+async def fetch_embedding_cache_metrics():
+    """
+    Embedding cache hit/miss counters per model.
+    """
+    return get_embedding_cache_stats()
+
+
+@router.get("/metrics/document-store")
+async def fetch_document_store_metrics():
+    """
+    Size of the shared document store (documents, buffer and offset bytes).
+    """
+    return document_store.get_stats()
+
+
+@router.get("/metrics/rerank-cache")
+async def fetch_rerank_cache_metrics():
+    """
+    Cross-encoder score cache hit/miss counters and measured cost per pair.
+    """
+    return get_rerank_cache_stats()
+
+
+@router.get("/metrics/models")
+async def fetch_model_metrics():
+    """
+    Shared models: load time, parameter memory and RSS growth when loaded.
+    """
+    return get_model_stats()
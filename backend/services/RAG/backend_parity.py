@@ -0,0 +1,129 @@
+"""
+Ranking parity and throughput of an ONNX inference backend against the torch baseline.
+
+    python -m services.RAG.backend_parity                                # documents of the index snapshot
+    python -m services.RAG.backend_parity --corpus reviews.txt --backend onnx
+
+Embedder: cosine between torch and candidate vectors, and overlap of each query's
+top-k documents. Cross-encoder: largest score difference and top-k overlap of the
+re-ranked documents. Exits non-zero when an overlap is below --min-overlap.
+"""
+import argparse
+import time
+import numpy as np
+from services.model_registry import (
+    EMBEDDING_MODEL_NAME, CROSS_ENCODER_MODEL_NAME, INFERENCE_BACKENDS,
+    _load_embedder, _load_cross_encoder, with_backend,
+)
+
+PARITY_MIN_OVERLAP = 0.9
+
+
+def top_k_overlap(reference_scores, candidate_scores, k: int) -> float:
+    """
+    Mean share of each row's reference top-k also in the candidate's top-k (scores: queries x documents).
+    """
+    k = min(k, reference_scores.shape[1])
+    reference = np.argsort(-reference_scores, axis=1)[:, :k]
+    candidate = np.argsort(-candidate_scores, axis=1)[:, :k]
+    return float(np.mean([len(set(r) & set(c)) / k for r, c in zip(reference.tolist(), candidate.tolist())]))
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype="float32")
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def _timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def embedder_parity(reference, candidate, queries, documents, k: int = 10) -> dict:
+    reference_documents, reference_seconds = _timed(reference.encode, documents)
+    candidate_documents, candidate_seconds = _timed(candidate.encode, documents)
+    reference_documents, candidate_documents = _normalize(reference_documents), _normalize(candidate_documents)
+    reference_queries, candidate_queries = _normalize(reference.encode(queries)), _normalize(candidate.encode(queries))
+
+    cosines = (reference_documents * candidate_documents).sum(axis=1)
+    return {
+        "min_cosine": round(float(cosines.min()), 4),
+        "mean_cosine": round(float(cosines.mean()), 4),
+        "top_k_overlap": round(top_k_overlap(
+            reference_queries @ reference_documents.T, candidate_queries @ candidate_documents.T, k
+        ), 4),
+        "speedup": round(reference_seconds / max(candidate_seconds, 1e-9), 2),
+    }
+
+
+def cross_encoder_parity(reference, candidate, queries, documents, k: int = 10) -> dict:
+    pairs = [[query, document] for query in queries for document in documents]
+    reference_scores, reference_seconds = _timed(reference.predict, pairs)
+    candidate_scores, candidate_seconds = _timed(candidate.predict, pairs)
+    reference_scores = np.asarray(reference_scores, dtype="float32").reshape(len(queries), len(documents))
+    candidate_scores = np.asarray(candidate_scores, dtype="float32").reshape(len(queries), len(documents))
+
+    return {
+        "max_abs_diff": round(float(np.abs(reference_scores - candidate_scores).max()), 4),
+        "top_k_overlap": round(top_k_overlap(reference_scores, candidate_scores, k), 4),
+        "speedup": round(reference_seconds / max(candidate_seconds, 1e-9), 2),
+    }
+
+
+def parity_report(backend: str, queries, documents, rerank_documents: int = 50, k: int = 10) -> dict:
+    """
+    Load torch and `backend` versions of both models and compare them on the same inputs.
+    """
+    report = {}
+    for kind, name, load_torch, parity, inputs in (
+        ("embedder", EMBEDDING_MODEL_NAME, _load_embedder, embedder_parity, documents),
+        ("cross_encoder", CROSS_ENCODER_MODEL_NAME, _load_cross_encoder, cross_encoder_parity, documents[:rerank_documents]),
+    ):
+        reference = load_torch(name)
+        candidate = with_backend(kind, load_torch, backend)(name)
+        report[kind] = parity(reference, candidate, queries, inputs, k)
+        print(f"[INFO] {kind} {backend} vs torch: {report[kind]}")
+    return report
+
+
+def load_snapshot_texts():
+    """
+    Texts of the persisted index (snapshot + append log).
+    """
+    from . import indexing_service
+    indexing_service.load_index_snapshot()
+    return [document["text"] for document in indexing_service.indexed_data.values()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Text file with one document per line (default: index snapshot)")
+    parser.add_argument("--backend", default="onnx-int8", choices=[b for b in INFERENCE_BACKENDS if b != "torch"])
+    parser.add_argument("--documents", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=20, help="Queries (first words of sampled documents)")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--min-overlap", type=float, default=PARITY_MIN_OVERLAP)
+    args = parser.parse_args()
+
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+    else:
+        texts = load_snapshot_texts()
+    if len(texts) <= args.k:
+        raise SystemExit(f"Need more than {args.k} documents, got {len(texts)}.")
+
+    rng = np.random.default_rng(0)
+    documents = [texts[i] for i in rng.permutation(len(texts))[:args.documents]]
+    queries = [" ".join(texts[i].split()[:6]) for i in rng.choice(len(texts), args.queries)]
+
+    report = parity_report(args.backend, queries, documents, k=args.k)
+    failed = [kind for kind, row in report.items() if row["top_k_overlap"] < args.min_overlap]
+    if failed:
+        raise SystemExit(f"Ranking parity below {args.min_overlap} for: {', '.join(failed)}")
+    print("[INFO] Ranking parity within tolerance.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+import json
+import mmap
+import os
+import tempfile
+import threading
+import numpy as np
+
+# Directory for the store's spill file; "" keeps the buffer in process memory
+DOCUMENT_STORE_DIR = os.getenv("DOCUMENT_STORE_DIR", "data/document_store")
+SAVE_CHUNK = 10000  # Records copied per lock hold when saving a snapshot
+
+
+class DocumentStore:
+    """
+    Compact document store addressed by integer id.
+
+    Each document is one compact JSON record in a contiguous UTF-8 buffer;
+    per-id offsets and lengths live in numpy arrays, so there is no Python
+    object per stored document. The buffer is an anonymous temp file read
+    through mmap (the OS pages it in and out), or a bytearray without a
+    directory. Only the records actually requested are decoded.
+
+    A snapshot written by `save` can be loaded as a read-only mapped base
+    (`load`): its records are shared through the page cache by every process
+    mapping the same file, and only documents added afterwards go to the
+    writable buffer. Offsets below `base_size` point into the base.
+    """
+
+    def __init__(self, directory: str = DOCUMENT_STORE_DIR):
+        self.directory = directory
+        self.lock = threading.RLock()
+        self.offsets = np.zeros(0, dtype="int64")
+        self.lengths = np.zeros(0, dtype="int32")  # -1 = no document for this id
+        self.count = 0
+        self.size = 0  # Bytes used in the buffer
+        self.base = None  # Read-only mapping of a loaded snapshot's records
+        self.base_size = 0
+        self.file = None
+        self.mmap = None
+        self.buffer = None
+        self._open_buffer()
+
+    def _open_buffer(self):
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            self.file = tempfile.TemporaryFile(dir=self.directory)  # Unlinked; freed on exit
+        else:
+            self.buffer = bytearray()
+
+    def _grow(self, document_id: int):
+        if document_id < len(self.offsets):
+            return
+        capacity = max(1024, len(self.offsets) * 2, document_id + 1)
+        offsets = np.zeros(capacity, dtype="int64")
+        lengths = np.full(capacity, -1, dtype="int32")
+        offsets[:len(self.offsets)] = self.offsets
+        lengths[:len(self.lengths)] = self.lengths
+        self.offsets, self.lengths = offsets, lengths
+
+    def _read(self, offset: int, length: int) -> bytes:
+        if offset < self.base_size:
+            return self.base[offset:offset + length]
+        offset -= self.base_size
+        if self.file is None:
+            return bytes(self.buffer[offset:offset + length])
+        if self.mmap is None or offset + length > len(self.mmap):
+            if self.mmap is not None:
+                self.mmap.close()
+            self.mmap = mmap.mmap(self.file.fileno(), self.size, access=mmap.ACCESS_READ)
+        return self.mmap[offset:offset + length]
+
+    def add_many(self, documents):
+        """
+        Store documents (dicts with an integer "id"); an existing id is overwritten.
+        """
+        records = []
+        for document in documents:
+            record = {key: value for key, value in document.items() if key != "id"}
+            records.append((int(document["id"]), json.dumps(record, separators=(",", ":")).encode("utf-8")))
+        self._append_records(records)
+
+    def _append_records(self, records):
+        if not records:
+            return
+        with self.lock:
+            self._grow(max(document_id for document_id, _ in records))
+            if self.file is not None:
+                self.file.seek(self.size)
+            for document_id, data in records:
+                if self.lengths[document_id] < 0:
+                    self.count += 1
+                self.offsets[document_id] = self.base_size + self.size
+                self.lengths[document_id] = len(data)
+                if self.file is not None:
+                    self.file.write(data)
+                else:
+                    self.buffer.extend(data)
+                self.size += len(data)
+            if self.file is not None:
+                self.file.flush()
+
+    def add(self, document: dict):
+        self.add_many([document])
+
+    def get(self, document_id: int):
+        """
+        Decode one document, or None if the id is unknown.
+        """
+        document_id = int(document_id)
+        with self.lock:
+            if not 0 <= document_id < len(self.lengths) or self.lengths[document_id] < 0:
+                return None
+            data = self._read(int(self.offsets[document_id]), int(self.lengths[document_id]))
+        return {**json.loads(data), "id": document_id}
+
+    def get_many(self, ids):
+        """
+        Decode the documents for `ids` in order, skipping unknown ids (e.g. FAISS -1 padding).
+        """
+        documents = [self.get(document_id) for document_id in ids]
+        return [document for document in documents if document is not None]
+
+    def text(self, document_id: int):
+        document = self.get(document_id)
+        return document["text"] if document else None
+
+    def remove(self, ids):
+        """
+        Forget documents; their bytes are reclaimed by `compact`.
+        """
+        with self.lock:
+            for document_id in ids:
+                document_id = int(document_id)
+                if 0 <= document_id < len(self.lengths) and self.lengths[document_id] >= 0:
+                    self.lengths[document_id] = -1
+                    self.count -= 1
+
+    def compact(self):
+        """
+        Rewrite the buffer with only live documents (raw records are copied, not re-encoded).
+        Records in the snapshot base are left where they are.
+        """
+        with self.lock:
+            ids = self.ids()
+            records = [
+                (int(document_id), self._read(int(self.offsets[document_id]), int(self.lengths[document_id])))
+                for document_id in ids[self.offsets[ids] >= self.base_size]
+            ]
+            self._reset_buffer()
+            self._append_records(records)
+
+    def _reset_buffer(self):
+        if self.mmap is not None:
+            self.mmap.close()
+            self.mmap = None
+        if self.file is not None:
+            self.file.close()
+        self.size = 0
+        self._open_buffer()
+
+    def clear(self):
+        with self.lock:
+            self._reset_buffer()
+            if self.base is not None:
+                self.base.close()
+            self.base, self.base_size = None, 0
+            self.offsets = np.zeros(0, dtype="int64")
+            self.lengths = np.zeros(0, dtype="int32")
+            self.count = 0
+
+    def save(self, records_path: str, index_path: str, ids=None):
+        """
+        Write documents (all, or those of `ids` still stored) as a snapshot `load` can map:
+        their raw records back to back in `records_path`, ids and lengths in `index_path`
+        (.npz). Records are copied in chunks that each hold the lock briefly.
+        Returns the saved ids.
+        """
+        ids = self.ids() if ids is None else np.asarray(ids, dtype="int64")
+        saved, lengths = [], []
+        with open(records_path, "wb") as f:
+            for start in range(0, len(ids), SAVE_CHUNK):
+                records = []
+                with self.lock:
+                    for document_id in ids[start:start + SAVE_CHUNK].tolist():
+                        if document_id in self:
+                            length = int(self.lengths[document_id])
+                            records.append(self._read(int(self.offsets[document_id]), length))
+                            saved.append(document_id)
+                            lengths.append(length)
+                f.writelines(records)
+        saved = np.asarray(saved, dtype="int64")
+        np.savez(index_path, ids=saved, lengths=np.asarray(lengths, dtype="int32"))
+        return saved
+
+    def load(self, records_path: str, index_path: str):
+        """
+        Replace the contents with a snapshot written by `save`, memory-mapping its
+        records read-only. Returns the snapshot's ids.
+        """
+        with np.load(index_path) as arrays:
+            ids, lengths = arrays["ids"], arrays["lengths"]
+        with self.lock:
+            self.clear()
+            with open(records_path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if size:
+                    self.base = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+            self.base_size = size
+            if len(ids):
+                self._grow(int(ids.max()))
+                self.offsets[ids] = np.cumsum(lengths, dtype="int64") - lengths
+                self.lengths[ids] = lengths
+            self.count = len(ids)
+        return ids
+
+    def rebase(self, records_path: str, index_path: str):
+        """
+        Switch to a snapshot just saved from this store: its documents are read from
+        the new mapping, documents added since move to a fresh buffer, and documents
+        removed since stay removed.
+        """
+        with self.lock:
+            live = self.ids()
+            with np.load(index_path) as arrays:
+                added = np.setdiff1d(live, arrays["ids"], assume_unique=True)
+            records = [
+                (int(document_id), self._read(int(self.offsets[document_id]), int(self.lengths[document_id])))
+                for document_id in added
+            ]
+            saved = self.load(records_path, index_path)
+            self.remove(np.setdiff1d(saved, live, assume_unique=True))
+            self._append_records(records)
+
+    def ids(self):
+        with self.lock:
+            return np.flatnonzero(self.lengths >= 0)
+
+    def values(self):
+        """
+        Iterate over all stored documents (decoded one at a time).
+        """
+        for document_id in self.ids():
+            document = self.get(document_id)
+            if document is not None:
+                yield document
+
+    def __getitem__(self, document_id: int) -> dict:
+        document = self.get(document_id)
+        if document is None:
+            raise KeyError(document_id)
+        return document
+
+    def __contains__(self, document_id) -> bool:
+        document_id = int(document_id)
+        return 0 <= document_id < len(self.lengths) and self.lengths[document_id] >= 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def get_stats(self) -> dict:
+        live = self.lengths >= 0
+        buffered = live & (self.offsets >= self.base_size)
+        return {
+            "documents": self.count,
+            "buffer_bytes": self.size,
+            "snapshot_bytes": self.base_size,
+            "live_bytes": int(self.lengths[live].sum()),
+            "buffer_live_bytes": int(self.lengths[buffered].sum()),
+            "index_bytes": self.offsets.nbytes + self.lengths.nbytes,
+            "backend": "mmap" if self.file is not None else "memory",
+        }
+
+
+# Shared by the FAISS (indexing_service) and BM25 (bm25_utils) paths
+document_store = DocumentStore()
@@ -0,0 +1,301 @@
+import fcntl
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "data/embedding_cache")
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", 50000))  # In-process LRU entries
+# Rows kept in the persistent store; past it the store is compacted to its newest half. 0 = unbounded
+EMBEDDING_CACHE_MAX_ROWS = int(os.getenv("EMBEDDING_CACHE_MAX_ROWS", 200000))
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache of text embeddings for one model, keyed by text hash:
+    an in-process LRU of float32 vectors in front of a persistent,
+    memory-mapped float16 store shared by every process on the host.
+
+    Persistent layout (per model directory):
+      generation      - number <g> of the live store files, replaced atomically on compaction
+      vectors-<g>.f16 - rows of `dimension` float16 values
+      keys-<g>.txt    - "<text hash> <row>" per line, appended after the row is written
+      lock            - flock held by whichever worker appends to or compacts the store
+
+    An append that would take the store past `max_rows` first compacts it into a new
+    generation holding its newest `max_rows // 2` rows. Other workers switch to the new
+    generation (reloading its keys) on their next append or remap.
+    """
+
+    def __init__(self, model_name: str, dimension: int, cache_dir: str = EMBEDDING_CACHE_DIR,
+                 lru_size: int = EMBEDDING_CACHE_SIZE, max_rows: int = EMBEDDING_CACHE_MAX_ROWS):
+        self.model_name = model_name
+        self.dimension = dimension
+        self.lru_size = lru_size
+        self.max_rows = max_rows
+        self.lru = OrderedDict()
+        self.rows = {}  # text hash -> row in the live vectors file
+        self.mmap = None
+        self.generation = 0
+        self.compactions = 0
+        self.lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+        self.directory = None
+        if cache_dir:
+            self.directory = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+            os.makedirs(self.directory, exist_ok=True)
+            with self._file_lock():
+                self._switch_generation(self._read_generation())
+                self._remove_stale_files()
+
+    def _store_path(self, kind: str, generation: int = None):
+        generation = self.generation if generation is None else generation
+        file_name = f"vectors-{generation}.f16" if kind == "vectors" else f"keys-{generation}.txt"
+        return os.path.join(self.directory, file_name)
+
+    @property
+    def _vectors_path(self):
+        return self._store_path("vectors")
+
+    @property
+    def _keys_path(self):
+        return self._store_path("keys")
+
+    @property
+    def _generation_path(self):
+        return os.path.join(self.directory, "generation")
+
+    @property
+    def _row_bytes(self):
+        return 2 * self.dimension
+
+    def _stored_rows(self) -> int:
+        return os.path.getsize(self._vectors_path) // self._row_bytes if os.path.exists(self._vectors_path) else 0
+
+    @contextmanager
+    def _file_lock(self):
+        """
+        Exclusive lock on the persistent store, shared with other workers on the host.
+        """
+        with open(os.path.join(self.directory, "lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_generation(self) -> int:
+        try:
+            with open(self._generation_path, encoding="utf-8") as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _switch_generation(self, generation: int):
+        """
+        Use `generation`'s files, repairing and reloading their keys (caller holds the file lock).
+        """
+        self.generation = generation
+        self.rows = {}
+        self.mmap = None
+        self._repair_torn_writes()
+        self._load_keys()
+
+    def _remove_stale_files(self):
+        """
+        Delete store files of other generations: older ones, or a compaction that crashed
+        before switching (caller holds the file lock). Open memory maps stay valid.
+        """
+        live = {"lock", "generation", os.path.basename(self._vectors_path), os.path.basename(self._keys_path)}
+        for file_name in os.listdir(self.directory):
+            if file_name not in live:
+                os.remove(os.path.join(self.directory, file_name))
+
+    def _repair_torn_writes(self):
+        """
+        Undo a crash mid-append (caller holds the file lock): truncate a partial row
+        off the vectors file so rows stay aligned with their keys, and end a partial key line.
+        """
+        if os.path.exists(self._vectors_path):
+            size = os.path.getsize(self._vectors_path)
+            if size % self._row_bytes:
+                os.truncate(self._vectors_path, size - size % self._row_bytes)
+                print(f"[WARN] Dropped a partial row from the '{self.model_name}' embedding cache.")
+        if os.path.exists(self._keys_path) and os.path.getsize(self._keys_path):
+            with open(self._keys_path, "rb+") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+
+    def _read_keys(self, first_row: int = 0) -> dict:
+        """
+        Text hash -> row for the stored rows from `first_row` on (the last entry of a key wins).
+        """
+        rows = {}
+        if not os.path.exists(self._keys_path):
+            return rows
+        available = self._stored_rows()
+        with open(self._keys_path, encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2 and first_row <= int(parts[1]) < available:
+                    rows[parts[0]] = int(parts[1])
+        return rows
+
+    def _load_keys(self):
+        self.rows = self._read_keys()
+
+    def _read_row(self, row: int):
+        """
+        Stored vector at `row`, or None when another worker's compaction moved it.
+        """
+        if self.mmap is None or row >= self.mmap.shape[0]:
+            with self._file_lock():
+                generation = self._read_generation()
+                if generation != self.generation:
+                    self._switch_generation(generation)
+                    return None
+                self.mmap = np.memmap(
+                    self._vectors_path, dtype="float16", mode="r", shape=(self._stored_rows(), self.dimension)
+                )
+        return np.asarray(self.mmap[row], dtype="float32")
+
+    def _compact(self, keep: int):
+        """
+        Rewrite the store as a new generation holding its newest `keep` rows (caller holds the file lock).
+        """
+        total = self._stored_rows()
+        first_row = max(total - keep, 0)
+        kept = sorted(self._read_keys(first_row).items(), key=lambda item: item[1])
+        vectors = np.fromfile(
+            self._vectors_path, dtype="float16", count=(total - first_row) * self.dimension, offset=first_row * self._row_bytes
+        ).reshape(-1, self.dimension) if kept else np.zeros((0, self.dimension), dtype="float16")
+
+        generation = self.generation + 1
+        with open(self._store_path("vectors", generation), "wb") as f:
+            f.write(vectors[[row - first_row for _, row in kept]].tobytes())
+        with open(self._store_path("keys", generation), "w", encoding="utf-8") as f:
+            f.write("".join(f"{key} {row}\n" for row, (key, _) in enumerate(kept)))
+        with open(self._generation_path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(str(generation))
+        os.replace(self._generation_path + ".tmp", self._generation_path)
+
+        self._switch_generation(generation)
+        self._remove_stale_files()
+        self.compactions += 1
+        print(f"[INFO] Compacted the '{self.model_name}' embedding cache from {total} to {len(kept)} rows.")
+
+    def _append(self, keys, vectors):
+        """
+        Append vectors not stored yet to the persistent store. A file lock keeps concurrent
+        writers (other workers) from interleaving rows or appending during a compaction.
+        """
+        if self.max_rows:
+            keys, vectors = keys[-self.max_rows:], vectors[-self.max_rows:]
+        with self._file_lock():
+            generation = self._read_generation()
+            if generation != self.generation:
+                self._switch_generation(generation)
+            else:
+                self._repair_torn_writes()
+
+            new = [i for i, key in enumerate(keys) if key not in self.rows]
+            if not new:
+                return
+            if self.max_rows and self._stored_rows() + len(new) > self.max_rows:
+                self._compact(min(self.max_rows // 2, self.max_rows - len(new)))
+
+            with open(self._vectors_path, "ab") as vectors_file:
+                first_row = vectors_file.tell() // self._row_bytes
+                vectors_file.write(np.asarray(vectors, dtype="float16")[new].tobytes())
+            with open(self._keys_path, "a", encoding="utf-8") as keys_file:
+                keys_file.write("".join(f"{keys[i]} {first_row + row}\n" for row, i in enumerate(new)))
+            for row, i in enumerate(new):
+                self.rows[keys[i]] = first_row + row
+
+    def _remember(self, key, vector):
+        self.lru[key] = vector
+        self.lru.move_to_end(key)
+        while len(self.lru) > self.lru_size:
+            self.lru.popitem(last=False)
+
+    @staticmethod
+    def text_key(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def encode(self, model, texts, persist: bool = True, **kwargs):
+        """
+        Embed `texts` with `model`, encoding only the cache misses (in one batch).
+        With `persist=False` (one-off query encodes), misses stay in the in-process
+        LRU and are never written to the persistent store.
+        Returns a float32 array with one row per text.
+        """
+        keys = [self.text_key(text) for text in texts]
+        vectors = [None] * len(texts)
+        missing = {}
+
+        with self.lock:
+            for position, key in enumerate(keys):
+                if key in self.lru:
+                    self.lru.move_to_end(key)
+                    vectors[position] = self.lru[key]
+                    self.stats["memory_hits"] += 1
+                    continue
+                vector = self._read_row(self.rows[key]) if key in self.rows else None
+                if vector is not None:
+                    vectors[position] = vector
+                    self._remember(key, vector)
+                    self.stats["disk_hits"] += 1
+                else:
+                    missing.setdefault(key, []).append(position)
+                    self.stats["misses"] += 1
+
+        if missing:
+            miss_keys = list(missing)
+            miss_texts = [texts[missing[key][0]] for key in miss_keys]
+            encoded = np.asarray(model.encode(miss_texts, convert_to_tensor=False, **kwargs), dtype="float32")
+
+            with self.lock:
+                for key, vector in zip(miss_keys, encoded):
+                    for position in missing[key]:
+                        vectors[position] = vector
+                    self._remember(key, vector)
+                if self.directory and persist:
+                    self._append(miss_keys, encoded)
+
+        if not vectors:
+            return np.zeros((0, self.dimension), dtype="float32")
+        return np.vstack(vectors)
+
+    def get_stats(self) -> dict:
+        lookups = sum(self.stats.values())
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        return {
+            **self.stats,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self.lru),
+            "disk_entries": len(self.rows),
+            "compactions": self.compactions,
+        }
+
+
+embedding_caches = {}
+
+
+def get_embedding_cache(model_name: str, dimension: int, backend: str = "torch") -> EmbeddingCache:
+    """
+    Retrieve (or create) the shared cache for a model on an inference backend.
+    ONNX fp32 / int8 vectors differ slightly from torch ones, so each backend gets its own cache.
+    """
+    name = model_name if backend == "torch" else f"{model_name}-{backend}"
+    if name not in embedding_caches:
+        embedding_caches[name] = EmbeddingCache(name, dimension)
+    return embedding_caches[name]
+
+
+def get_embedding_cache_stats() -> dict:
+    return {name: cache.get_stats() for name, cache in embedding_caches.items()}
@@ -1,23 +1,443 @@
+import base64
 import faiss
+import hashlib
+import json
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from asyncio import create_task , gather ,to_thread,wait_for
+import os
+import re
+import shutil
+import threading
+import time
+from datetime import datetime
+from asyncio import create_task , gather ,to_thread,wait_for, sleep
+from .embedding_cache import get_embedding_cache
+from .document_store import document_store
+from .snapshot_index import SnapshotIndex, single_list_index
+from services.model_registry import EMBEDDING_BACKEND, EMBEDDING_MODEL_NAME, get_embedder
+from utils.bm25_utils import (
+    bm25_index, add_to_bm25_index, remove_from_bm25_index, save_bm25_index, load_bm25_index
+)
 
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-dimension = 384
-faiss_index = faiss.IndexFlatL2(dimension)  # L2 distance for similarity search
-indexed_data = []
+dimension = 384  # all-MiniLM-L6-v2
+embedding_cache = get_embedding_cache(EMBEDDING_MODEL_NAME, dimension, EMBEDDING_BACKEND)
+
+
+def encode_texts(texts, persist=True):
+    """
+    Embed texts through the embedding cache; only unseen texts hit the model.
+    One-off query encodes pass `persist=False`, keeping them out of the on-disk store.
+    """
+    return embedding_cache.encode(get_embedder(), list(texts), persist=persist)
+
+# Index backend: exact flat search, or an ANN mode the flat index is promoted to
+# once the corpus passes INDEX_PROMOTION_THRESHOLD documents
+INDEX_MODES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+INDEX_MODE = os.getenv("INDEX_MODE", "flat")
+INDEX_PROMOTION_THRESHOLD = int(os.getenv("INDEX_PROMOTION_THRESHOLD", 50000))
+INDEX_TRAIN_SAMPLE = int(os.getenv("INDEX_TRAIN_SAMPLE", 100000))  # Max vectors used to train IVF/PQ
+IVF_NLIST = int(os.getenv("IVF_NLIST", 0))  # 0 = derive from corpus size
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", 16))
+PQ_M = int(os.getenv("PQ_M", 48))  # Sub-quantizers; must divide the dimension
+PQ_NBITS = int(os.getenv("PQ_NBITS", 8))
+HNSW_M = int(os.getenv("HNSW_M", 32))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", 80))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", 64))
+
+# Vector storage: full float32, float16 / 8-bit scalar quantized, or PQ codes
+# (384 dims: 1536 / 768 / 384 / PQ_M bytes per vector). sq8 and pq need training,
+# so they start as exact float32 and are converted at INDEX_PROMOTION_THRESHOLD.
+INDEX_STORAGES = ("float32", "float16", "sq8", "pq")
+INDEX_STORAGE = os.getenv("INDEX_STORAGE", "float32")
+
+if INDEX_MODE not in INDEX_MODES:
+    raise ValueError(f"INDEX_MODE must be one of {INDEX_MODES}, got '{INDEX_MODE}'.")
+if INDEX_STORAGE not in INDEX_STORAGES:
+    raise ValueError(f"INDEX_STORAGE must be one of {INDEX_STORAGES}, got '{INDEX_STORAGE}'.")
+
+
+def ivf_nlist(ntotal: int) -> int:
+    """
+    Number of IVF lists: IVF_NLIST, or ~4*sqrt(n) with at least 39 training points per list.
+    """
+    nlist = IVF_NLIST or int(4 * np.sqrt(max(ntotal, 1)))
+    return max(1, min(nlist, ntotal // 39 or 1))
+
+
+def storage_codec(storage: str) -> str:
+    """
+    index_factory codec for an INDEX_STORAGES entry.
+    """
+    return {
+        "float32": "Flat",
+        "float16": "SQfp16",
+        "sq8": "SQ8",
+        "pq": f"PQ{PQ_M}x{PQ_NBITS}",
+    }[storage]
+
+
+def code_bytes(storage: str) -> int:
+    """
+    Bytes per stored vector for a storage format.
+    """
+    return {
+        "float32": dimension * 4,
+        "float16": dimension * 2,
+        "sq8": dimension,
+        "pq": PQ_M * PQ_NBITS // 8,
+    }[storage]
+
+
+def create_index(mode: str = "flat", ntotal: int = 0, storage: str = INDEX_STORAGE):
+    """
+    Build an empty (possibly untrained) index for `mode` holding `storage` codes.
+    Every mode accepts add_with_ids, so FAISS ids are always document ids.
+    """
+    if mode == "flat":
+        return faiss.index_factory(dimension, f"IDMap2,{storage_codec(storage)}")
+    if mode == "hnsw":
+        index = faiss.index_factory(dimension, f"IDMap2,HNSW{HNSW_M},{storage_codec(storage)}")
+        faiss.downcast_index(index.index).hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        return index
+
+    # IVF indexes keep ids natively (IDMap's compacting remove would desync them)
+    codec = f"PQ{PQ_M}x{PQ_NBITS}" if mode == "ivf_pq" else storage_codec(storage)
+    index = faiss.index_factory(dimension, f"IVF{ivf_nlist(ntotal)},{codec}")
+    index.set_direct_map_type(faiss.DirectMap.Hashtable)  # reconstruct + remove by id
+    return index
+
+
+def build_index(mode: str, storage: str, ids, vectors):
+    """
+    Create, train (on a sample) and fill an index with `vectors` under `ids`.
+    """
+    index = create_index(mode, len(ids), storage)
+    if not index.is_trained:
+        sample = np.random.default_rng(0).choice(len(vectors), min(len(vectors), INDEX_TRAIN_SAMPLE), replace=False)
+        index.train(vectors[sample])
+    if len(ids):
+        index.add_with_ids(vectors, ids)
+    return index
+
+
+def initial_index():
+    """
+    Empty index for a fresh process: flat, with INDEX_STORAGE codes unless they need training.
+    """
+    storage = INDEX_STORAGE if INDEX_STORAGE in ("float32", "float16") else "float32"
+    return create_index("flat", storage=storage)
+
+
+def _inner_index(index):
+    return faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+
+
+def index_mode(index) -> str:
+    """
+    Detect which INDEX_MODES entry an index was built with.
+    """
+    if isinstance(index, SnapshotIndex):
+        return index.mode
+    inner = _inner_index(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(inner, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def index_storage(index) -> str:
+    """
+    Detect which INDEX_STORAGES entry an index stores its vectors as.
+    """
+    if isinstance(index, SnapshotIndex):
+        return index.storage
+    inner = _inner_index(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        inner = faiss.downcast_index(inner.storage)
+    if isinstance(inner, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return "pq"
+    if isinstance(inner, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return "float16" if inner.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    return "float32"
+
+
+# L2 distance for similarity search; FAISS ids map to document ids (not list positions)
+faiss_index = initial_index()
+indexed_data = document_store  # document id -> document (compact store shared with BM25)
+promotion_thread = None
+
+# Location partitions: normalized location -> ids of documents collected for it
+partitions = {}
 BATCH_SIZE = 100  # Batch size for indexing
 
+# Dedup keys (content hash and source id) -> document id
+known_documents = {}
+next_document_id = 0
+
+# Guards faiss_index / indexed_data against concurrent add (worker threads) and search
+index_lock = threading.RLock()
+
+# On-disk snapshots (index + documents) plus an append log of adds since the last snapshot
+INDEX_SNAPSHOT_DIR = os.getenv("INDEX_SNAPSHOT_DIR", "data/index_snapshot")
+INDEX_SNAPSHOT_INTERVAL = int(os.getenv("INDEX_SNAPSHOT_INTERVAL", 600))  # seconds
+APPEND_LOG = "append.log"
+ROTATED_APPEND_LOG = "append.log.rotated"
+append_log = None
+
+# Memory budget: once exceeded, documents are evicted least-recently-retrieved first, oldest first
+INDEX_MAX_DOCUMENTS = int(os.getenv("INDEX_MAX_DOCUMENTS", 0))  # 0 = unbounded
+INDEX_MAX_MEMORY_MB = float(os.getenv("INDEX_MAX_MEMORY_MB", 0))  # Vectors + document store; 0 = unbounded
+INDEX_DOCUMENT_TTL = int(os.getenv("INDEX_DOCUMENT_TTL", 0))  # Max review/comment age in seconds; 0 = keep forever
+INDEX_EVICTION_HEADROOM = float(os.getenv("INDEX_EVICTION_HEADROOM", 0.1))  # Evict down to 90% of the budget
+INDEX_EVICTION_INTERVAL = int(os.getenv("INDEX_EVICTION_INTERVAL", 300))  # seconds
+
+# Per-id eviction bookkeeping (numpy, indexed by document id)
+document_times = np.zeros(0, dtype="float64")  # Review/comment time, else when it was indexed
+last_retrieved = np.zeros(0, dtype="float64")  # 0 = never returned by a search
+eviction_thread = None
+eviction_lock = threading.Lock()  # One eviction pass at a time
+
+# Evicted ids whose vectors are still in a flat / HNSW index: searches skip them
+# until compact_index rebuilds the index without them and swaps it in
+dead_ids = set()
+dead_selector = None
+INDEX_COMPACTION_CHUNK = int(os.getenv("INDEX_COMPACTION_CHUNK", 16384))  # Vectors copied per index_lock hold
+
+
+def normalize_text(text: str) -> str:
+    """
+    Collapse whitespace in a review/comment body. Returns "" for empty text.
+    """
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+def content_hash(text: str) -> str:
+    """
+    Stable hash of a document's normalized, lower-cased text.
+    """
+    return hashlib.sha1(normalize_text(text).lower().encode("utf-8")).hexdigest()
+
+
+def location_key(location: str) -> str:
+    """
+    Partition key for a location ("Austin, TX " -> "austin, tx").
+    """
+    return normalize_text(location).lower()
+
+
+def _item_timestamp(item: dict):
+    """
+    Epoch seconds from a Reddit `created_at` or a Yelp `time_created` ("YYYY-MM-DD HH:MM:SS").
+    """
+    value = item.get("created_at") or item.get("created_utc") or item.get("time_created")
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return datetime.strptime(value, "%Y-%m-%d %H:%M:%S").timestamp()
+        except ValueError:
+            return None
+    return None
+
+
+def make_document(item: dict, source: str, metadata: dict = None):
+    """
+    Build an indexable document from a Yelp review ("text") or Reddit comment ("body").
+    `metadata` adds request context shared by every item (location, dish).
+    Returns None for empty text.
+    """
+    text = normalize_text(item.get("text") or item.get("body"))
+    if not text:
+        return None
+    metadata = metadata or {}
+    return {
+        "text": text,
+        "source": source,
+        "source_id": item.get("id"),
+        "hash": content_hash(text),
+        "business_id": item.get("business_id"),
+        "location": metadata.get("location"),
+        "dish": metadata.get("dish"),
+        "score": item.get("rating", item.get("score")),
+        "timestamp": _item_timestamp(item),
+    }
+
+
+def build_documents(yelp_reviews, reddit_comments, metadata: dict = None):
+    documents = [make_document(review, "yelp", metadata) for review in yelp_reviews or []] + \
+                [make_document(comment, "reddit", metadata) for comment in reddit_comments or []]
+    return [document for document in documents if document]
+
+
+def _document_keys(document):
+    keys = [f"hash:{document['hash']}"]
+    if document.get("source_id"):
+        keys.append(f"{document['source']}:{document['source_id']}")
+    return keys
+
+
+def filter_new_documents(documents):
+    """
+    Drop documents already in the index (by content hash or source id),
+    including repeats within the batch itself.
+    """
+    new_documents, seen = [], set()
+    with index_lock:
+        for document in documents:
+            keys = _document_keys(document)
+            if any(key in known_documents or key in seen for key in keys):
+                continue
+            seen.update(keys)
+            new_documents.append(document)
+    return new_documents
+
+
+def _partition_documents(document):
+    if document.get("location"):
+        partitions.setdefault(location_key(document["location"]), set()).add(document["id"])
+
+
+def _track_documents(documents):
+    """
+    Record the age of newly indexed documents for eviction (caller holds index_lock).
+    """
+    global document_times, last_retrieved
+
+    ids = [document["id"] for document in documents]
+    if max(ids) >= len(document_times):
+        capacity = max(1024, len(document_times) * 2, max(ids) + 1)
+        document_times = np.concatenate([document_times, np.zeros(capacity - len(document_times))])
+        last_retrieved = np.concatenate([last_retrieved, np.zeros(capacity - len(last_retrieved))])
+    for document in documents:
+        document_times[document["id"]] = document.get("timestamp") or document.get("indexed_at") or time.time()
+        last_retrieved[document["id"]] = 0
+
+
+def matching_ids(filters: dict):
+    """
+    Ids of documents matching every filter. `location` narrows to its partition;
+    other keys (source, business_id, dish, ...) are matched on document metadata.
+    """
+    with index_lock:
+        filters = dict(filters)
+        if filters.get("location"):
+            candidates = partitions.get(location_key(filters.pop("location")), set())
+        else:
+            filters.pop("location", None)
+            candidates = indexed_data.ids().tolist()
+
+        if not filters:
+            return set(candidates)
+        return {
+            document["id"] for document in indexed_data.get_many(candidates)
+            if all(document.get(field) == value for field, value in filters.items())
+        }
+
+
+def _id_selector(ids):
+    """
+    FAISS selector for a set of document ids: a bitmap when the set is dense,
+    a hashed batch otherwise.
+    """
+    ids = np.fromiter(ids, dtype="int64", count=len(ids))
+    if len(ids) * 64 >= next_document_id:
+        bitmap = np.zeros(next_document_id, dtype=bool)
+        bitmap[ids] = True
+        packed = np.packbits(bitmap, bitorder="little")
+        selector = faiss.IDSelectorBitmap(len(packed), faiss.swig_ptr(packed))  # n is the byte length
+        selector.packed = packed  # Keep the buffer alive as long as the selector
+        return selector
+    return faiss.IDSelectorBatch(ids)
+
+
+def _dead_id_selector():
+    """
+    Selector excluding dead ids, rebuilt only when the dead set changes (caller holds index_lock).
+    """
+    global dead_selector
+
+    if dead_selector is None:
+        excluded = faiss.IDSelectorBatch(np.fromiter(dead_ids, dtype="int64", count=len(dead_ids)))
+        dead_selector = faiss.IDSelectorNot(excluded)
+        dead_selector.excluded = excluded  # Keep the inner selector alive
+    return dead_selector
+
+
+def search_parameters(index, nprobe: int = None, ef_search: int = None, selector=None):
+    """
+    Per-query search parameters for the index's mode (None for unfiltered flat).
+    """
+    mode = index_mode(index)
+    if mode == "hnsw":
+        params = faiss.SearchParametersHNSW(efSearch=ef_search or HNSW_EF_SEARCH)
+    elif mode in ("ivf_flat", "ivf_pq"):
+        params = faiss.SearchParametersIVF(nprobe=nprobe or IVF_NPROBE)
+    elif selector is not None:
+        params = faiss.SearchParameters()
+    else:
+        return None
+
+    if selector is not None:
+        params.sel = selector
+    return params
+
+
+def search_index(query_embeddings, k: int, nprobe: int = None, ef_search: int = None, filters: dict = None):
+    """
+    Search the current index. `nprobe` (IVF) and `ef_search` (HNSW) override the defaults.
+    `filters` (e.g. {"location": "Austin"}) restrict the search to matching documents.
+    Returns FAISS (distances, ids).
+    """
+    query_embeddings = np.asarray(query_embeddings, dtype="float32")
+    with index_lock:
+        selector = None
+        if filters:
+            # Partitions and metadata only hold live documents, so dead ids are excluded too
+            ids = matching_ids(filters)
+            if not ids:
+                empty = np.full((len(query_embeddings), k), -1, dtype="int64")
+                return np.full(empty.shape, np.inf, dtype="float32"), empty
+            selector = _id_selector(ids)
+        elif dead_ids:
+            selector = _dead_id_selector()
+
+        params = search_parameters(faiss_index, nprobe, ef_search, selector)
+        if params is None:
+            return faiss_index.search(query_embeddings, k)
+        return faiss_index.search(query_embeddings, k, params=params)
+
+
+def get_documents(ids):
+    """
+    Look up documents by FAISS id, skipping padding (-1) and unknown ids.
+    Marks them as retrieved, which protects them from LRU eviction.
+    """
+    with index_lock:
+        documents = indexed_data.get_many(ids)
+        if documents:
+            last_retrieved[[document["id"] for document in documents]] = time.time()
+        return documents
+
+
+def get_vectors(ids):
+    """
+    Reconstruct the stored vectors for FAISS ids (PQ modes return the decoded approximation).
+    Returns a float32 array with one row per id.
+    """
+    ids = np.asarray(ids, dtype="int64")
+    if not len(ids):
+        return np.zeros((0, dimension), dtype="float32")
+    with index_lock:
+        return faiss_index.reconstruct_batch(ids)
+
 
 async def async_index_data(yelp_reviews, reddit_comments):
     """
     Asynchronous FAISS indexing with batch processing.
     """
-    global indexed_data
-
-    data = [review["text"] for review in yelp_reviews] + \
-           [comment["body"] for comment in reddit_comments]
+    data = filter_new_documents(build_documents(yelp_reviews, reddit_comments))
 
     if not data:
         print("No data to index in FAISS.")
@@ -44,16 +464,12 @@ async def process_and_index_batch(batch):
     """
     Process embeddings and add them to FAISS asynchronously.
     """
-    global indexed_data
-
     # Generate embeddings asynchronously
-    embeddings = await to_thread(embedding_model.encode, batch, convert_to_tensor=False)
+    texts = [document["text"] for document in batch]
+    embeddings = await to_thread(encode_texts, texts)
     
     # Perform FAISS indexing in a separate thread
-    await to_thread(faiss_index.add, np.array(embeddings))
-
-    # Update indexed data
-    indexed_data.extend(batch)
+    await to_thread(add_to_index, batch, embeddings)
     print(f"Indexed {len(batch)} items. Total items: {len(indexed_data)}.")
 
 async def index_data(yelp_reviews, reddit_comments):
@@ -80,18 +496,633 @@ def get_faiss_index():
     return faiss_index
 
 
-async def update_faiss_index(yelp_reviews, reddit_comments):
-    global indexed_data
-
-    data = [review["text"] for review in yelp_reviews] + \
-           [comment["body"] for comment in reddit_comments]
+async def update_faiss_index(yelp_reviews, reddit_comments, metadata: dict = None):
+    data = filter_new_documents(build_documents(yelp_reviews, reddit_comments, metadata))
 
     print(f"Indexing {len(data)} new items...")
 
     if not data:
         return
 
-    embeddings = embedding_model.encode(data, convert_to_tensor=False)
-    faiss_index.add(np.array(embeddings))
-    indexed_data.extend(data)
+    embeddings = await to_thread(encode_texts, [document["text"] for document in data])
+    await to_thread(add_to_index, data, embeddings)
     print(f"Indexed {len(data)} new items. FAISS index size: {faiss_index.ntotal} items.")
+
+
+def add_to_index(documents, embeddings):
+    """
+    Add pre-computed embeddings and their documents to the FAISS index,
+    skipping documents that are already known. Safe to call from a worker thread.
+    Returns the ids assigned to the newly added documents.
+    """
+    global next_document_id
+
+    with index_lock:
+        keep, added = [], []
+        for position, document in enumerate(documents):
+            keys = _document_keys(document)
+            if any(key in known_documents for key in keys):
+                continue
+            document_id = next_document_id
+            next_document_id += 1
+            for key in keys:
+                known_documents[key] = document_id
+            added.append({**document, "id": document_id, "indexed_at": time.time()})
+            _partition_documents(added[-1])
+            keep.append((position, document_id))
+
+        if not keep:
+            return []
+
+        indexed_data.add_many(added)
+        _track_documents(added)
+        add_to_bm25_index(added)
+        positions, ids = zip(*keep)
+        vectors = np.asarray(embeddings, dtype="float32")[list(positions)]
+        faiss_index.add_with_ids(vectors, np.asarray(ids, dtype="int64"))
+        _log_added(added, vectors)
+        maybe_promote_index()
+        maybe_evict_documents()
+        return list(ids)
+
+
+def target_storage(mode: str = INDEX_MODE) -> str:
+    return "pq" if mode == "ivf_pq" else INDEX_STORAGE
+
+
+def maybe_promote_index():
+    """
+    Start promoting the flat index to INDEX_MODE / INDEX_STORAGE in the background
+    once it is large enough (enough vectors to train IVF / SQ8 / PQ).
+    """
+    global promotion_thread
+
+    if faiss_index.ntotal < INDEX_PROMOTION_THRESHOLD or index_mode(faiss_index) != "flat":
+        return
+    if (INDEX_MODE, target_storage()) == ("flat", index_storage(faiss_index)):
+        return
+    if promotion_thread is not None and promotion_thread.is_alive():
+        return
+
+    promotion_thread = threading.Thread(target=promote_index, args=(INDEX_MODE,), daemon=True)
+    promotion_thread.start()
+
+
+def promote_index(mode: str = INDEX_MODE, storage: str = None):
+    """
+    Train an index of `mode` / `storage` on the flat index's vectors and swap it in.
+    Training and bulk add run outside the lock; documents added meanwhile are caught up.
+    """
+    global faiss_index
+
+    storage = storage or target_storage(mode)
+    with index_lock:
+        source = faiss_index
+        if index_mode(source) != "flat" or (mode, storage) == ("flat", index_storage(source)):
+            return
+        ids = _stored_ids(source)
+        vectors = source.reconstruct_batch(ids) if isinstance(source, SnapshotIndex) else \
+            source.index.reconstruct_n(0, source.ntotal)
+
+    print(f"[INFO] Promoting FAISS index to '{mode}' ({storage}) with {len(ids)} vectors...")
+    started = time.time()
+    promoted = build_index(mode, storage, ids, vectors)
+
+    with index_lock:
+        if faiss_index is not source:
+            return  # Replaced meanwhile (e.g. snapshot load)
+        added = np.setdiff1d(_stored_ids(source), ids)
+        if len(added):
+            promoted.add_with_ids(np.vstack([source.reconstruct(int(i)) for i in added]), added)
+        faiss_index = promoted
+
+    print(f"[INFO] FAISS index promoted to '{mode}' ({storage}) in {time.time() - started:.1f}s.")
+
+
+def _stored_ids(index):
+    """
+    Ids held by a flat / HNSW (IDMap2) or snapshot index; None for a plain IVF index.
+    """
+    if isinstance(index, SnapshotIndex):
+        return index.ids()
+    if isinstance(index, faiss.IndexIDMap2):
+        return faiss.vector_to_array(index.id_map)
+    return None
+
+
+def bytes_per_vector(mode: str, storage: str = "float32") -> int:
+    """
+    Approximate resident bytes per indexed vector (codes + graph links + id bookkeeping).
+    """
+    if mode == "ivf_pq":
+        return code_bytes("pq") + 32
+    if mode == "hnsw":
+        return code_bytes(storage) + HNSW_M * 2 * 4 + 24
+    return code_bytes(storage) + 24
+
+
+def estimated_memory_bytes() -> int:
+    """
+    Estimated memory held by the vector store: FAISS codes plus the document store.
+    """
+    stats = indexed_data.get_stats()
+    vectors = faiss_index.ntotal - len(dead_ids)  # Dead rows are already being dropped
+    return vectors * bytes_per_vector(index_mode(faiss_index), index_storage(faiss_index)) + \
+        stats["live_bytes"] + stats["index_bytes"] + document_times.nbytes + last_retrieved.nbytes
+
+
+def over_budget() -> bool:
+    if INDEX_MAX_DOCUMENTS and len(indexed_data) > INDEX_MAX_DOCUMENTS:
+        return True
+    return bool(INDEX_MAX_MEMORY_MB) and estimated_memory_bytes() > INDEX_MAX_MEMORY_MB * 1024 * 1024
+
+
+def select_evictions(now: float = None):
+    """
+    Ids to evict: documents older than INDEX_DOCUMENT_TTL, then (while over budget)
+    the least recently retrieved ones, oldest first, until the store is back under
+    the budget minus INDEX_EVICTION_HEADROOM.
+    """
+    now = now or time.time()
+    with index_lock:
+        ids = indexed_data.ids()
+        if not len(ids):
+            return []
+        times, retrieved = document_times[ids], last_retrieved[ids]
+        memory = estimated_memory_bytes()
+
+    expired = times < now - INDEX_DOCUMENT_TTL if INDEX_DOCUMENT_TTL else np.zeros(len(ids), dtype=bool)
+    remaining = len(ids) - int(expired.sum())
+
+    excess = 0
+    if INDEX_MAX_DOCUMENTS and remaining > INDEX_MAX_DOCUMENTS:
+        excess = remaining - int(INDEX_MAX_DOCUMENTS * (1 - INDEX_EVICTION_HEADROOM))
+    if INDEX_MAX_MEMORY_MB:
+        budget = INDEX_MAX_MEMORY_MB * 1024 * 1024
+        per_document = memory / len(ids)
+        memory -= per_document * int(expired.sum())
+        if memory > budget:
+            excess = max(excess, int(np.ceil((memory - budget * (1 - INDEX_EVICTION_HEADROOM)) / per_document)))
+
+    candidates = np.flatnonzero(~expired)
+    # Primary key: last retrieval (never retrieved first); secondary: age
+    order = candidates[np.lexsort((times[candidates], retrieved[candidates]))]
+    return ids[expired].tolist() + ids[order[:max(excess, 0)]].tolist()
+
+
+def _mark_dead(ids):
+    """
+    Remove vectors from the search results (caller holds index_lock). IVF removes
+    in place through its id hashtable (cost grows with the removed ids only); flat
+    and HNSW would compact or rebuild the whole index, so their rows are marked
+    dead and dropped later by compact_index. A memory-mapped snapshot base is
+    read-only, so its rows stay dead until the next snapshot rewrites it.
+    """
+    global dead_selector
+
+    ids = np.asarray(ids, dtype="int64")
+    if not isinstance(faiss_index, SnapshotIndex) and index_mode(faiss_index) in ("ivf_flat", "ivf_pq"):
+        # The IVF hashtable direct map only removes through an IDSelectorArray
+        faiss_index.remove_ids(faiss.IDSelectorArray(len(ids), faiss.swig_ptr(ids)))
+        return
+    dead_ids.update(ids.tolist())
+    dead_selector = None
+
+
+def _copy_index_rows(source, start: int, count: int):
+    """
+    Copy `count` ids and vectors of an IDMap2 index from row `start`, in chunks
+    that each hold index_lock briefly. Rows never move, since flat / HNSW
+    indexes only grow until they are swapped out. Returns None if `source` was
+    replaced meanwhile.
+    """
+    ids, vectors = [], []
+    for offset in range(start, start + count, INDEX_COMPACTION_CHUNK):
+        size = min(INDEX_COMPACTION_CHUNK, start + count - offset)
+        with index_lock:
+            if faiss_index is not source:
+                return None
+            ids.append(faiss.rev_swig_ptr(source.id_map.data(), source.ntotal)[offset:offset + size].copy())
+            vectors.append(source.index.reconstruct_n(offset, size))
+    if not ids:
+        return np.zeros(0, dtype="int64"), np.zeros((0, dimension), dtype="float32")
+    return np.concatenate(ids), np.vstack(vectors)
+
+
+def compact_index():
+    """
+    Rebuild a flat / HNSW index without its dead rows and swap it in. Rows are
+    copied in chunks and the rebuild runs outside index_lock, so searches and
+    adds continue meanwhile (adds made during the rebuild are caught up).
+    """
+    global faiss_index, dead_selector
+
+    with index_lock:
+        source = faiss_index
+        if not dead_ids:
+            return 0
+        if isinstance(source, SnapshotIndex):
+            # Only delta rows can go; dead base rows are dropped by the next snapshot
+            removed = source.remove_from_delta(np.fromiter(dead_ids, dtype="int64", count=len(dead_ids)))
+            dead_ids.difference_update(removed.tolist())
+            dead_selector = None
+            return len(removed)
+        if index_mode(source) in ("ivf_flat", "ivf_pq"):
+            # Dead rows from before a promotion to IVF are removed in place
+            removed = np.fromiter(dead_ids, dtype="int64", count=len(dead_ids))
+            source.remove_ids(faiss.IDSelectorArray(len(removed), faiss.swig_ptr(removed)))
+            dead_ids.clear()
+            dead_selector = None
+            return len(removed)
+        copied, dead = source.ntotal, np.fromiter(dead_ids, dtype="int64", count=len(dead_ids))
+
+    rows = _copy_index_rows(source, 0, copied)
+    if rows is None:
+        return 0  # Replaced meanwhile (promotion / snapshot load); compacted on the next pass
+    ids, vectors = rows
+    keep = ~np.isin(ids, dead)
+    mode, storage = index_mode(source), index_storage(source)
+    if not keep.any():
+        rebuilt = initial_index()  # Nothing left to train on; promoted again once it refills
+    elif mode == "flat" and storage in ("float32", "float16"):
+        rebuilt = create_index("flat", storage=storage)
+        rebuilt.add_with_ids(vectors[keep], ids[keep])
+    else:
+        rebuilt = build_index(mode, storage, ids[keep], vectors[keep])
+
+    with index_lock:
+        if faiss_index is not source:
+            return 0
+        # Catch up rows added during the rebuild (a few, so copied in one go)
+        added_ids, added_vectors = _copy_index_rows(source, copied, source.ntotal - copied)
+        live = np.array([document_id not in dead_ids for document_id in added_ids.tolist()], dtype=bool)
+        if live.any():
+            rebuilt.add_with_ids(added_vectors[live], added_ids[live])
+        removed = set(dead.tolist()) | set(added_ids[~live].tolist())
+        dead_ids.difference_update(removed)
+        dead_selector = None
+        faiss_index = rebuilt
+    return len(removed)
+
+
+def remove_documents(ids, log: bool = True, compact: bool = True):
+    """
+    Remove documents everywhere: document store, dedup keys, partitions, FAISS and BM25.
+    Documents are decoded before taking index_lock, which is then held only for the
+    bookkeeping; flat / HNSW vectors are dropped by compact_index (unless `compact`
+    is False). Returns the ids that were actually removed.
+    """
+    documents = indexed_data.get_many(ids)
+    with index_lock:
+        documents = [document for document in documents if document["id"] in indexed_data]
+        ids = [document["id"] for document in documents]
+        if not ids:
+            return []
+
+        for document in documents:
+            for key in _document_keys(document):
+                if known_documents.get(key) == document["id"]:
+                    del known_documents[key]
+            if document.get("location"):
+                partitions.get(location_key(document["location"]), set()).discard(document["id"])
+        indexed_data.remove(ids)
+        if log:
+            _log_removed(ids)
+        _mark_dead(ids)
+
+    remove_from_bm25_index(ids)
+    if compact:
+        compact_index()
+    return ids
+
+
+def evict_documents():
+    """
+    One eviction pass (TTL + budget). Skipped while another pass or a promotion is running.
+    """
+    if not eviction_lock.acquire(blocking=False):
+        return 0
+    try:
+        if promotion_thread is not None and promotion_thread.is_alive():
+            return 0  # The promoted index is built from a copy; evict after the swap
+        evicted = remove_documents(select_evictions())
+        if not evicted:
+            return 0
+
+        stats = indexed_data.get_stats()
+        if stats["buffer_bytes"] > 2 * stats["buffer_live_bytes"]:
+            indexed_data.compact()
+        print(f"[INFO] Evicted {len(evicted)} documents. Total items: {len(indexed_data)}.")
+        return len(evicted)
+    finally:
+        eviction_lock.release()
+
+
+def maybe_evict_documents():
+    """
+    Start an eviction pass in the background when the store is over budget.
+    """
+    global eviction_thread
+
+    if not (INDEX_MAX_DOCUMENTS or INDEX_MAX_MEMORY_MB) or not over_budget():
+        return
+    if eviction_thread is not None and eviction_thread.is_alive():
+        return
+
+    eviction_thread = threading.Thread(target=evict_documents, daemon=True)
+    eviction_thread.start()
+
+
+async def run_periodic_eviction(interval: int = INDEX_EVICTION_INTERVAL):
+    """
+    Background task: expire documents past INDEX_DOCUMENT_TTL and enforce the budget.
+    """
+    while True:
+        await sleep(interval)
+        try:
+            await to_thread(evict_documents)
+        except Exception as e:
+            print(f"[ERROR] FAISS eviction failed: {str(e)}")
+
+
+def _register_documents(documents):
+    """
+    Rebuild the bookkeeping of stored documents: ages, BM25, partitions, dedup keys, next id.
+    """
+    global next_document_id
+
+    if not documents:
+        return
+    _track_documents(documents)
+    add_to_bm25_index(documents)  # Skips ids loaded with the BM25 snapshot
+    for document in documents:
+        _partition_documents(document)
+        for key in _document_keys(document):
+            known_documents[key] = document["id"]
+    next_document_id = max(next_document_id, max(document["id"] for document in documents) + 1)
+
+
+def _restore_documents(documents, vectors):
+    """
+    Re-insert documents with their original ids (legacy snapshot load / log replay).
+    """
+    keep = [
+        position for position, document in enumerate(documents)
+        if document["id"] not in indexed_data
+    ]
+    if not keep:
+        return
+
+    indexed_data.add_many(documents[position] for position in keep)
+    _register_documents([documents[position] for position in keep])
+    if vectors is not None:
+        ids = np.asarray([documents[position]["id"] for position in keep], dtype="int64")
+        faiss_index.add_with_ids(np.asarray(vectors, dtype="float32")[keep], ids)
+
+
+def _snapshot_path(*parts):
+    return os.path.join(INDEX_SNAPSHOT_DIR, *parts)
+
+
+def _write_log(entries):
+    """
+    Append entries to the log (caller holds index_lock).
+    """
+    global append_log
+
+    if not INDEX_SNAPSHOT_DIR:
+        return
+    if append_log is None:
+        os.makedirs(INDEX_SNAPSHOT_DIR, exist_ok=True)
+        append_log = open(_snapshot_path(APPEND_LOG), "a", encoding="utf-8")
+
+    for entry in entries:
+        append_log.write(json.dumps(entry) + "\n")
+    append_log.flush()
+
+
+def _log_added(documents, vectors):
+    """
+    Append newly indexed documents and vectors to the log (caller holds index_lock).
+    """
+    _write_log(
+        {
+            "document": document,
+            "vector": base64.b64encode(np.asarray(vector, dtype="float32").tobytes()).decode("ascii"),
+        }
+        for document, vector in zip(documents, vectors)
+    )
+
+
+def _log_removed(ids):
+    """
+    Record evicted ids so a replay does not resurrect them (caller holds index_lock).
+    """
+    _write_log([{"removed": [int(document_id) for document_id in ids]}])
+
+
+def _replay_log(path):
+    if not os.path.exists(path):
+        return 0
+
+    replayed, documents, vectors = 0, [], []
+    with open(path, encoding="utf-8") as log:
+        for line in log:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                break  # Torn write at the tail of the log
+            if "removed" in entry:
+                # Apply pending adds first so evictions replay in order
+                if documents:
+                    _restore_documents(documents, np.vstack(vectors))
+                    replayed, documents, vectors = replayed + len(documents), [], []
+                remove_documents(entry["removed"], log=False, compact=False)
+                continue
+            documents.append(entry["document"])
+            vectors.append(np.frombuffer(base64.b64decode(entry["vector"]), dtype="float32"))
+    if documents:
+        _restore_documents(documents, np.vstack(vectors))
+    return replayed + len(documents)
+
+
+def _open_snapshot_index(name: str, meta: dict):
+    """
+    The FAISS index of a snapshot: its base memory-mapped read-only with an empty
+    writable delta when it was written mappable, else read into memory (HNSW, and
+    snapshots from before the mapped layout).
+    """
+    path = _snapshot_path(name, "faiss.index")
+    if meta.get("mapped"):
+        return SnapshotIndex(path, meta["mode"], meta["storage"], initial_index())
+    return faiss.read_index(path)
+
+
+def _rebase_on_snapshot(name: str, meta: dict, source):
+    """
+    Switch to the snapshot just written (caller holds index_lock): documents and
+    vectors it holds are read from its mappings, so the writable buffer and delta
+    only keep what was added since. Base rows removed since are marked dead.
+    """
+    global faiss_index, dead_selector
+
+    indexed_data.rebase(_snapshot_path(name, "documents.bin"), _snapshot_path(name, "documents.npz"))
+    if not meta["mapped"] or faiss_index is not source:
+        return  # Swapped meanwhile (promotion / compaction); mapped on the next snapshot
+    if promotion_thread is not None and promotion_thread.is_alive():
+        return  # Keep the promotion's source in place
+
+    rebased = _open_snapshot_index(name, meta)
+    live = indexed_data.ids()
+    added = live[~rebased.in_base(live)]
+    if len(added):
+        rebased.add_with_ids(source.reconstruct_batch(added), added)
+    dead_ids.clear()
+    dead_ids.update(np.setdiff1d(rebased.base_ids, live, assume_unique=True).tolist())
+    dead_selector = None
+    faiss_index = rebased
+
+
+def save_index_snapshot():
+    """
+    Write the index and its documents to a new snapshot directory, flip CURRENT
+    to it, and drop the append-log entries the snapshot now covers.
+
+    The documents are written in the document store's binary layout and the
+    vectors as an IVF index (flat ones as a one-list IVF), so that every worker
+    can memory-map the snapshot read-only; HNSW graphs are written as they are.
+    This process then switches to the new snapshot's mappings itself.
+    """
+    global append_log
+
+    if not INDEX_SNAPSHOT_DIR:
+        return
+    os.makedirs(INDEX_SNAPSHOT_DIR, exist_ok=True)
+
+    with index_lock:
+        source = faiss_index
+        mode, storage = index_mode(source), index_storage(source)
+        dead = np.fromiter(dead_ids, dtype="int64", count=len(dead_ids))
+        index, index_bytes, delta = None, None, None
+        if isinstance(source, SnapshotIndex):
+            delta = source.delta_rows()  # The base is re-read from its file below
+        elif mode == "flat":
+            index = single_list_index(source, dead)
+        else:
+            index_bytes = faiss.serialize_index(source)
+        bm25_export = bm25_index.export()
+        document_ids = indexed_data.ids()
+        meta = {
+            "next_document_id": next_document_id,
+            "dimension": dimension,
+            "count": len(document_ids),
+            "created_at": time.time(),
+            "mode": mode,
+            "storage": storage,
+            "mapped": mode != "hnsw",  # faiss can only memory-map IVF inverted lists
+        }
+        # Adds after this point go to a fresh log
+        if append_log is not None:
+            append_log.close()
+            append_log = None
+        if os.path.exists(_snapshot_path(APPEND_LOG)):
+            os.replace(_snapshot_path(APPEND_LOG), _snapshot_path(ROTATED_APPEND_LOG))
+
+    if delta is not None:
+        index = source.merged(*delta, dead)
+    if index is not None:
+        index_bytes = faiss.serialize_index(index)
+        del index
+
+    name = f"snapshot-{int(meta['created_at'] * 1000)}"
+    tmp_dir = _snapshot_path(name + ".tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    index_bytes.tofile(os.path.join(tmp_dir, "faiss.index"))
+    del index_bytes
+    save_bm25_index(os.path.join(tmp_dir, "bm25.npz"), bm25_export)
+    indexed_data.save(os.path.join(tmp_dir, "documents.bin"), os.path.join(tmp_dir, "documents.npz"), document_ids)
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_dir, _snapshot_path(name))
+
+    with open(_snapshot_path("CURRENT.tmp"), "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(_snapshot_path("CURRENT.tmp"), _snapshot_path("CURRENT"))
+
+    # The snapshot covers everything in the rotated log; older snapshots are obsolete
+    # (workers still mapping them keep reading the unlinked files)
+    if os.path.exists(_snapshot_path(ROTATED_APPEND_LOG)):
+        os.remove(_snapshot_path(ROTATED_APPEND_LOG))
+    for entry in os.listdir(INDEX_SNAPSHOT_DIR):
+        if entry.startswith("snapshot-") and entry != name:
+            shutil.rmtree(_snapshot_path(entry), ignore_errors=True)
+
+    with index_lock:
+        _rebase_on_snapshot(name, meta, source)
+
+    print(f"[INFO] Saved FAISS snapshot '{name}' with {meta['count']} documents.")
+
+
+def load_index_snapshot():
+    """
+    Load the latest snapshot, then replay the append log to recover adds and
+    evictions made since that snapshot. Documents and IVF / flat vectors are
+    memory-mapped read-only, so workers loading the same snapshot share them
+    through the page cache; only later adds are held in process memory.
+    """
+    global faiss_index, known_documents, next_document_id, partitions, document_times, last_retrieved, dead_selector
+
+    if not INDEX_SNAPSHOT_DIR or not os.path.isdir(INDEX_SNAPSHOT_DIR):
+        return
+
+    with index_lock:
+        current = _snapshot_path("CURRENT")
+        if os.path.exists(current):
+            with open(current, encoding="utf-8") as f:
+                name = f.read().strip()
+            with open(_snapshot_path(name, "meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+
+            faiss_index = _open_snapshot_index(name, meta)
+            bm25_index.clear()
+            if os.path.exists(_snapshot_path(name, "bm25.npz")):
+                load_bm25_index(_snapshot_path(name, "bm25.npz"))
+            known_documents, partitions = {}, {}
+            document_times, last_retrieved = np.zeros(0), np.zeros(0)
+            dead_ids.clear()
+            dead_selector = None
+            next_document_id = meta["next_document_id"]
+            if os.path.exists(_snapshot_path(name, "documents.npz")):
+                ids = indexed_data.load(_snapshot_path(name, "documents.bin"), _snapshot_path(name, "documents.npz"))
+                for start in range(0, len(ids), BATCH_SIZE * 100):
+                    _register_documents(indexed_data.get_many(ids[start:start + BATCH_SIZE * 100]))
+            else:
+                # Snapshot written before the binary document layout
+                indexed_data.clear()
+                with open(_snapshot_path(name, "documents.jsonl"), encoding="utf-8") as f:
+                    _restore_documents([json.loads(line) for line in f], None)
+            print(f"[INFO] Loaded FAISS snapshot '{name}' with {faiss_index.ntotal} vectors.")
+
+        replayed = _replay_log(_snapshot_path(ROTATED_APPEND_LOG)) + _replay_log(_snapshot_path(APPEND_LOG))
+        if replayed:
+            print(f"[INFO] Replayed {replayed} documents from the FAISS append log.")
+
+        # Vectors of documents evicted before the snapshot (still dead in it) or in the log
+        stored = _stored_ids(faiss_index)
+        if stored is not None:
+            dead = stored[~np.isin(stored, indexed_data.ids())]
+            if len(dead):
+                _mark_dead(dead)
+                compact_index()
+
+
+async def run_periodic_snapshots(interval: int = INDEX_SNAPSHOT_INTERVAL):
+    """
+    Background task: snapshot the index every `interval` seconds.
+    """
+    while True:
+        await sleep(interval)
+        try:
+            await to_thread(save_index_snapshot)
+        except Exception as e:
+            print(f"[ERROR] FAISS snapshot failed: {str(e)}")
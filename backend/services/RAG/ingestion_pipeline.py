@@ -0,0 +1,135 @@
+import asyncio
+import os
+from asyncio import to_thread
+from .indexing_service import encode_texts, add_to_index, filter_new_documents, make_document
+
+# Stage tuning
+PIPELINE_BATCH_SIZE = int(os.getenv("PIPELINE_BATCH_SIZE", 32))  # Texts per encode call
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 256))  # Max items buffered between stages
+PIPELINE_FLUSH_INTERVAL = float(os.getenv("PIPELINE_FLUSH_INTERVAL", 0.05))  # Seconds before a partial batch is encoded
+
+_DONE = object()  # End-of-stream marker passed between stages
+
+
+async def _produce(source, producer, queue, collected):
+    """
+    Drain one producer (async iterator of item lists) into the raw queue.
+    A failing source is logged and skipped so the other sources still index.
+    """
+    try:
+        async for items in producer:
+            for item in items:
+                collected.append(item)
+                await queue.put((source, item))
+    except Exception as e:
+        print(f"[ERROR] Ingestion producer '{source}' failed: {str(e)}")
+
+
+async def _run_producers(producers, queue, collected):
+    await asyncio.gather(*(
+        _produce(source, producer, queue, collected[source])
+        for source, producer in producers.items()
+    ))
+    await queue.put(_DONE)
+
+
+async def _normalize(in_queue, out_queue, metadata):
+    while True:
+        entry = await in_queue.get()
+        if entry is _DONE:
+            await out_queue.put(_DONE)
+            return
+
+        source, item = entry
+        document = make_document(item, source, metadata)
+        if document:
+            await out_queue.put(document)
+
+
+async def _embed(in_queue, out_queue, batch_size, flush_interval):
+    """
+    Group documents into batches and encode them off the event loop.
+    A partial batch is flushed once no new document arrives for `flush_interval`.
+    """
+    batch = []
+    get_task = None
+    try:
+        while True:
+            if get_task is None:
+                get_task = asyncio.ensure_future(in_queue.get())
+            done, _ = await asyncio.wait({get_task}, timeout=flush_interval if batch else None)
+
+            entry = None
+            if get_task in done:
+                entry = get_task.result()
+                get_task = None
+                if entry is not _DONE:
+                    batch.append(entry)
+
+            if batch and (entry is None or entry is _DONE or len(batch) >= batch_size):
+                # Skip documents already indexed so they are never re-embedded
+                batch = filter_new_documents(batch)
+                if batch:
+                    texts = [document["text"] for document in batch]
+                    embeddings = await to_thread(encode_texts, texts)
+                    await out_queue.put((batch, embeddings))
+                batch = []
+
+            if entry is _DONE:
+                await out_queue.put(_DONE)
+                return
+    finally:
+        if get_task is not None:
+            get_task.cancel()
+
+
+async def _index(in_queue, stats):
+    while True:
+        entry = await in_queue.get()
+        if entry is _DONE:
+            return
+
+        documents, embeddings = entry
+        added_ids = await to_thread(add_to_index, documents, embeddings)
+        stats["indexed"] += len(added_ids)
+
+
+async def run_ingestion_pipeline(
+    producers: dict,
+    metadata: dict = None,
+    batch_size: int = PIPELINE_BATCH_SIZE,
+    queue_size: int = PIPELINE_QUEUE_SIZE,
+    flush_interval: float = PIPELINE_FLUSH_INTERVAL,
+):
+    """
+    Stream items from the producers through normalize -> batched encode -> FAISS add.
+
+    Stages are connected by bounded queues, so reviews are embedded while later
+    pages are still downloading and memory stays capped for large fetches.
+
+    :param producers: Mapping of source name to an async iterator of item lists
+                      (e.g. {"yelp": stream_yelp_reviews(ids)}).
+    :param metadata: Context stored on every document, e.g. {"location": ..., "dish": ...}.
+    :return: Dict with the raw items per source and the number of documents indexed.
+    """
+    raw_queue = asyncio.Queue(maxsize=queue_size)
+    text_queue = asyncio.Queue(maxsize=queue_size)
+    vector_queue = asyncio.Queue(maxsize=max(1, queue_size // batch_size))
+
+    collected = {source: [] for source in producers}
+    stats = {"indexed": 0}
+
+    stages = [
+        asyncio.ensure_future(_run_producers(producers, raw_queue, collected)),
+        asyncio.ensure_future(_normalize(raw_queue, text_queue, metadata)),
+        asyncio.ensure_future(_embed(text_queue, vector_queue, batch_size, flush_interval)),
+        asyncio.ensure_future(_index(vector_queue, stats)),
+    ]
+    try:
+        await asyncio.gather(*stages)
+    finally:
+        for stage in stages:
+            stage.cancel()
+
+    print(f"[INFO] Ingestion pipeline indexed {stats['indexed']} documents.")
+    return {**collected, "indexed": stats["indexed"]}
@@ -1,15 +1,9 @@
-from transformers import pipeline
-from sentence_transformers import CrossEncoder
-from asyncio import gather
+from asyncio import gather, to_thread
 
 from services.llm_service import generate_dish_insight
-from .search_service import hybrid_search
+from .search_service import hybrid_search, rerank_results
 from .indexing_service import index_data
-import torch
-
-# Load Summarizer and Cross-Encoder for RAG Re-ranking
-summarizer = pipeline("summarization", model="facebook/bart-large-cnn", device=-1)
-cross_encoder = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
+from services.model_registry import summarize
 
 
 async def summarize_texts_in_steps(texts, max_length=200):
@@ -27,8 +21,8 @@ async def summarize_texts_in_steps(texts, max_length=200):
     # Step 1: Summarize Each Review Separately (if long)
     for text in texts:
         if len(text.split()) > 40:
-            result = summarizer(text, max_length=150, min_length=50, do_sample=False)
-            summarized_reviews.append(result[0]['summary_text'])
+            summary = await to_thread(summarize, text, max_length=150, min_length=50, do_sample=False)
+            summarized_reviews.append(summary)
         else:
             summarized_reviews.append(text)
 
@@ -36,15 +30,16 @@ async def summarize_texts_in_steps(texts, max_length=200):
     combined_text = " ".join(summarized_reviews)
     if len(combined_text.split()) > 150:
         print("[INFO] Performing final summarization pass...")
-        final_summary = summarizer(combined_text, max_length=max_length, min_length=80, do_sample=False)
-        return [final_summary[0]['summary_text']]
+        final_summary = await to_thread(summarize, combined_text, max_length=max_length, min_length=80, do_sample=False)
+        return [final_summary]
     
     return summarized_reviews
 
 
-async def process_rag_pipeline(dish_name, yelp_reviews, reddit_comments):
+async def process_rag_pipeline(dish_name, yelp_reviews, reddit_comments, filters=None):
     """
     Core RAG pipeline that retrieves, re-ranks, and summarizes Yelp reviews.
+    `filters` (e.g. {"location": "Austin"}) restrict retrieval to matching documents.
     """
     print("[INFO] Processing RAG pipeline...")
 
@@ -54,19 +49,16 @@ async def process_rag_pipeline(dish_name, yelp_reviews, reddit_comments):
 
     # Perform Hybrid Retrieval
     print(f"[INFO] Retrieving relevant reviews for '{dish_name}'...")
-    retrieved_texts = hybrid_search(dish_name)
+    retrieved_texts = await hybrid_search(dish_name, filters=filters)
     print(f"[INFO] Retrieved {len(retrieved_texts)} items.")
 
     if not retrieved_texts:
-        print("[WARN] No relevant reviews from FAISS. Using all Yelp reviews instead.")
+        print("[WARN] No relevant reviews from hybrid search. Using all Yelp reviews instead.")
         retrieved_texts = yelp_reviews  # Fallback to all reviews if FAISS fails
 
     # Re-rank Retrieved Reviews using Cross-Encoder
     print("[INFO] Re-ranking retrieved texts...")
-    responses = [[dish_name, text] for text in retrieved_texts]
-    scores = cross_encoder.predict(responses)
-    ranked_texts = sorted(zip(retrieved_texts, scores), key=lambda x: x[1], reverse=True)
-    top_texts = [text for text, _ in ranked_texts[:5]]  # Take Top 5
+    top_texts = (await to_thread(rerank_results, dish_name, retrieved_texts, 5))[:5]  # Take Top 5
 
     # Summarize and Generate Insights
     try:
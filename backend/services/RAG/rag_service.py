@@ -1,25 +1,22 @@
-from transformers import pipeline
-from sentence_transformers import SentenceTransformer, CrossEncoder
-from sklearn.metrics.pairwise import cosine_similarity
-from asyncio import gather
+from asyncio import gather, to_thread
 from services.llm_service import generate_dish_insight
-from .search_service import faiss_only_search
-from .indexing_service import index_data
+from .search_service import hybrid_search
+from .indexing_service import index_data, encode_texts
+from services.model_registry import summarize
 import numpy as np
-import torch
 
-# Load Summarizer and Cross-Encoder for RAG Re-ranking
-summarizer = pipeline("summarization", model="facebook/bart-large-cnn", device=-1)
-cross_encoder = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
 
-
-async def semantic_deduplication(texts, threshold=0.85):
+async def semantic_deduplication(texts, threshold=0.85, embeddings=None):
     """
     Deduplicate reviews by filtering out similar text based on cosine similarity of embeddings.
+    Pass `embeddings` (e.g. vectors returned by the search) to skip re-encoding.
     """
-    embeddings = embedding_model.encode(texts, convert_to_tensor=False)
-    similarities = cosine_similarity(embeddings)
+    if embeddings is None:
+        embeddings = await to_thread(encode_texts, texts)
+    embeddings = np.asarray(embeddings, dtype="float32")
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    normalized = embeddings / np.maximum(norms, 1e-12)
+    similarities = normalized @ normalized.T  # Cosine similarity
 
     unique_texts = []
     seen_indices = set()
@@ -45,21 +42,23 @@ async def summarize_in_batches(texts, max_length=200):
         batch = texts[i:i + batch_size]
         combined_text = " ".join(batch)
 
-        result = summarizer(
+        summary = await to_thread(
+            summarize,
             combined_text,
             max_length=max_length,
             min_length=80,
             do_sample=False
         )
-        summarized_reviews.append(result[0]["summary_text"])
+        summarized_reviews.append(summary)
 
     print(f"[INFO] Summarized {len(summarized_reviews)} batches.")
     return summarized_reviews
 
 
-async def process_rag_pipeline(dish_name, yelp_reviews, reddit_comments):
+async def process_rag_pipeline(dish_name, yelp_reviews, reddit_comments, filters=None):
     """
     Core RAG pipeline that retrieves, re-ranks, and summarizes Yelp reviews.
+    `filters` (e.g. {"location": "Austin"}) restrict retrieval to matching documents.
     """
     print("[INFO] Processing RAG pipeline...")
 
@@ -69,15 +68,17 @@ async def process_rag_pipeline(dish_name, yelp_reviews, reddit_comments):
 
     # Retrieve top matching reviews
     print(f"[INFO] Retrieving relevant reviews for '{dish_name}'...")
-    retrieved_texts = faiss_only_search(dish_name)
+    hits = await hybrid_search(dish_name, return_vectors=True, filters=filters)
+    retrieved_texts = [hit["text"] for hit in hits]
+    embeddings = np.array([hit["vector"] for hit in hits]) if hits else None
     print(f"[INFO] Retrieved {len(retrieved_texts)} items.")
 
     if not retrieved_texts:
-        print("[WARN] No relevant reviews from FAISS. Using all Yelp reviews instead.")
+        print("[WARN] No relevant reviews from hybrid search. Using all Yelp reviews instead.")
         retrieved_texts = yelp_reviews
 
-    # Deduplicate and summarize
-    deduplicated_reviews = await semantic_deduplication(retrieved_texts)
+    # Deduplicate (reusing the stored vectors) and summarize
+    deduplicated_reviews = await semantic_deduplication(retrieved_texts, embeddings=embeddings)
     summarized_reviews = await summarize_in_batches(deduplicated_reviews)
 
     # Pass to LLM for deeper insights
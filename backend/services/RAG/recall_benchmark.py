@@ -0,0 +1,119 @@
+"""
+Recall of each index mode / storage format against exact float32 flat search.
+
+    python -m services.RAG.recall_benchmark                  # vectors of the current index snapshot
+    python -m services.RAG.recall_benchmark --corpus reviews.txt --k 10
+
+Reports, per configuration, bytes per vector, recall@k of the ANN results, and
+candidate recall: the share of the true top-k inside the k * overfetch candidates
+handed to the cross-encoder (what exact re-ranking can still recover).
+"""
+import argparse
+import time
+import numpy as np
+from . import indexing_service
+from .indexing_service import build_index, bytes_per_vector, search_parameters
+
+BENCHMARK_CONFIGS = [
+    ("flat", "float32"),
+    ("flat", "float16"),
+    ("flat", "sq8"),
+    ("flat", "pq"),
+    ("hnsw", "float32"),
+    ("hnsw", "float16"),
+    ("hnsw", "sq8"),
+    ("ivf_flat", "float32"),
+    ("ivf_flat", "sq8"),
+    ("ivf_pq", "pq"),
+]
+
+
+def recall(truth, found) -> float:
+    """
+    Mean fraction of each query's true neighbours present in its results.
+    """
+    hits = [len(set(t) & set(f[f >= 0])) / len(t) for t, f in zip(truth, found)]
+    return float(np.mean(hits)) if hits else 0.0
+
+
+def recall_report(vectors, queries, k: int = 10, overfetch: int = 4, configs=BENCHMARK_CONFIGS,
+                  nprobe: int = None, ef_search: int = None):
+    """
+    Build every configuration over `vectors` and compare its results for `queries`
+    with exact float32 flat search. Returns one dict per configuration.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    queries = np.ascontiguousarray(queries, dtype="float32")
+    ids = np.arange(len(vectors), dtype="int64")
+
+    exact = build_index("flat", "float32", ids, vectors)
+    _, truth = exact.search(queries, k)
+
+    rows = []
+    for mode, storage in configs:
+        started = time.time()
+        index = build_index(mode, storage, ids, vectors)
+        build_seconds = time.time() - started
+
+        params = search_parameters(index, nprobe, ef_search)
+        search = (lambda q, n: index.search(q, n)) if params is None else (lambda q, n: index.search(q, n, params=params))
+        started = time.time()
+        _, found = search(queries, k)
+        query_ms = (time.time() - started) * 1000 / max(len(queries), 1)
+        _, candidates = search(queries, k * overfetch)
+
+        rows.append({
+            "mode": mode,
+            "storage": storage,
+            "bytes_per_vector": bytes_per_vector(mode, storage),
+            f"recall@{k}": round(recall(truth, found), 4),
+            f"candidate_recall@{k}x{overfetch}": round(recall(truth, candidates), 4),
+            "ms_per_query": round(query_ms, 3),
+            "build_seconds": round(build_seconds, 2),
+        })
+        print(f"[INFO] Benchmarked {mode}/{storage}: {rows[-1]}")
+    return rows
+
+
+def load_snapshot_vectors():
+    """
+    Vectors of the persisted index (snapshot + append log).
+    """
+    indexing_service.load_index_snapshot()
+    ids = indexing_service.indexed_data.ids()
+    return indexing_service.get_vectors(ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Text file with one document per line (default: index snapshot)")
+    parser.add_argument("--queries", type=int, default=200, help="Held-out corpus vectors used as queries")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--overfetch", type=int, default=4)
+    parser.add_argument("--nprobe", type=int, default=None)
+    parser.add_argument("--ef-search", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+        vectors = indexing_service.encode_texts(texts)
+    else:
+        vectors = load_snapshot_vectors()
+
+    if len(vectors) <= args.queries:
+        raise SystemExit(f"Need more than {args.queries} vectors, got {len(vectors)}.")
+
+    order = np.random.default_rng(0).permutation(len(vectors))
+    queries, corpus = vectors[order[:args.queries]], vectors[order[args.queries:]]
+    print(f"[INFO] Recall benchmark: {len(corpus)} vectors, {len(queries)} queries, k={args.k}.")
+
+    rows = recall_report(corpus, queries, args.k, args.overfetch, nprobe=args.nprobe, ef_search=args.ef_search)
+    columns = list(rows[0])
+    print(" | ".join(columns))
+    for row in rows:
+        print(" | ".join(str(row[column]) for column in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", 100000))  # (query, document) scores kept in memory
+RERANK_PAIR_MS = float(os.getenv("RERANK_PAIR_MS", 4.0))  # Initial cross-encoder cost estimate per pair
+
+
+class RerankCache:
+    """
+    LRU cache of cross-encoder scores keyed by (normalized query, document key).
+    The document key is a hash of the text, so hits from FAISS, BM25 and raw
+    review lists share entries. Also tracks the measured cost per scored pair,
+    which the cascade uses to size its candidate pool from a latency budget.
+    """
+
+    def __init__(self, size: int = RERANK_CACHE_SIZE, pair_ms: float = RERANK_PAIR_MS):
+        self.size = size
+        self.pair_ms = pair_ms
+        self.lru = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def key(query: str, text: str) -> str:
+        query = " ".join(query.lower().split())
+        return f"{query}\x00{hashlib.sha1(text.encode('utf-8')).hexdigest()}"
+
+    def score(self, model, query: str, texts):
+        """
+        Cross-encoder scores for (query, text) pairs, predicting only the misses (in one batch).
+        """
+        keys = [self.key(query, text) for text in texts]
+        scores = np.zeros(len(texts), dtype="float32")
+        missing = {}
+
+        with self.lock:
+            for position, key in enumerate(keys):
+                if key in self.lru:
+                    self.lru.move_to_end(key)
+                    scores[position] = self.lru[key]
+                    self.stats["hits"] += 1
+                else:
+                    missing.setdefault(key, []).append(position)
+                    self.stats["misses"] += 1
+
+        if missing:
+            miss_keys = list(missing)
+            started = time.perf_counter()
+            predicted = model.predict([[query, texts[missing[key][0]]] for key in miss_keys])
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+            with self.lock:
+                # Moving average, so one slow batch doesn't shrink the cascade for good
+                self.pair_ms = 0.8 * self.pair_ms + 0.2 * elapsed_ms / len(miss_keys)
+                for key, value in zip(miss_keys, predicted):
+                    for position in missing[key]:
+                        scores[position] = value
+                    self.lru[key] = float(value)
+                    self.lru.move_to_end(key)
+                while len(self.lru) > self.size:
+                    self.lru.popitem(last=False)
+        return scores
+
+    def pairs_within(self, budget_ms: float) -> int:
+        """
+        How many uncached pairs the cross-encoder can score within `budget_ms`.
+        """
+        return int(budget_ms / max(self.pair_ms, 1e-3))
+
+    def clear(self):
+        with self.lock:
+            self.lru.clear()
+
+    def get_stats(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            "entries": len(self.lru),
+            "ms_per_pair": round(self.pair_ms, 3),
+        }
+
+
+def cascade_rerank(score, hits, k: int, limit: int, step: int = 8, budget_ms: float = None, patience: int = 2):
+    """
+    Re-rank `hits` (ordered by the first-stage retriever) scoring at most `limit`
+    of them, `step` at a time, via `score(chunk) -> scores`. Stops early once
+    `patience` consecutive chunks leave the top-k unchanged, or when `budget_ms`
+    has been spent. Returns the scored hits by score, then the unscored ones in their original order.
+    """
+    started = time.perf_counter()
+    limit = min(len(hits), max(limit, k))
+    scores = np.zeros(0, dtype="float32")
+    top, stable_rounds = None, 0
+
+    scored = 0
+    while scored < limit:
+        chunk = hits[scored:min(scored + step, limit)]
+        scores = np.concatenate([scores, np.asarray(score(chunk), dtype="float32")])
+        scored += len(chunk)
+
+        if scored >= k:
+            current = set(np.argsort(-scores, kind="stable")[:k].tolist())
+            stable_rounds = stable_rounds + 1 if current == top else 0
+            if stable_rounds >= patience:
+                break
+            top = current
+            if budget_ms is not None and (time.perf_counter() - started) * 1000 >= budget_ms:
+                break
+
+    order = np.argsort(-scores, kind="stable")
+    return [hits[position] for position in order] + list(hits[scored:])
+
+
+# One cross-encoder per process, so one shared cache
+rerank_cache = RerankCache()
+
+
+def get_rerank_cache_stats() -> dict:
+    return rerank_cache.get_stats()
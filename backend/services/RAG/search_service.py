@@ -1,93 +1,191 @@
+import os
 import numpy as np
-from sentence_transformers import SentenceTransformer, CrossEncoder
-from .indexing_service import get_faiss_index, get_indexed_data
-from utils.bm25_utils import search_bm25
-
-# Models
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-cross_encoder = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
+from asyncio import gather, sleep, to_thread
+from .indexing_service import (
+    encode_texts, get_faiss_index, get_documents, get_vectors, search_index, index_storage, matching_ids
+)
+from .rerank_cache import rerank_cache, cascade_rerank
+from services.model_registry import get_cross_encoder
+from utils.bm25_utils import bm25_index
 
 # Weights for hybrid search
 BM25_WEIGHT = 0.6
 FAISS_WEIGHT = 0.4
 
+# Hybrid fusion: "rrf" (reciprocal-rank) or "weighted" (normalized scores)
+HYBRID_FUSION = os.getenv("HYBRID_FUSION", "rrf")
+RRF_K = int(os.getenv("RRF_K", 60))
+RERANK_POOL = int(os.getenv("RERANK_POOL", 20))  # Max fused candidates sent to the cross-encoder
+
+# ANN candidates fetched per requested result, so the cross-encoder can restore the
+# exact order lost to float16 / SQ8 / PQ codes. 0 = 1x for float32, 4x for compressed storage.
+SEARCH_OVERFETCH = int(os.getenv("SEARCH_OVERFETCH", 0))
+
+# Re-ranking: "full" scores every candidate; "cascade" cross-encodes the best first-stage
+# candidates within a latency budget and stops once the top-k is stable
+RERANK_MODE = os.getenv("RERANK_MODE", "full")
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", 100))
+RERANK_CASCADE_STEP = int(os.getenv("RERANK_CASCADE_STEP", 8))  # Pairs scored per cascade round
+RERANK_CASCADE_PATIENCE = int(os.getenv("RERANK_CASCADE_PATIENCE", 2))  # Unchanged rounds before stopping
 
-def rerank_results(query, results):
+
+def candidate_count(k, faiss_index):
     """
-    Re-rank results using a cross-encoder model.
+    Number of FAISS candidates to fetch for `k` re-ranked results.
     """
-    if not results:
+    overfetch = SEARCH_OVERFETCH or (1 if index_storage(faiss_index) == "float32" else 4)
+    return k * overfetch
+
+
+def rerank_scores(query, hits):
+    """
+    Cross-encoder scores for hits (dicts with a "text" key), served from the rerank cache when possible.
+    """
+    return rerank_cache.score(get_cross_encoder(), query, [hit["text"] for hit in hits])
+
+
+def rerank_hits(query, hits, k=None):
+    """
+    Re-rank search hits (dicts with a "text" key) using the cross-encoder.
+    With `k` in cascade mode, only as many candidates as fit RERANK_BUDGET_MS are
+    scored (in first-stage order), stopping early once the top-k stops changing.
+    """
+    if not hits:
         return []
 
-    # Create pairs of (query, result) for re-ranking
-    pairs = [[query, res] for res in results]
+    if k and RERANK_MODE == "cascade":
+        limit = rerank_cache.pairs_within(RERANK_BUDGET_MS)
+        return cascade_rerank(
+            lambda chunk: rerank_scores(query, chunk), hits, k, limit,
+            RERANK_CASCADE_STEP, RERANK_BUDGET_MS, RERANK_CASCADE_PATIENCE
+        )
 
-    # Predict relevance scores
-    scores = cross_encoder.predict(pairs)
+    scores = rerank_scores(query, hits)
+    return [hits[position] for position in np.argsort(-scores, kind="stable")]
 
-    # Sort results by descending score
-    reranked_results = [
-        result for result, _ in sorted(zip(results, scores), key=lambda x: x[1], reverse=True)
-    ]
+
+def rerank_results(query, results, k=None):
+    """
+    Re-rank results using a cross-encoder model.
+    """
+    if not results:
+        return []
+
+    reranked_results = [hit["text"] for hit in rerank_hits(query, [{"text": res} for res in results], k)]
 
     print(f"Re-ranked {len(reranked_results)} items.")
     return reranked_results
 
 
-def hybrid_search(query, k=5):
+def vector_search(query, k=5, filters=None, nprobe=None, ef_search=None, return_vectors=False):
     """
-    Perform hybrid search using FAISS and BM25, followed by re-ranking.
+    FAISS search returning hits as dicts with "id", "text" and "distance".
+    With `return_vectors`, each hit also carries its stored "vector", so later
+    stages (dedup, clustering) never need to re-encode indexed documents.
     """
-    faiss_index = get_faiss_index()
-    indexed_data = get_indexed_data()
-
-    print("Performing hybrid search...")
+    query_embedding = encode_texts([query], persist=False)
+    D, I = search_index(query_embedding, k, nprobe=nprobe, ef_search=ef_search, filters=filters)
 
-    # # BM25 Search
-    # print("Searching BM25 index...")
-    # bm25_indices, bm25_results = search_bm25(query, k)
-    # print(f"BM25 results: {len(bm25_results)} items.")
+    hits = []
+    for distance, document_id in zip(D[0], I[0]):
+        documents = get_documents([document_id])
+        if documents:
+            hits.append({"id": int(document_id), "text": documents[0]["text"], "distance": float(distance)})
 
-    # # FAISS Search
-    # if faiss_index.ntotal == 0:
-    #     print("FAISS index is empty. Returning BM25 results only.")
-    #     return bm25_results
+    if return_vectors and hits:
+        vectors = get_vectors([hit["id"] for hit in hits])
+        for hit, vector in zip(hits, vectors):
+            hit["vector"] = vector
+    return hits
 
-    print("Encoding query for FAISS search...")
-    query_embedding = embedding_model.encode([query], convert_to_tensor=False)
-    D, I = faiss_index.search(np.array(query_embedding), k)
-    faiss_results = [indexed_data[i] for i in I[0] if i < len(indexed_data)]
-    print(f"FAISS results: {len(faiss_results)} items.")
 
-    # Combine and Deduplicate
-    combined_results = list(dict.fromkeys(faiss_results))
-
-    # Re-rank Combined Results
-    reranked_results = rerank_results(query, combined_results)
+def lexical_search(query, k=5, filters=None):
+    """
+    BM25 search returning hits as dicts with "id", "text" and "bm25_score".
+    `filters` are applied the same way as for FAISS (partition + metadata).
+    """
+    if not len(bm25_index):
+        return []
+    allowed = matching_ids(filters) if filters else None
+    if allowed is not None and not allowed:
+        return []
 
-    return reranked_results
+    ids, scores = bm25_index.search(query, k, document_ids=allowed)
+    scores_by_id = dict(zip(ids.tolist(), scores.tolist()))
+    return [
+        {"id": document["id"], "text": document["text"], "bm25_score": scores_by_id[document["id"]]}
+        for document in get_documents(ids)
+    ]
 
 
-def faiss_only_search(query, k=5):
+def fuse_results(bm25_hits, faiss_hits, method=HYBRID_FUSION):
+    """
+    Merge the BM25 and FAISS rankings into one list, best first.
+    "rrf": weighted reciprocal-rank fusion, sum(weight / (RRF_K + rank)).
+    "weighted": min-max normalized BM25 scores / FAISS similarities, weighted sum.
     """
-    Perform FAISS search only (BM25 temporarily commented out).
+    fused = {}
+    for weight, hits, key in ((BM25_WEIGHT, bm25_hits, "bm25_score"), (FAISS_WEIGHT, faiss_hits, "distance")):
+        if method == "weighted" and hits:
+            # Higher is better for BM25, lower is better for L2 distance
+            values = np.array([hit[key] for hit in hits], dtype="float64")
+            if key == "distance":
+                values = -values
+            spread = values.max() - values.min()
+            contributions = (values - values.min()) / spread if spread > 0 else np.ones(len(values))
+        else:
+            contributions = [1.0 / (RRF_K + rank + 1) for rank in range(len(hits))]
+
+        for hit, contribution in zip(hits, contributions):
+            entry = fused.setdefault(hit["id"], {"fused_score": 0.0})
+            entry.update(hit)
+            entry["fused_score"] += weight * float(contribution)
+
+    return sorted(fused.values(), key=lambda hit: hit["fused_score"], reverse=True)
+
+
+async def hybrid_search(query, k=5, filters=None, nprobe=None, ef_search=None, return_vectors=False):
+    """
+    Perform hybrid search: BM25 and FAISS run concurrently, their rankings are fused
+    (HYBRID_FUSION), and at most RERANK_POOL fused candidates are re-ranked by the cross-encoder.
+    `filters` (e.g. {"location": "Austin"}) restrict the search to matching documents.
+    `nprobe` / `ef_search` tune IVF / HNSW recall vs. latency for this query.
+    With `return_vectors`, returns re-ranked hits (see `vector_search`) instead of texts.
     """
     faiss_index = get_faiss_index()
-    indexed_data = get_indexed_data()
-
-    print("Encoding query for FAISS search...")
-    faiss_results, faiss_scores = [], []
-    
-    # Perform FAISS Search
-    if faiss_index.ntotal > 0:
-        query_embedding = embedding_model.encode([query], convert_to_tensor=False)
-        D, I = faiss_index.search(np.array(query_embedding), k)
-        faiss_results = [indexed_data[i] for i in I[0] if i < len(indexed_data)]
-        reranked = rerank_results(query, faiss_results)
-    else:
-        print("FAISS index is empty. No results found.")
-    
-    print(f"FAISS search returned {len(faiss_results)} items.")
+    # Each retriever fills the re-rank pool on its own, so fusion has RERANK_POOL candidates to choose from
+    depth = max(candidate_count(k, faiss_index), RERANK_POOL)
+
+    print("Performing hybrid search...")
+    bm25_hits, faiss_hits = await gather(
+        to_thread(lexical_search, query, depth, filters),
+        to_thread(vector_search, query, depth, filters, nprobe, ef_search) if faiss_index.ntotal else sleep(0, []),
+    )
+    print(f"BM25 results: {len(bm25_hits)} items. FAISS results: {len(faiss_hits)} items.")
+
+    candidates = fuse_results(bm25_hits, faiss_hits)[:max(k, RERANK_POOL)]
+    if not candidates:
+        print("Hybrid search found no results.")
+        return []
+
+    reranked = (await to_thread(rerank_hits, query, candidates, k))[:k]
+    print(f"Re-ranked {len(candidates)} fused candidates.")
+
+    if not return_vectors:
+        return [hit["text"] for hit in reranked]
+    for hit, vector in zip(reranked, get_vectors([hit["id"] for hit in reranked])):
+        hit["vector"] = vector
     return reranked
 
 
+def faiss_only_search(query, k=5, filters=None, nprobe=None, ef_search=None, return_vectors=False):
+    """
+    `hybrid_search` without BM25: FAISS hits (see `vector_search`) re-ranked by the cross-encoder.
+    Returns texts, or the re-ranked hits with `return_vectors`.
+    """
+    faiss_index = get_faiss_index()
+    if not faiss_index.ntotal:
+        return []
+    hits = vector_search(query, candidate_count(k, faiss_index), filters, nprobe, ef_search, return_vectors)
+    reranked = rerank_hits(query, hits, k)[:k]
+    return reranked if return_vectors else [hit["text"] for hit in reranked]
@@ -0,0 +1,151 @@
+import faiss
+import os
+import numpy as np
+
+
+def single_list_index(index, exclude=()):
+    """
+    Copy a flat IDMap2 index (float32 / float16 / sq8 / pq codes) into an IVF with a
+    single list, skipping the ids in `exclude`. Searching the one list scans every
+    code, so results match the flat index exactly, but unlike a flat index faiss
+    can memory-map it.
+    """
+    inner = faiss.downcast_index(index.index)
+    ids = faiss.vector_to_array(index.id_map)
+    codes = faiss.vector_to_array(inner.codes).reshape(len(ids), inner.code_size)
+    if len(exclude):
+        keep = ~np.isin(ids, exclude)
+        ids, codes = ids[keep], codes[keep]
+
+    quantizer = faiss.IndexFlatL2(index.d)
+    quantizer.add(np.zeros((1, index.d), dtype="float32"))
+    # Codes of the vectors themselves, not of residuals, as in the flat index
+    if isinstance(inner, faiss.IndexScalarQuantizer):
+        ivf = faiss.IndexIVFScalarQuantizer(quantizer, index.d, 1, inner.sq.qtype, faiss.METRIC_L2, False)
+        ivf.sq = inner.sq
+    elif isinstance(inner, faiss.IndexPQ):
+        ivf = faiss.IndexIVFPQ(quantizer, index.d, 1, inner.pq.M, inner.pq.nbits)
+        ivf.by_residual = False
+        ivf.pq = inner.pq
+    else:
+        ivf = faiss.IndexIVFFlat(quantizer, index.d, 1)
+    ivf.own_fields = True
+    quantizer.this.disown()
+    ivf.is_trained = True
+    if len(ids):
+        ids, codes = np.ascontiguousarray(ids), np.ascontiguousarray(codes)
+        ivf.invlists.add_entries(0, len(ids), faiss.swig_ptr(ids), faiss.swig_ptr(codes))
+        ivf.ntotal = len(ids)
+    ivf.set_direct_map_type(faiss.DirectMap.Hashtable)  # reconstruct + remove by id
+    return ivf
+
+
+class SnapshotIndex:
+    """
+    A snapshot's IVF index memory-mapped read-only, plus a small writable delta.
+
+    The base's inverted lists stay in the page cache, shared by every worker that
+    maps the same snapshot file, and never change: vectors added after the snapshot
+    go to `delta` (a flat IDMap2 index in process memory), and removed base rows are
+    excluded at search time by the caller until the next snapshot rewrites the base.
+    `mode` / `storage` are the index mode and storage the snapshot was written from
+    (a flat snapshot is stored as a one-list IVF, see single_list_index).
+    """
+
+    def __init__(self, path: str, mode: str, storage: str, delta):
+        self.file = open(path, "rb")  # Stays readable after the snapshot directory is replaced
+        self.base = faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        self.mode, self.storage, self.delta = mode, storage, delta
+        self.d = self.base.d
+        invlists = self.base.invlists
+        self.base_ids = np.sort(np.concatenate([np.zeros(0, dtype="int64")] + [
+            faiss.rev_swig_ptr(invlists.get_ids(list_no), invlists.list_size(list_no)).copy()
+            for list_no in range(self.base.nlist) if invlists.list_size(list_no)
+        ]))
+
+    @property
+    def ntotal(self) -> int:
+        return self.base.ntotal + self.delta.ntotal
+
+    def ids(self):
+        return np.concatenate([self.base_ids, faiss.vector_to_array(self.delta.id_map)])
+
+    def in_base(self, ids):
+        ids = np.asarray(ids, dtype="int64")
+        positions = np.minimum(np.searchsorted(self.base_ids, ids), max(len(self.base_ids) - 1, 0))
+        return self.base_ids[positions] == ids if len(self.base_ids) else np.zeros(len(ids), dtype=bool)
+
+    def add_with_ids(self, vectors, ids):
+        self.delta.add_with_ids(vectors, ids)
+
+    def reconstruct_batch(self, ids):
+        ids = np.asarray(ids, dtype="int64")
+        vectors = np.zeros((len(ids), self.d), dtype="float32")
+        in_base = self.in_base(ids)
+        if in_base.any():
+            vectors[in_base] = self.base.reconstruct_batch(ids[in_base])
+        if not in_base.all():
+            vectors[~in_base] = self.delta.reconstruct_batch(ids[~in_base])
+        return vectors
+
+    def reconstruct(self, document_id: int):
+        return self.reconstruct_batch([document_id])[0]
+
+    def search(self, queries, k: int, params=None):
+        """
+        Search base and delta with the same selector and merge by distance.
+        `params` are the usual per-query parameters (nprobe applies to the base).
+        """
+        selector = params.sel if params is not None else None
+        base_params = faiss.SearchParametersIVF(nprobe=getattr(params, "nprobe", self.base.nprobe))
+        delta_params = faiss.SearchParameters()
+        if selector is not None:
+            base_params.sel = delta_params.sel = selector
+        distances, ids = self.base.search(queries, k, params=base_params)
+        if not self.delta.ntotal:
+            return distances, ids  # faiss' BLAS path crashes on an empty flat index (>= 20 queries)
+        delta_distances, delta_ids = self.delta.search(queries, k, params=delta_params)
+        distances, ids = np.hstack([distances, delta_distances]), np.hstack([ids, delta_ids])
+        order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(distances, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+    def remove_from_delta(self, ids):
+        """
+        Drop delta rows for `ids`; base rows cannot be removed. Returns the ids removed.
+        """
+        ids = np.asarray(ids, dtype="int64")
+        removed = ids[np.isin(ids, faiss.vector_to_array(self.delta.id_map))]
+        if len(removed):
+            self.delta.remove_ids(faiss.IDSelectorBatch(removed))
+        return removed
+
+    def delta_rows(self):
+        ids = faiss.vector_to_array(self.delta.id_map)
+        if not len(ids):
+            return ids, np.zeros((0, self.d), dtype="float32")
+        return ids, self.delta.index.reconstruct_n(0, len(ids))
+
+    def merged(self, ids, vectors, exclude=()):
+        """
+        Writable in-memory copy of the base without `exclude`, plus `vectors` under `ids`
+        (the delta rows, copied by the caller under its lock). Reads the snapshot file
+        in full; used to write the next snapshot.
+        """
+        offset = 0
+
+        def read(size):
+            nonlocal offset
+            data = os.pread(self.file.fileno(), size, offset)
+            offset += len(data)
+            return data
+
+        index = faiss.read_index(faiss.PyCallbackIOReader(read))
+        exclude = np.asarray(exclude, dtype="int64")
+        removed = exclude[self.in_base(exclude)]
+        if len(removed):
+            # The IVF hashtable direct map only removes through an IDSelectorArray
+            index.remove_ids(faiss.IDSelectorArray(len(removed), faiss.swig_ptr(removed)))
+        keep = ~np.isin(ids, exclude)
+        if keep.any():
+            index.add_with_ids(vectors[keep], ids[keep])
+        return index
@@ -41,4 +41,6 @@ except redis.ConnectionError as e:
 
 # Collections
 chat_collection = db["chats"]
-library_collection = db["library"]
\ No newline at end of file
+library_collection = db["library"]
+reddit_posts_collection = db["reddit_posts"]
+reddit_queries_collection = db["reddit_queries"]
\ No newline at end of file
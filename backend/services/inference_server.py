@@ -0,0 +1,195 @@
+"""
+Inference server: one process per host owns the embedder, cross-encoder and
+summarizer, and every uvicorn worker reaches it over a local unix socket.
+
+    python -m services.inference_server                    # listens on INFERENCE_SERVER_SOCKET
+    INFERENCE_SERVER_SOCKET=/tmp/inference.sock uvicorn main:app --workers 4
+
+With INFERENCE_SERVER_SOCKET set in the web workers, the model registry hands
+out `RemoteModel` proxies instead of loading weights, so model memory is paid
+once per host. Proxies block their calling thread, so async code calls them
+through `asyncio.to_thread`, the same as the in-process models.
+
+Wire format (both directions): 4-byte big-endian header length, a JSON header,
+then `header["bytes"]` bytes of payload (float32 arrays for encode / predict).
+"""
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+import numpy as np
+
+INFERENCE_SERVER_SOCKET = os.getenv("INFERENCE_SERVER_SOCKET", "")  # "" = models run in-process
+INFERENCE_SERVER_TIMEOUT = float(os.getenv("INFERENCE_SERVER_TIMEOUT", 120))  # Seconds per call
+DEFAULT_SOCKET_PATH = "/tmp/order-answer-inference.sock"
+
+
+def send_message(connection, header: dict, payload: bytes = b""):
+    header = dict(header, bytes=len(payload))
+    encoded = json.dumps(header).encode("utf-8")
+    connection.sendall(struct.pack(">I", len(encoded)) + encoded + payload)
+
+
+def _receive_exactly(connection, size: int) -> bytes:
+    chunks, remaining = [], size
+    while remaining:
+        chunk = connection.recv(min(remaining, 1 << 20))
+        if not chunk:
+            raise ConnectionError("Inference connection closed.")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def receive_message(connection):
+    """
+    Read one (header, payload) frame; returns (None, b"") on a clean close.
+    """
+    prefix = connection.recv(4, socket.MSG_WAITALL)
+    if not prefix:
+        return None, b""
+    if len(prefix) < 4:
+        prefix += _receive_exactly(connection, 4 - len(prefix))
+    header = json.loads(_receive_exactly(connection, struct.unpack(">I", prefix)[0]))
+    return header, _receive_exactly(connection, header.get("bytes", 0))
+
+
+def _array_message(array):
+    array = np.ascontiguousarray(array, dtype="float32")
+    return {"dtype": "float32", "shape": list(array.shape)}, array.tobytes()
+
+
+def handle_request(registry, header: dict):
+    """
+    Run one request against the local models; small encode / predict requests from
+    different web workers share micro-batches. Returns (response header, payload).
+    """
+    operation = header.get("op")
+    if operation == "encode":
+        return _array_message(registry.batched("embedder").encode(header["texts"], convert_to_tensor=False))
+    if operation == "predict":
+        return _array_message(registry.batched("cross_encoder").predict(header["pairs"]))
+    if operation == "summarize":
+        return {"result": registry.get("summarizer")(header["text"], **header.get("kwargs", {}))}, b""
+    if operation == "stats":
+        return {"result": registry.get_stats()}, b""
+    raise ValueError(f"Unknown inference operation '{operation}'.")
+
+
+class InferenceRequestHandler(socketserver.BaseRequestHandler):
+    """
+    Serves one client connection (one web worker thread) until it closes.
+    """
+
+    def handle(self):
+        while True:
+            try:
+                header, _ = receive_message(self.request)
+            except (ConnectionError, OSError):
+                return
+            if header is None:
+                return
+            try:
+                response, payload = handle_request(self.server.registry, header)
+            except Exception as e:
+                print(f"[ERROR] Inference request '{header.get('op')}' failed: {str(e)}")
+                response, payload = {"error": str(e)}, b""
+            try:
+                send_message(self.request, response, payload)
+            except OSError:
+                return
+
+
+class InferenceServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, registry):
+        if os.path.exists(path):
+            os.remove(path)  # Stale socket from a previous run
+        self.registry = registry
+        super().__init__(path, InferenceRequestHandler)
+        os.chmod(path, 0o600)
+
+
+class RemoteModel:
+    """
+    Proxy for a model served by the inference server, with the same call surface
+    as the local model (`encode`, `predict`, or calling a summarizer pipeline).
+    Each thread keeps its own connection, so concurrent callers don't serialize.
+    """
+
+    def __init__(self, role: str, path: str = None):
+        self.role = role
+        self.path = path or INFERENCE_SERVER_SOCKET or DEFAULT_SOCKET_PATH
+        self.local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            connection.settimeout(INFERENCE_SERVER_TIMEOUT)
+            connection.connect(self.path)
+            self.local.connection = connection
+        return connection
+
+    def _close(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
+    def _call(self, header: dict):
+        for attempt in range(2):
+            try:
+                connection = self._connection()
+                send_message(connection, header)
+                response, payload = receive_message(connection)
+                if response is None:
+                    raise ConnectionError("Inference server closed the connection.")
+                break
+            except (ConnectionError, FileNotFoundError):
+                # Refused / missing socket or a connection dropped by a server restart: reconnect once
+                self._close()
+                if attempt:
+                    raise
+            except OSError:
+                # Timeouts included: the request may still be running on the server, so it is not resent
+                self._close()
+                raise
+        if "error" in response:
+            raise RuntimeError(f"Inference server error: {response['error']}")
+        if "shape" in response:
+            return np.frombuffer(payload, dtype=response["dtype"]).reshape(response["shape"])
+        return response["result"]
+
+    def ping(self) -> dict:
+        """
+        Server-side model stats; raises ConnectionError / FileNotFoundError while the server is down.
+        """
+        return self._call({"op": "stats"})
+
+    def encode(self, texts, convert_to_tensor=False, **kwargs):
+        return self._call({"op": "encode", "texts": [texts] if isinstance(texts, str) else list(texts)})
+
+    def predict(self, pairs, **kwargs):
+        return self._call({"op": "predict", "pairs": [list(pair) for pair in pairs]})
+
+    def __call__(self, text, **kwargs):
+        return self._call({"op": "summarize", "text": text, "kwargs": kwargs})
+
+
+def main():
+    from services.model_registry import ModelRegistry, MODEL_WARMUP
+
+    path = INFERENCE_SERVER_SOCKET or DEFAULT_SOCKET_PATH
+    registry = ModelRegistry()
+    registry.preload(warmup=MODEL_WARMUP)
+    with InferenceServer(path, registry) as server:
+        print(f"[INFO] Inference server listening on {path}.")
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
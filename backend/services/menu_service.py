@@ -2,12 +2,32 @@ from utils.cache_utils import get_from_cache, set_to_cache
 from fastapi import HTTPException
 from asyncio import gather, wait_for
 from services.RAG.rag_service import process_rag_pipeline
-from utils.yelp_utils import fetch_yelp_data, fetch_yelp_reviews_for_businesses
-from utils.reddit_utils import fetch_reddit_posts, fetch_multiple_reddit_comments
-from services.RAG.indexing_service import update_faiss_index
-from services.RAG.search_service import faiss_only_search
+from utils.yelp_utils import fetch_yelp_data, stream_yelp_reviews
+from utils.reddit_utils import fetch_reddit_posts, stream_reddit_comments
+from services.RAG.ingestion_pipeline import run_ingestion_pipeline
+from services.RAG.search_service import hybrid_search
 from services.llm_service import generate_customizations, generate_suggestions, generate_dish_insight
 
+REDDIT_SUBREDDITS = ["food", "restaurants", "Cooking", "Allrecipes"]
+
+
+async def stream_reddit_comments_for_dish(dish_name: str, restaurant_name: str, limit: int):
+    """
+    Search Reddit for the dish, then stream comments of the top 10 posts per subreddit.
+    """
+    reddit_posts = await wait_for(
+        fetch_reddit_posts(f"{dish_name} {restaurant_name}", REDDIT_SUBREDDITS, limit), timeout=15
+    )
+
+    top_posts = []
+    for sub in REDDIT_SUBREDDITS:
+        posts = [post for post in reddit_posts if post["subreddit"].lower() == sub.lower()]
+        top_posts.extend(sorted(posts, key=lambda x: x['score'], reverse=True)[:10])
+
+    async for comments in stream_reddit_comments(top_posts):
+        yield comments
+
+
 async def decode_menu_service(
     dish_name: str,
     restaurant_name: str,
@@ -44,44 +64,29 @@ async def decode_menu_service(
             except Exception as e:
                 print(f"Yelp Error: {e}")
 
-            # Fetch Yelp reviews if Yelp data is available
-            if yelp_data:
-                business_ids = [business["id"] for business in yelp_data]
-                print("Fetching Yelp reviews...")
-                if business_ids:
-                    tasks = [fetch_yelp_reviews_for_businesses([business_id]) for business_id in business_ids]
-                    yelp_reviews_list = await gather(*tasks)
-                    yelp_reviews = [review for reviews in yelp_reviews_list for review in reviews]
-                    print(f"[INFO] Fetched {len(yelp_reviews)} reviews.")
-
-            # Step 2: Fetch Reddit data
-            subreddits = ["food", "restaurants", "Cooking", "Allrecipes"]
-            reddit_tasks = [fetch_reddit_posts(f"{dish_name} {restaurant_name}", [sub], limit) for sub in subreddits]
-            reddit_posts = await wait_for(gather(*reddit_tasks), timeout=15)
-
-            for posts in reddit_posts:
-                top_posts = sorted(posts, key=lambda x: x['score'], reverse=True)[:10]
-                comments = await fetch_multiple_reddit_comments(top_posts) if top_posts else []
-                reddit_comments.extend(comments)
-
-            print(f"[INFO] Fetched {len(reddit_comments)} Reddit comments.")
-
-            # Step 3: Update FAISS if new data is available
-            print(f"[INFO] Updating FAISS index...")
-            if yelp_reviews or reddit_comments:
-                await update_faiss_index(yelp_reviews, reddit_comments)
-                print(f"[INFO] FAISS index updated.")
+            # Steps 2-3: Stream Yelp reviews and Reddit comments into FAISS
+            # (reviews are embedded and indexed while later fetches are still in flight)
+            business_ids = [business["id"] for business in yelp_data] if yelp_data else []
+            print(f"[INFO] Fetching reviews and updating FAISS index...")
+            ingested = await run_ingestion_pipeline({
+                "yelp": stream_yelp_reviews(business_ids),
+                "reddit": stream_reddit_comments_for_dish(dish_name, restaurant_name, limit),
+            }, metadata={"location": location, "dish": dish_name})
+            yelp_reviews = ingested["yelp"]
+            reddit_comments = ingested["reddit"]
+            print(f"[INFO] Fetched {len(yelp_reviews)} reviews and {len(reddit_comments)} Reddit comments.")
 
             # Step 4: Perform Hybrid Search with Weighted Combination
             print(f"[INFO] Performing hybrid search...")
-            hybrid_results = faiss_only_search(dish_name, k=limit)
+            hybrid_results = await hybrid_search(dish_name, k=limit, filters={"location": location})
 
             # Step 5: Process through RAG pipeline for final summarization
             print(f"[INFO] Generating insights...")
             response = await process_rag_pipeline(
                 dish_name=dish_name,
                 yelp_reviews=yelp_reviews or hybrid_results,
-                reddit_comments=reddit_comments or []
+                reddit_comments=reddit_comments or [],
+                filters={"location": location},
             )
 
             # Cache intermediate results (Steps 1-5)
@@ -0,0 +1,345 @@
+import importlib.util
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from utils.micro_batcher import MicroBatcher
+
+# Models shared by every module in the process
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+CROSS_ENCODER_MODEL_NAME = os.getenv("CROSS_ENCODER_MODEL_NAME", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+SUMMARIZER_MODEL_NAME = os.getenv("SUMMARIZER_MODEL_NAME", "facebook/bart-large-cnn")
+
+# "true": each model loads on first use; "false": all load (in parallel) at startup,
+# and /ready reports 503 until they have
+MODEL_LAZY_LOAD = os.getenv("MODEL_LAZY_LOAD", "false").lower() == "true"
+# Run one inference per model before reporting ready
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "true").lower() == "true"
+# Local safetensors copies of each model, written on first download and loaded
+# (memory-mapped) on later boots without touching the hub; "" disables
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", "data/models")
+
+# Inference backend for the embedder and cross-encoder: "torch" (fp32), "onnx" (ONNX Runtime fp32)
+# or "onnx-int8" (dynamically quantized weights); check with `python -m services.RAG.backend_parity`
+INFERENCE_BACKENDS = ("torch", "onnx", "onnx-int8")
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", INFERENCE_BACKEND)
+CROSS_ENCODER_BACKEND = os.getenv("CROSS_ENCODER_BACKEND", INFERENCE_BACKEND)
+
+# Merge concurrent small encode / predict calls into one forward pass (see utils.micro_batcher)
+MICRO_BATCHING = os.getenv("MICRO_BATCHING", "true").lower() == "true"
+
+
+def _load_embedder(name):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(name)
+
+
+def _load_cross_encoder(name):
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(name)
+
+
+def _load_summarizer(name):
+    from transformers import pipeline
+    return pipeline("summarization", model=name, device=-1)
+
+
+def with_backend(kind: str, load_torch, backend: str):
+    """
+    Loader that converts the torch model to ONNX Runtime for the "onnx" backends
+    (or loads an already converted local copy). The "onnx" backends need the
+    optional dependencies in requirements-onnx.txt.
+    """
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}'. Choose from {INFERENCE_BACKENDS}.")
+
+    def load(source):
+        if backend == "torch":
+            return load_torch(source)
+        if importlib.util.find_spec("onnxruntime") is None:
+            raise ImportError(
+                f"The '{backend}' backend for the {kind} needs onnxruntime "
+                "(pip install -r requirements-onnx.txt), or set INFERENCE_BACKEND=torch."
+            )
+
+        from services.onnx_backend import convert_to_onnx, is_onnx_directory, load_onnx_model
+        if os.path.isdir(source) and is_onnx_directory(source):
+            return load_onnx_model(source)
+        return convert_to_onnx(load_torch(source), kind, quantize=backend == "onnx-int8")
+    return load
+
+
+# Role -> (model name, loader); loaders accept a hub name or a local directory
+MODEL_LOADERS = {
+    "embedder": (EMBEDDING_MODEL_NAME, with_backend("embedder", _load_embedder, EMBEDDING_BACKEND)),
+    "cross_encoder": (CROSS_ENCODER_MODEL_NAME, with_backend("cross_encoder", _load_cross_encoder, CROSS_ENCODER_BACKEND)),
+    "summarizer": (SUMMARIZER_MODEL_NAME, _load_summarizer),
+}
+
+# Role -> backend; non-torch variants get their own local copy
+MODEL_VARIANTS = {
+    "embedder": EMBEDDING_BACKEND,
+    "cross_encoder": CROSS_ENCODER_BACKEND,
+}
+
+# Role -> function writing a loaded model to a local directory (safetensors, or the ONNX export)
+MODEL_SAVERS = {
+    "embedder": lambda model, path: model.save(path, safe_serialization=True),
+    "cross_encoder": lambda model, path: model.save(path, safe_serialization=True),
+    "summarizer": lambda model, path: model.save_pretrained(path, safe_serialization=True),
+}
+
+# Role -> one small inference, so the first real request doesn't pay for lazy allocations
+MODEL_WARMUPS = {
+    "embedder": lambda model: model.encode(["warmup query"]),
+    "cross_encoder": lambda model: model.predict([["warmup query", "warmup document"]]),
+    "summarizer": lambda model: model("warmup " * 50, max_length=20, min_length=5, do_sample=False),
+}
+
+
+class BatchedEmbedder:
+    """
+    Embedder proxy: small `encode` calls (query embeddings) from concurrent requests
+    share one batched forward pass; large calls (ingestion batches) go straight through.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.batcher = MicroBatcher(lambda texts: model.encode(texts, convert_to_tensor=False))
+
+    def encode(self, texts, convert_to_tensor=False, **kwargs):
+        texts = [texts] if isinstance(texts, str) else list(texts)
+        if convert_to_tensor or kwargs or len(texts) >= self.batcher.max_batch_size:
+            return self.model.encode(texts, convert_to_tensor=convert_to_tensor, **kwargs)
+        return self.batcher.submit(texts)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+
+class BatchedCrossEncoder:
+    """
+    Cross-encoder proxy: re-rank pairs from concurrent requests are scored in one batch.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.batcher = MicroBatcher(lambda pairs: model.predict(pairs))
+
+    def predict(self, pairs, **kwargs):
+        pairs = [list(pair) for pair in pairs]
+        if kwargs or len(pairs) >= self.batcher.max_batch_size:
+            return self.model.predict(pairs, **kwargs)
+        return self.batcher.submit(pairs)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+
+# Role -> micro-batching proxy
+BATCHED_MODELS = {
+    "embedder": BatchedEmbedder,
+    "cross_encoder": BatchedCrossEncoder,
+}
+
+
+def _rss_bytes():
+    """
+    Resident memory of this process (Linux), or None where /proc is unavailable.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _parameter_bytes(model):
+    """
+    Bytes held by a model's torch parameters and buffers (pipelines/cross-encoders wrap a `.model`),
+    or by its ONNX model file.
+    """
+    if hasattr(model, "model_bytes"):
+        return model.model_bytes()
+    module = model if hasattr(model, "parameters") else getattr(model, "model", None)
+    if module is None or not hasattr(module, "parameters"):
+        return None
+    tensors = list(module.parameters()) + list(module.buffers())
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+
+class ModelRegistry:
+    """
+    Loads each model once per process, on first use, and shares it between modules.
+    Concurrent first calls for the same model wait for a single load.
+    """
+
+    def __init__(self, loaders: dict = MODEL_LOADERS, savers: dict = MODEL_SAVERS,
+                 warmups: dict = MODEL_WARMUPS, cache_dir: str = MODEL_CACHE_DIR, variants: dict = MODEL_VARIANTS):
+        self.loaders = loaders
+        self.variants = variants
+        self.savers = savers
+        self.warmups = warmups
+        self.cache_dir = cache_dir
+        self.models = {}
+        self.stats = {}
+        self.locks = {role: threading.Lock() for role in loaders}
+        self.batched_models = {}
+        self.batched_lock = threading.Lock()
+
+    def get(self, role: str):
+        model = self.models.get(role)
+        if model is not None:
+            return model
+        if role not in self.loaders:
+            raise KeyError(f"Unknown model role '{role}'.")
+
+        with self.locks[role]:
+            if role in self.models:
+                return self.models[role]
+            name, loader = self.loaders[role]
+            path = self.local_path(name, self.variants.get(role))
+            source = path if path and os.path.isdir(path) else name
+            print(f"[INFO] Loading {role} model from '{source}'...")
+            rss_before, started = _rss_bytes(), time.time()
+            model = loader(source)
+            rss_after = _rss_bytes()
+            if path and source == name:
+                self._save_local(role, model, path)
+
+            parameter_bytes = _parameter_bytes(model)
+            self.stats[role] = {
+                "name": name,
+                "loaded": True,
+                "source": "local" if source == path else "hub",
+                "model_class": type(model).__name__,
+                "load_seconds": round(time.time() - started, 2),
+                "parameter_mb": round(parameter_bytes / 2**20, 1) if parameter_bytes is not None else None,
+                "rss_delta_mb": round((rss_after - rss_before) / 2**20, 1) if rss_before is not None else None,
+            }
+            self.models[role] = model
+            print(f"[INFO] Loaded {role} model: {self.stats[role]}")
+            return model
+
+    def local_path(self, name: str, variant: str = None):
+        if not self.cache_dir:
+            return None
+        if variant and variant != "torch":
+            name = f"{name}-{variant}"
+        return os.path.join(self.cache_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", name))
+
+    def _save_local(self, role: str, model, path: str):
+        """
+        Write the pre-converted copy next boots load from; written aside and renamed,
+        so a concurrent worker never sees a half-written directory.
+        """
+        if role not in self.savers:
+            return
+        staging = f"{path}.tmp-{os.getpid()}"
+        try:
+            self.savers[role](model, staging)
+            os.replace(staging, path)
+            print(f"[INFO] Saved {role} model to '{path}'.")
+        except Exception as e:
+            print(f"[WARN] Could not save {role} model locally: {str(e)}")
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def warm_up(self, role: str):
+        if role in self.warmups:
+            started = time.time()
+            self.warmups[role](self.get(role))
+            self.stats[role]["warmup_seconds"] = round(time.time() - started, 2)
+
+    def batched(self, role: str):
+        """
+        The model behind its micro-batching proxy (the model itself if it has none
+        or MICRO_BATCHING is off).
+        """
+        if not MICRO_BATCHING or role not in BATCHED_MODELS:
+            return self.get(role)
+        if role not in self.batched_models:
+            model = self.get(role)
+            with self.batched_lock:
+                self.batched_models.setdefault(role, BATCHED_MODELS[role](model))
+        return self.batched_models[role]
+
+    def is_loaded(self, role: str) -> bool:
+        return role in self.models
+
+    def preload(self, roles=None, warmup: bool = False):
+        """
+        Load models up front (all of them by default), in parallel, optionally
+        running a warmup inference on each.
+        """
+        roles = list(roles or self.loaders)
+
+        def prepare(role):
+            self.get(role)
+            if warmup:
+                self.warm_up(role)
+
+        with ThreadPoolExecutor(max_workers=max(len(roles), 1)) as executor:
+            for future in [executor.submit(prepare, role) for role in roles]:
+                future.result()
+
+    def get_stats(self) -> dict:
+        stats = {
+            role: self.stats.get(role, {"name": name, "loaded": False})
+            for role, (name, _) in self.loaders.items()
+        }
+        for role, model in self.batched_models.items():
+            stats[role] = {**stats[role], "micro_batching": model.batcher.get_stats()}
+        return stats
+
+
+def remote_loaders() -> dict:
+    """
+    Loaders handing out proxies to the host's inference server (see services.inference_server).
+    """
+    from services.inference_server import RemoteModel
+    return {role: (name, lambda _, role=role: RemoteModel(role)) for role, (name, _) in MODEL_LOADERS.items()}
+
+
+# Models run in this process, or in the inference server when INFERENCE_SERVER_SOCKET is set
+if os.getenv("INFERENCE_SERVER_SOCKET"):
+    model_registry = ModelRegistry(remote_loaders(), savers={}, cache_dir="")
+else:
+    model_registry = ModelRegistry()
+
+
+def get_embedder():
+    return model_registry.batched("embedder")
+
+
+def get_cross_encoder():
+    return model_registry.batched("cross_encoder")
+
+
+def get_summarizer():
+    return model_registry.get("summarizer")
+
+
+def summarize(text: str, **kwargs) -> str:
+    """
+    Summary text for one input (blocking; call from a worker thread in async code).
+    """
+    return get_summarizer()(text, **kwargs)[0]["summary_text"]
+
+
+def get_model_stats() -> dict:
+    stats = model_registry.get_stats()
+    if os.getenv("INFERENCE_SERVER_SOCKET"):
+        try:
+            stats["inference_server"] = model_registry.get("embedder").ping()
+        except Exception as e:
+            stats["inference_server"] = {"error": str(e)}
+    return stats
+
+
+if __name__ == "__main__":
+    # Pre-convert every model into MODEL_CACHE_DIR (e.g. while building the image)
+    model_registry.preload()
+    print(get_model_stats())
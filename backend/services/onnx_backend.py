@@ -0,0 +1,204 @@
+"""
+ONNX Runtime inference for the bi-encoder and the cross-encoder, in fp32 or
+with dynamically quantized int8 weights (CPU).
+
+Optional dependency: `pip install -r requirements-onnx.txt`. Models are exported from
+the loaded sentence-transformers model; the exported directory (model file,
+tokenizer, onnx_config.json) is what the model registry caches locally.
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import numpy as np
+
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", 0))  # Intra-op threads; 0 = onnxruntime default
+ONNX_CONFIG_FILE = "onnx_config.json"
+
+# torch.onnx.export keeps global state, so parallel model loads export one at a time
+export_lock = threading.Lock()
+
+
+class OnnxModel:
+    """
+    Tokenizer + onnxruntime session for one exported transformer.
+    """
+
+    def __init__(self, directory: str):
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(directory, ONNX_CONFIG_FILE), encoding="utf-8") as f:
+            self.config = json.load(f)
+        self.directory = directory
+        self.tokenizer = AutoTokenizer.from_pretrained(directory)
+
+        options = onnxruntime.SessionOptions()
+        if ONNX_THREADS:
+            options.intra_op_num_threads = ONNX_THREADS
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(directory, self.config["file_name"]), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+
+    def _run(self, *texts):
+        features = self.tokenizer(
+            *texts, padding=True, truncation=True, max_length=self.config["max_length"], return_tensors="np"
+        )
+        inputs = {name: features[name].astype("int64") for name in self.input_names}
+        return self.session.run(None, inputs)[0], features["attention_mask"]
+
+    def save(self, path: str, **kwargs):
+        shutil.copytree(self.directory, path)
+
+    def model_bytes(self) -> int:
+        return os.path.getsize(os.path.join(self.directory, self.config["file_name"]))
+
+
+class OnnxEmbedder(OnnxModel):
+    """
+    Drop-in for SentenceTransformer.encode (mean / CLS pooling, optional normalization).
+    """
+
+    def encode(self, texts, batch_size: int = 32, convert_to_tensor: bool = False, **kwargs):
+        texts = [texts] if isinstance(texts, str) else list(texts)
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            token_embeddings, attention_mask = self._run(texts[start:start + batch_size])
+            if self.config["pooling"] == "cls":
+                embeddings = token_embeddings[:, 0]
+            else:
+                mask = attention_mask[..., None].astype("float32")
+                embeddings = (token_embeddings * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            if self.config["normalize"]:
+                embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+            batches.append(embeddings.astype("float32"))
+        if not batches:
+            return np.zeros((0, self.config["dimension"]), dtype="float32")
+        return np.vstack(batches)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.config["dimension"]
+
+
+class OnnxCrossEncoder(OnnxModel):
+    """
+    Drop-in for CrossEncoder.predict on (query, document) pairs.
+    """
+
+    def predict(self, pairs, batch_size: int = 32, **kwargs):
+        pairs = list(pairs)
+        scores = []
+        for start in range(0, len(pairs), batch_size):
+            batch = pairs[start:start + batch_size]
+            logits, _ = self._run([query for query, _ in batch], [document for _, document in batch])
+            if self.config["activation"] == "sigmoid":
+                logits = 1 / (1 + np.exp(-logits))
+            scores.append(logits[:, 0] if logits.shape[1] == 1 else logits)
+        return np.concatenate(scores) if scores else np.zeros(0, dtype="float32")
+
+
+def _export_transformer(transformer, tokenizer, directory: str, max_length: int, quantize: bool) -> str:
+    """
+    Export a Hugging Face transformer (first output: token embeddings or logits) to ONNX,
+    dynamically quantizing its weights to int8 when asked. Returns the model file name.
+    """
+    import torch
+
+    sample = tokenizer(["warmup query"], ["warmup document"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+    class FirstOutput(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs)))[0]
+
+    fp32_path = os.path.join(directory, "model.onnx")
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["output"] = {0: "batch"}
+    transformer.eval()
+    with export_lock, torch.no_grad():
+        torch.onnx.export(
+            FirstOutput(transformer), tuple(sample[name] for name in input_names), fp32_path,
+            input_names=input_names, output_names=["output"], dynamic_axes=dynamic_axes, opset_version=14,
+        )
+    tokenizer.save_pretrained(directory)
+    if not quantize:
+        return "model.onnx"
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    quantize_dynamic(fp32_path, os.path.join(directory, "model_int8.onnx"), weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+    return "model_int8.onnx"
+
+
+def export_embedder(model, directory: str, quantize: bool = False):
+    """
+    Export a loaded SentenceTransformer (Transformer -> Pooling [-> Normalize]).
+    """
+    from sentence_transformers.models import Normalize
+
+    pooling = model[1].get_pooling_mode_str()
+    if pooling not in ("mean", "cls"):
+        raise ValueError(f"ONNX export supports mean/CLS pooling, not '{pooling}'.")
+    file_name = _export_transformer(model[0].auto_model, model.tokenizer, directory, model.max_seq_length, quantize)
+    config = {
+        "kind": "embedder",
+        "file_name": file_name,
+        "max_length": model.max_seq_length,
+        "pooling": pooling,
+        "normalize": any(isinstance(module, Normalize) for module in model),
+        "dimension": model.get_sentence_embedding_dimension(),
+    }
+    with open(os.path.join(directory, ONNX_CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump(config, f)
+
+
+def export_cross_encoder(model, directory: str, quantize: bool = False):
+    """
+    Export a loaded CrossEncoder (sequence classification head + its default activation).
+    """
+    import torch
+
+    max_length = model.max_length or min(model.tokenizer.model_max_length, model.config.max_position_embeddings)
+    file_name = _export_transformer(model.model, model.tokenizer, directory, max_length, quantize)
+    config = {
+        "kind": "cross_encoder",
+        "file_name": file_name,
+        "max_length": max_length,
+        "activation": "sigmoid" if isinstance(model.default_activation_function, torch.nn.Sigmoid) else "identity",
+    }
+    with open(os.path.join(directory, ONNX_CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump(config, f)
+
+
+def is_onnx_directory(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, ONNX_CONFIG_FILE))
+
+
+def load_onnx_model(directory: str):
+    with open(os.path.join(directory, ONNX_CONFIG_FILE), encoding="utf-8") as f:
+        kind = json.load(f)["kind"]
+    return OnnxEmbedder(directory) if kind == "embedder" else OnnxCrossEncoder(directory)
+
+
+def convert_to_onnx(model, kind: str, quantize: bool = False):
+    """
+    Export a loaded torch model into a temporary directory and load it with onnxruntime.
+    The directory lives as long as the returned model (whose `save` copies it), and is
+    removed when the model is collected, at exit, or right away if the export fails.
+    """
+    temporary = tempfile.TemporaryDirectory(prefix=f"onnx-{kind}-")
+    try:
+        exporter = export_embedder if kind == "embedder" else export_cross_encoder
+        exporter(model, temporary.name, quantize)
+        onnx_model = load_onnx_model(temporary.name)
+    except BaseException:
+        temporary.cleanup()
+        raise
+    onnx_model.temporary_directory = temporary
+    return onnx_model
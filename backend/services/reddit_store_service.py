@@ -0,0 +1,110 @@
+import os
+import time
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from .db_service import reddit_posts_collection, reddit_queries_collection
+
+# Max age (seconds) before a stored submission's comments are reloaded from Reddit
+REDDIT_SUBMISSION_MAX_AGE = int(os.getenv("REDDIT_SUBMISSION_MAX_AGE", 6 * 3600))
+# Max age (seconds) before a stored search is refreshed incrementally
+REDDIT_QUERY_MAX_AGE = int(os.getenv("REDDIT_QUERY_MAX_AGE", 3600))
+
+
+async def ensure_reddit_indexes():
+    """
+    Create the indexes used by the Reddit post/comment store.
+    """
+    await reddit_posts_collection.create_index([("post_id", ASCENDING)], unique=True)
+    await reddit_posts_collection.create_index([("subreddit", ASCENDING), ("created_utc", DESCENDING)])
+    await reddit_queries_collection.create_index([("refreshed_at", ASCENDING)])
+
+
+def query_key(query: str, subreddits: list) -> str:
+    """
+    Stable key for a search across a set of subreddits.
+    """
+    return f"{query.strip().lower()}|{'+'.join(sorted(sub.lower() for sub in subreddits))}"
+
+
+async def get_stored_comments(post_id: str, max_age: int = None):
+    """
+    Return stored comments for a post, or None if missing or older than `max_age`.
+    """
+    max_age = REDDIT_SUBMISSION_MAX_AGE if max_age is None else max_age
+    try:
+        post = await reddit_posts_collection.find_one(
+            {"post_id": post_id, "comments_fetched_at": {"$gte": time.time() - max_age}},
+            {"comments": 1},
+        )
+    except Exception as e:
+        print(f"[WARN] Reddit store lookup failed for '{post_id}': {str(e)}")
+        return None
+    return post["comments"] if post else None
+
+
+async def save_comments(post_id: str, comments: list):
+    """
+    Persist the comments of a post and stamp when they were fetched.
+    """
+    try:
+        await reddit_posts_collection.update_one(
+            {"post_id": post_id},
+            {"$set": {"comments": comments, "comments_fetched_at": time.time()}},
+            upsert=True,
+        )
+    except Exception as e:
+        print(f"[WARN] Failed to store Reddit comments for '{post_id}': {str(e)}")
+
+
+async def get_stored_search(query: str, subreddits: list):
+    """
+    Return (posts, watermark, is_fresh) for a stored search, or None if unseen.
+    `watermark` is the newest `created_utc` seen for the query.
+    """
+    try:
+        record = await reddit_queries_collection.find_one({"_id": query_key(query, subreddits)})
+        if not record:
+            return None
+
+        cursor = reddit_posts_collection.find(
+            {"post_id": {"$in": record.get("post_ids", [])}},
+            {"_id": 0, "comments": 0, "comments_fetched_at": 0, "fetched_at": 0},
+        )
+        posts = await cursor.to_list(length=None)
+    except Exception as e:
+        print(f"[WARN] Reddit store search lookup failed for '{query}': {str(e)}")
+        return None
+
+    is_fresh = record.get("refreshed_at", 0) >= time.time() - REDDIT_QUERY_MAX_AGE
+    return posts, record.get("watermark", 0), is_fresh
+
+
+async def save_search(query: str, subreddits: list, posts: list):
+    """
+    Upsert searched posts and advance the query's created_utc watermark.
+    """
+    now = time.time()
+    try:
+        if posts:
+            await reddit_posts_collection.bulk_write(
+                [
+                    UpdateOne(
+                        {"post_id": post["id"]},
+                        {"$set": {**post, "post_id": post["id"], "fetched_at": now}},
+                        upsert=True,
+                    )
+                    for post in posts
+                ],
+                ordered=False,
+            )
+
+        update = {
+            "$set": {"query": query, "subreddits": subreddits, "refreshed_at": now},
+            "$addToSet": {"post_ids": {"$each": [post["id"] for post in posts]}},
+        }
+        if posts:
+            update["$max"] = {"watermark": max(post.get("created_utc", 0) for post in posts)}
+        await reddit_queries_collection.update_one(
+            {"_id": query_key(query, subreddits)}, update, upsert=True
+        )
+    except Exception as e:
+        print(f"[WARN] Failed to store Reddit search for '{query}': {str(e)}")
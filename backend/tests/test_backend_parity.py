@@ -0,0 +1,29 @@
+import numpy as np
+from services.RAG.backend_parity import cross_encoder_parity, top_k_overlap
+
+
+class FakeCrossEncoder:
+    def __init__(self, noise=0.0):
+        self.noise = noise
+
+    def predict(self, pairs):
+        return np.array([len(set(query.split()) & set(document.split())) + self.noise * len(document)
+                         for query, document in pairs], dtype="float32")
+
+
+def test_top_k_overlap():
+    reference = np.array([[0.9, 0.8, 0.1, 0.0], [0.1, 0.2, 0.3, 0.4]])
+    candidate = np.array([[0.9, 0.1, 0.8, 0.0], [0.1, 0.2, 0.3, 0.4]])
+
+    assert top_k_overlap(reference, candidate, 2) == 0.75
+
+
+def test_cross_encoder_parity_flags_reordered_rankings():
+    queries = ["spicy ramen", "tacos"]
+    documents = ["spicy ramen broth", "ramen", "tacos al pastor", "spicy tacos", "bland"]
+
+    same = cross_encoder_parity(FakeCrossEncoder(), FakeCrossEncoder(), queries, documents, k=2)
+    noisy = cross_encoder_parity(FakeCrossEncoder(), FakeCrossEncoder(noise=1.0), queries, documents, k=2)
+
+    assert same["top_k_overlap"] == 1.0 and same["max_abs_diff"] == 0.0
+    assert noisy["top_k_overlap"] < 1.0
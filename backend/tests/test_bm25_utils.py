@@ -0,0 +1,86 @@
+import numpy as np
+from utils.bm25_utils import InvertedIndex, tokenize
+
+REVIEWS = [
+    "Spicy ramen with a rich broth",
+    "The ramen was bland",
+    "Great tacos, spicy salsa",
+    "Tacos al pastor and horchata",
+]
+
+
+def build(documents):
+    index = InvertedIndex()
+    for document_id, text in documents:
+        index.add(document_id, text)
+    return index
+
+
+def test_search_ranks_by_query_terms():
+    index = build(enumerate(REVIEWS))
+
+    ids, scores = index.search("spicy ramen", k=2)
+
+    assert ids[0] == 0
+    assert scores[0] > scores[1] > 0
+
+
+def test_search_restricted_to_document_ids():
+    index = build(enumerate(REVIEWS))
+
+    ids, _ = index.search("spicy", k=5, document_ids={2, 3})
+
+    assert ids.tolist() == [2]
+
+
+def test_removal_matches_an_index_built_without_the_document():
+    index = build(enumerate(REVIEWS))
+    index.remove([0])
+    fresh = build((i, text) for i, text in enumerate(REVIEWS) if i != 0)
+
+    for query in ["spicy ramen", "tacos", "broth"]:
+        ids, scores = index.score(query)
+        fresh_ids, fresh_scores = fresh.score(query)
+        assert ids.tolist() == fresh_ids.tolist()
+        np.testing.assert_allclose(scores, fresh_scores)
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = build(enumerate(REVIEWS))
+    index.remove([3])
+    index.save(str(tmp_path / "bm25.npz"))
+
+    loaded = InvertedIndex()
+    loaded.load(str(tmp_path / "bm25.npz"))
+
+    assert len(loaded) == 3 and 3 not in loaded
+    assert loaded.search("tacos", k=3)[0].tolist() == index.search("tacos", k=3)[0].tolist()
+    assert loaded.add(4, "tacos again")
+
+
+def test_tokenize_folds_case_accents_and_punctuation():
+    assert tokenize("Jalapeño POPPERS, don't miss!") == ["jalapeno", "poppers", "dont", "miss"]
+
+
+def test_batch_search_matches_single_queries():
+    index = build(enumerate(REVIEWS))
+    queries = ["spicy ramen", "tacos", "nothing matches"]
+
+    batch = index.search_batch(queries, k=2)
+
+    for query, (ids, scores) in zip(queries, batch):
+        single_ids, single_scores = index.search(query, k=2)
+        assert ids.tolist() == single_ids.tolist()
+        np.testing.assert_allclose(scores, single_scores)
+    assert len(batch[2][0]) == 0
+
+
+def test_scores_cover_only_documents_sharing_a_term():
+    index = build(enumerate(REVIEWS))
+    index.add(1000, "Saffron rice")
+
+    ids, scores = index.score_batch(["saffron", "ramen"])
+
+    assert ids.tolist() == [0, 1, 1000]
+    assert scores.shape == (3, 2) and scores[2, 0] > 0 and scores[2, 1] == 0
+    assert index.search("saffron ramen", k=5, document_ids=[1, 1000, 5000])[0].tolist() == [1000, 1]
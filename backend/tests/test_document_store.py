@@ -0,0 +1,58 @@
+import pytest
+from services.RAG.document_store import DocumentStore
+
+
+@pytest.fixture(params=["mmap", "memory"])
+def store(request, tmp_path):
+    return DocumentStore(str(tmp_path) if request.param == "mmap" else "")
+
+
+def test_documents_round_trip_by_id(store):
+    store.add_many([{"id": 0, "text": "spicy ramen", "source": "yelp"}, {"id": 5, "text": "crème brûlée"}])
+
+    assert store.get(5) == {"id": 5, "text": "crème brûlée"}
+    assert store.text(0) == "spicy ramen"
+    assert store.get_many([5, -1, 3, 0]) == [store.get(5), store.get(0)]
+    assert len(store) == 2 and 3 not in store
+
+
+def test_remove_and_compact(store):
+    store.add_many([{"id": i, "text": f"review {i}"} for i in range(4)])
+    store.remove([1, 2])
+    size = store.get_stats()["buffer_bytes"]
+    store.compact()
+
+    assert store.ids().tolist() == [0, 3]
+    assert store.text(3) == "review 3"
+    assert store.get_stats()["buffer_bytes"] < size
+
+
+def test_saved_snapshot_is_mapped_read_only_and_takes_new_documents(store, tmp_path):
+    paths = str(tmp_path / "documents.bin"), str(tmp_path / "documents.npz")
+    store.add_many([{"id": i, "text": f"review {i}"} for i in range(3)])
+    store.remove([1])
+    assert store.save(*paths).tolist() == [0, 2]
+
+    loaded = DocumentStore(store.directory)
+    assert loaded.load(*paths).tolist() == [0, 2]
+    assert loaded.base is not None and loaded.get_stats()["buffer_bytes"] == 0
+    loaded.add_many([{"id": 7, "text": "late"}])
+    loaded.remove([0])
+    loaded.compact()  # Rewrites the buffer only; the mapped records stay
+
+    assert loaded.ids().tolist() == [2, 7]
+    assert [loaded.text(2), loaded.text(7)] == ["review 2", "late"]
+    assert loaded.get_stats()["buffer_bytes"] == loaded.get_stats()["buffer_live_bytes"] == len(b'{"text":"late"}')
+
+
+def test_rebase_keeps_changes_made_after_the_save(store, tmp_path):
+    paths = str(tmp_path / "documents.bin"), str(tmp_path / "documents.npz")
+    store.add_many([{"id": i, "text": f"review {i}"} for i in range(2)])
+    store.save(*paths)
+    store.add_many([{"id": 2, "text": "added after the save"}])
+    store.remove([0])
+    store.rebase(*paths)
+
+    assert store.ids().tolist() == [1, 2]
+    assert [store.text(1), store.text(2)] == ["review 1", "added after the save"]
+    assert store.offsets[1] < store.base_size <= store.offsets[2]
@@ -0,0 +1,100 @@
+import os
+import numpy as np
+import services.RAG.embedding_cache as embedding_cache
+from services.RAG.embedding_cache import EmbeddingCache
+
+
+class FakeModel:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, convert_to_tensor=False):
+        self.calls.append(list(texts))
+        return np.array([[float(len(text)), 1.0, 0.5, 0.25] for text in texts])
+
+
+def test_encode_only_embeds_misses(tmp_path):
+    model = FakeModel()
+    cache = EmbeddingCache("fake-model", 4, cache_dir=str(tmp_path))
+
+    first = cache.encode(model, ["spicy ramen", "mild curry", "spicy ramen"])
+    second = cache.encode(model, ["mild curry", "tofu"])
+
+    assert model.calls == [["spicy ramen", "mild curry"], ["tofu"]]
+    assert first.shape == (3, 4)
+    np.testing.assert_allclose(second[0], first[1])
+    assert cache.get_stats()["memory_hits"] == 1
+
+
+def test_vectors_persist_across_instances(tmp_path):
+    EmbeddingCache("fake-model", 4, cache_dir=str(tmp_path)).encode(FakeModel(), ["spicy ramen"])
+
+    model = FakeModel()
+    cache = EmbeddingCache("fake-model", 4, cache_dir=str(tmp_path))
+    vectors = cache.encode(model, ["spicy ramen"])
+
+    assert model.calls == []
+    assert cache.get_stats()["disk_hits"] == 1
+    np.testing.assert_allclose(vectors[0], [11.0, 1.0, 0.5, 0.25])
+
+
+def test_torn_write_is_truncated_before_the_next_append(tmp_path):
+    cache = EmbeddingCache("fake-model", 4, cache_dir=str(tmp_path))
+    cache.encode(FakeModel(), ["spicy ramen", "tofu"])
+    with open(cache._vectors_path, "ab") as f:
+        f.write(b"\x00" * 5)  # Crash mid-row
+    with open(cache._keys_path, "a", encoding="utf-8") as f:
+        f.write("deadbeef")  # Crash mid-key
+
+    EmbeddingCache("fake-model", 4, cache_dir=str(tmp_path)).encode(FakeModel(), ["mild curry"])
+
+    model = FakeModel()
+    vectors = EmbeddingCache("fake-model", 4, cache_dir=str(tmp_path)).encode(model, ["spicy ramen", "mild curry", "tofu"])
+    assert model.calls == []
+    np.testing.assert_allclose(vectors[:, 0], [11.0, 10.0, 4.0])
+
+
+def test_each_inference_backend_gets_its_own_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(embedding_cache, "embedding_caches", {})
+    monkeypatch.setattr(embedding_cache, "EmbeddingCache", lambda name, dimension: EmbeddingCache(name, dimension, cache_dir=str(tmp_path)))
+
+    torch_cache = embedding_cache.get_embedding_cache("fake-model", 4)
+    int8_cache = embedding_cache.get_embedding_cache("fake-model", 4, "onnx-int8")
+
+    assert torch_cache is not int8_cache
+    assert torch_cache is embedding_cache.get_embedding_cache("fake-model", 4, "torch")
+    torch_cache.encode(FakeModel(), ["spicy ramen"])
+    model = FakeModel()
+    int8_cache.encode(model, ["spicy ramen"])
+    assert model.calls == [["spicy ramen"]]
+
+
+def test_store_is_compacted_to_its_newest_rows(tmp_path):
+    writer = EmbeddingCache("fake-model", 4, cache_dir=str(tmp_path), max_rows=4)
+    writer.encode(FakeModel(), ["a", "bb", "ccc"])
+    reader = EmbeddingCache("fake-model", 4, cache_dir=str(tmp_path), max_rows=4)
+    assert reader.encode(FakeModel(), ["a"])[0, 0] == 1.0  # Maps generation 0
+
+    writer.encode(FakeModel(), ["dddd", "eeeee"])  # 5 rows > 4: keep the newest 2, then append
+
+    assert writer.get_stats()["compactions"] == 1
+    assert sorted(writer.rows) == sorted(EmbeddingCache.text_key(text) for text in ["bb", "ccc", "dddd", "eeeee"])
+    assert sorted(os.listdir(tmp_path / "fake-model")) == ["generation", "keys-1.txt", "lock", "vectors-1.f16"]
+    # The other worker keeps reading its old mapping, and switches generation on its next append
+    reader.lru.clear()
+    model = FakeModel()
+    vectors = reader.encode(model, ["eeeee", "a"])
+    np.testing.assert_allclose(vectors[:, 0], [5.0, 1.0])
+    assert model.calls == [["eeeee"]]
+    assert reader.generation == 1 and reader.rows == writer.rows
+
+
+def test_unpersisted_encodes_only_use_the_lru(tmp_path):
+    cache = EmbeddingCache("fake-model", 4, cache_dir=str(tmp_path))
+    model = FakeModel()
+    cache.encode(model, ["one-off query"], persist=False)
+    cache.encode(model, ["one-off query"], persist=False)
+
+    assert model.calls == [["one-off query"]]
+    assert not cache.rows and cache.get_stats()["memory_hits"] == 1
+    assert EmbeddingCache("fake-model", 4, cache_dir=str(tmp_path)).rows == {}
@@ -0,0 +1,237 @@
+import hashlib
+import numpy as np
+import pytest
+import services.RAG.indexing_service as indexing
+from services.RAG.snapshot_index import SnapshotIndex
+from utils.bm25_utils import bm25_index
+
+
+def fake_embed(texts):
+    """
+    Deterministic unit vectors seeded by each text, standing in for the embedder.
+    """
+    vectors = []
+    for text in texts:
+        seed = int(hashlib.sha1(text.encode("utf-8")).hexdigest()[:8], 16)
+        vector = np.random.default_rng(seed).standard_normal(indexing.dimension).astype("float32")
+        vectors.append(vector / np.linalg.norm(vector))
+    return np.vstack(vectors)
+
+
+def index_reviews(reviews, location="Austin"):
+    documents = indexing.build_documents(reviews, [], {"location": location, "dish": "ramen"})
+    return indexing.add_to_index(documents, fake_embed([document["text"] for document in documents]))
+
+
+@pytest.fixture(autouse=True)
+def fresh_index(monkeypatch, tmp_path):
+    """
+    Empty index, document store and BM25 index, snapshotting into a temp directory.
+    """
+    indexing.indexed_data.clear()
+    bm25_index.clear()
+    monkeypatch.setattr(indexing, "faiss_index", indexing.initial_index())
+    monkeypatch.setattr(indexing, "known_documents", {})
+    monkeypatch.setattr(indexing, "partitions", {})
+    monkeypatch.setattr(indexing, "next_document_id", 0)
+    monkeypatch.setattr(indexing, "document_times", np.zeros(0))
+    monkeypatch.setattr(indexing, "last_retrieved", np.zeros(0))
+    monkeypatch.setattr(indexing, "append_log", None)
+    monkeypatch.setattr(indexing, "dead_ids", set())
+    monkeypatch.setattr(indexing, "dead_selector", None)
+    monkeypatch.setattr(indexing, "INDEX_SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+    yield
+    if indexing.append_log is not None:
+        indexing.append_log.close()
+    indexing.indexed_data.clear()
+    bm25_index.clear()
+
+
+def test_duplicates_are_skipped_by_content_hash_and_source_id():
+    first = index_reviews([{"id": "r1", "text": "Rich  tonkotsu broth"}, {"id": "r2", "text": "Thin noodles"}])
+    again = index_reviews([
+        {"id": "r3", "text": "rich tonkotsu BROTH"},  # Same text, new id
+        {"id": "r2", "text": "Edited: thin noodles, salty"},  # Same review, edited text
+        {"id": "r4", "text": "Spicy miso"},
+        {"id": "r5", "text": "Spicy miso"},  # Repeat within the batch
+    ])
+
+    assert first == [0, 1]
+    assert again == [2]
+    assert indexing.faiss_index.ntotal == len(indexing.indexed_data) == len(bm25_index) == 3
+    assert indexing.filter_new_documents(indexing.build_documents([{"id": "r9", "text": "Thin noodles"}], [])) == []
+
+
+def restart():
+    """
+    Drop the in-memory index as a new process would, keeping the snapshot directory.
+    """
+    if indexing.append_log is not None:
+        indexing.append_log.close()
+    indexing.append_log = None
+    indexing.faiss_index = indexing.initial_index()
+    indexing.indexed_data.clear()
+    bm25_index.clear()
+    indexing.known_documents, indexing.partitions, indexing.next_document_id = {}, {}, 0
+    indexing.load_index_snapshot()
+
+
+def test_snapshot_plus_append_log_restores_the_index():
+    index_reviews([{"id": "r1", "text": "Rich tonkotsu broth"}, {"id": "r2", "text": "Thin noodles"}])
+    indexing.save_index_snapshot()
+    index_reviews([{"id": "r3", "text": "Spicy miso"}])  # Only in the append log
+
+    restart()
+
+    assert indexing.faiss_index.ntotal == len(indexing.indexed_data) == len(bm25_index) == 3
+    assert indexing.next_document_id == 3
+    assert index_reviews([{"id": "r3", "text": "Spicy miso"}]) == []
+    _, ids = indexing.search_index(fake_embed(["Thin noodles"]), 1)
+    assert indexing.indexed_data[int(ids[0][0])]["source_id"] == "r2"
+    assert index_reviews([{"id": "r4", "text": "Chashu pork"}]) == [3]
+
+
+@pytest.mark.parametrize("mode, storage", [("flat", "float32"), ("flat", "sq8"), ("ivf_flat", "float32")])
+def test_snapshot_is_memory_mapped_with_a_writable_delta(mode, storage):
+    index_reviews([{"id": f"r{i}", "text": f"review number {i}"} for i in range(40)])
+    indexing.promote_index(mode, storage)
+    indexing.remove_documents([4])
+    indexing.save_index_snapshot()
+    restart()
+
+    index = indexing.faiss_index
+    assert isinstance(index, SnapshotIndex) and (index.mode, index.storage) == (mode, storage)
+    assert index.base.ntotal == 39 and index.delta.ntotal == 0
+    assert indexing.indexed_data.get_stats()["buffer_bytes"] == 0
+    assert index_reviews([{"id": "late", "text": "indexed after the snapshot"}]) == [40]
+    assert index.delta.ntotal == 1
+
+    queries = fake_embed(["review number 7", "indexed after the snapshot"])
+    _, ids = indexing.search_index(queries, 1, nprobe=64)
+    assert ids[:, 0].tolist() == [7, 40]
+    assert float(indexing.get_vectors([40])[0] @ queries[1]) > 0.99
+
+    # Mapped rows stay dead until the next snapshot; delta rows go right away
+    indexing.remove_documents([7, 40])
+    assert indexing.dead_ids == {7} and index.delta.ntotal == 0
+    _, ids = indexing.search_index(queries, 5, nprobe=64)
+    assert {7, 40}.isdisjoint(ids.ravel().tolist())
+
+    # This process switches to the snapshot it writes
+    indexing.save_index_snapshot()
+    assert indexing.faiss_index is not index and indexing.faiss_index.base.ntotal == 38
+    assert not indexing.dead_ids and len(indexing.indexed_data) == 38
+
+
+def test_hnsw_snapshot_is_loaded_into_memory():
+    index_reviews([{"id": f"r{i}", "text": f"review number {i}"} for i in range(40)])
+    indexing.promote_index("hnsw", "float32")
+    indexing.save_index_snapshot()
+    restart()
+
+    assert not isinstance(indexing.faiss_index, SnapshotIndex)
+    assert indexing.index_mode(indexing.faiss_index) == "hnsw" and indexing.faiss_index.ntotal == 40
+    assert indexing.indexed_data.base is not None  # Documents are still mapped
+
+
+@pytest.mark.parametrize("mode", ["ivf_flat", "hnsw"])
+def test_flat_index_is_promoted_and_keeps_document_ids(monkeypatch, mode):
+    monkeypatch.setattr(indexing, "INDEX_MODE", mode)
+    monkeypatch.setattr(indexing, "INDEX_PROMOTION_THRESHOLD", 200)
+    monkeypatch.setattr(indexing, "promotion_thread", None)
+    index_reviews([{"id": f"r{i}", "text": f"review number {i}"} for i in range(200)])
+    indexing.promotion_thread.join()
+    index_reviews([{"id": "late", "text": "indexed after the promotion"}])
+
+    assert indexing.index_mode(indexing.faiss_index) == mode
+    assert indexing.faiss_index.ntotal == 201
+    _, ids = indexing.search_index(fake_embed(["review number 42", "indexed after the promotion"]), 1, nprobe=64)
+    assert ids[:, 0].tolist() == [42, 200]
+
+
+def test_location_and_metadata_filters_restrict_search():
+    index_reviews([{"id": f"b{i}", "text": f"boston review {i}"} for i in range(130)], location="Boston")
+    index_reviews([{"id": "a1", "text": "Austin brisket ramen"}], location="Austin, TX")
+    query = fake_embed(["boston review 7"])
+
+    # A one-document partition uses a hashed id batch, a large one the bitmap selector
+    _, ids = indexing.search_index(query, 3, filters={"location": " austin,  tx"})
+    assert ids[0].tolist() == [130, -1, -1]
+    _, ids = indexing.search_index(query, 3, filters={"location": "Boston"})
+    assert ids[0][0] == 7 and 130 not in ids[0]
+    _, ids = indexing.search_index(query, 3, filters={"location": "Boston", "source": "reddit"})
+    assert ids[0].tolist() == [-1, -1, -1]
+    _, ids = indexing.search_index(query, 3, filters={"location": "Denver"})
+    assert ids[0].tolist() == [-1, -1, -1]
+
+
+def test_budget_eviction_drops_least_recently_retrieved_everywhere(monkeypatch):
+    monkeypatch.setattr(indexing, "INDEX_MAX_DOCUMENTS", 10)
+    monkeypatch.setattr(indexing, "eviction_thread", None)
+    index_reviews([{"id": f"r{i}", "text": f"review number {i}"} for i in range(10)])
+    indexing.get_documents([0, 1])  # Retrieved recently, so evicted last
+    index_reviews([{"id": f"r{i}", "text": f"review number {i}"} for i in range(10, 15)])
+    indexing.eviction_thread.join()
+
+    live = set(indexing.indexed_data.ids().tolist())
+    assert len(live) == 9 and {0, 1} <= live
+    assert indexing.faiss_index.ntotal == len(bm25_index) == 9 and not indexing.dead_ids
+    _, ids = indexing.search_index(fake_embed(["review number 2"]), 15)
+    assert set(ids[0].tolist()) - {-1} == live
+    assert index_reviews([{"id": "r2", "text": "review number 2"}]) == [15]  # Dedup keys were dropped
+
+    restart()
+    assert set(indexing.indexed_data.ids().tolist()) == live | {15}
+    assert indexing.faiss_index.ntotal == 10
+
+
+def test_removed_rows_are_skipped_until_compaction_swaps_the_index(monkeypatch):
+    index_reviews([{"id": f"r{i}", "text": f"review number {i}"} for i in range(20)])
+    indexing.remove_documents([3, 4], compact=False)
+
+    assert indexing.faiss_index.ntotal == 20
+    _, ids = indexing.search_index(fake_embed(["review number 3"]), 20)
+    assert {3, 4}.isdisjoint(ids[0].tolist())
+
+    # Adds and removals made while the rebuild runs (outside index_lock) are caught up
+    create_index = indexing.create_index
+
+    def create_index_during_rebuild(*args, **kwargs):
+        if not indexing.index_lock._is_owned():
+            index_reviews([{"id": "late", "text": "indexed during compaction"}])
+            indexing.remove_documents([5], compact=False)
+        return create_index(*args, **kwargs)
+
+    monkeypatch.setattr(indexing, "INDEX_COMPACTION_CHUNK", 6)
+    monkeypatch.setattr(indexing, "create_index", create_index_during_rebuild)
+    source = indexing.faiss_index
+    indexing.compact_index()
+
+    assert indexing.faiss_index is not source
+    assert indexing.faiss_index.ntotal == 19 and indexing.dead_ids == {5}  # 5 waits for the next pass
+    _, ids = indexing.search_index(fake_embed(["indexed during compaction"]), 20)
+    assert ids[0][0] == 20 and {3, 4, 5}.isdisjoint(ids[0].tolist())
+
+
+@pytest.mark.parametrize("mode, storage", [("flat", "float16"), ("flat", "sq8"), ("hnsw", "sq8"), ("ivf_pq", "pq")])
+def test_compressed_storage_keeps_ids_and_nearest_neighbours(monkeypatch, mode, storage):
+    monkeypatch.setattr(indexing, "PQ_M", 4)
+    monkeypatch.setattr(indexing, "PQ_NBITS", 4)  # Small codebooks train quickly on a small corpus
+    index_reviews([{"id": f"r{i}", "text": f"review number {i}"} for i in range(400)])
+    indexing.promote_index(mode, storage)
+
+    assert (indexing.index_mode(indexing.faiss_index), indexing.index_storage(indexing.faiss_index)) == (mode, storage)
+    expected = list(range(0, 400, 40))
+    queries = fake_embed([f"review number {i}" for i in expected])
+    _, ids = indexing.search_index(queries, 5, nprobe=64, ef_search=128)
+    assert all(document_id in row for document_id, row in zip(expected, ids.tolist()))
+    if storage != "pq":
+        assert float(indexing.get_vectors([40])[0] @ queries[1]) > 0.99
+
+
+def test_bitmap_selector_covers_exactly_its_buffer(monkeypatch):
+    monkeypatch.setattr(indexing, "next_document_id", 100)
+    selector = indexing._id_selector({3, 50, 99})
+
+    assert selector.n == len(selector.packed) == 13
+    assert [selector.is_member(i) for i in (3, 4, 99, 103)] == [True, False, True, False]
@@ -0,0 +1,92 @@
+import socket
+import threading
+import time
+import numpy as np
+import pytest
+import services.inference_server as inference_server
+from services.inference_server import InferenceServer, RemoteModel
+
+
+class FakeEmbedder:
+    def encode(self, texts, convert_to_tensor=False):
+        return np.array([[float(len(text)), 1.0] for text in texts])
+
+
+class FakeCrossEncoder:
+    def predict(self, pairs):
+        return np.array([float(query in document) for query, document in pairs])
+
+
+class FakeRegistry:
+    models = {
+        "embedder": FakeEmbedder(),
+        "cross_encoder": FakeCrossEncoder(),
+        "summarizer": lambda text, **kwargs: [{"summary_text": text[:kwargs.get("max_length", 5)]}],
+    }
+
+    def get(self, role):
+        return self.models[role]
+
+    batched = get
+
+    def get_stats(self):
+        return {}
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    path = str(tmp_path / "inference.sock")
+    server = InferenceServer(path, FakeRegistry())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield path
+    server.shutdown()
+    server.server_close()
+
+
+def test_remote_models_match_local_calls(socket_path):
+    embedder = RemoteModel("embedder", socket_path)
+    cross_encoder = RemoteModel("cross_encoder", socket_path)
+    summarizer = RemoteModel("summarizer", socket_path)
+
+    vectors = embedder.encode(["ramen", "spicy tacos"])
+    scores = cross_encoder.predict([("ramen", "spicy ramen"), ("ramen", "tacos")])
+
+    np.testing.assert_allclose(vectors, [[5.0, 1.0], [11.0, 1.0]])
+    assert vectors.dtype == np.float32
+    np.testing.assert_allclose(scores, [1.0, 0.0])
+    assert summarizer("a long review", max_length=6) == [{"summary_text": "a long"}]
+
+
+def test_server_errors_are_raised_to_the_caller(socket_path):
+    embedder = RemoteModel("embedder", socket_path)
+
+    with pytest.raises(RuntimeError):
+        embedder._call({"op": "unknown"})
+    # The connection stays usable after an error
+    assert embedder.encode(["ok"]).shape == (1, 2)
+
+
+def test_dropped_connection_is_retried_after_a_server_restart(socket_path):
+    embedder = RemoteModel("embedder", socket_path)
+    embedder.encode(["ramen"])
+    embedder.local.connection.shutdown(socket.SHUT_RDWR)  # As a restarted server leaves it
+
+    assert embedder.encode(["tacos"]).shape == (1, 2)
+    with pytest.raises(FileNotFoundError):
+        RemoteModel("embedder", socket_path + ".missing").ping()
+
+
+def test_timeouts_are_not_resent(tmp_path, monkeypatch):
+    monkeypatch.setattr(inference_server, "INFERENCE_SERVER_TIMEOUT", 0.1)
+    path = str(tmp_path / "silent.sock")
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen()
+    accepted = []
+    threading.Thread(target=lambda: accepted.extend(listener.accept() for _ in range(2)), daemon=True).start()
+
+    with pytest.raises(TimeoutError):
+        RemoteModel("embedder", path).encode(["slow"])
+    time.sleep(0.1)
+    assert len(accepted) == 1
+    listener.close()
@@ -0,0 +1,90 @@
+import asyncio
+import time
+import numpy as np
+import pytest
+import services.RAG.ingestion_pipeline as pipeline
+
+
+@pytest.fixture
+def indexed(monkeypatch):
+    """
+    Replace the encoder and FAISS add with recorders; returns the indexed batches.
+    """
+    batches = []
+
+    def encode_texts(texts):
+        time.sleep(0.002)
+        return np.zeros((len(texts), 4), dtype="float32")
+
+    def add_to_index(documents, embeddings):
+        batches.append([document["text"] for document in documents])
+        return list(range(len(documents)))
+
+    monkeypatch.setattr(pipeline, "encode_texts", encode_texts)
+    monkeypatch.setattr(pipeline, "add_to_index", add_to_index)
+    monkeypatch.setattr(pipeline, "filter_new_documents", lambda documents: documents)
+    return batches
+
+
+async def reviews(count, progress=None, fail_after=None):
+    for i in range(count):
+        if fail_after is not None and i == fail_after:
+            raise RuntimeError("Yelp went away")
+        if progress is not None:
+            progress["produced"] += 1
+        yield [{"id": f"r{i}", "text": f"review {i}"}]
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_pipeline_batches_and_indexes_every_source(indexed):
+    result = await pipeline.run_ingestion_pipeline(
+        {"yelp": reviews(10), "reddit": reviews(5)}, batch_size=4, queue_size=8, flush_interval=0.01
+    )
+
+    assert len(result["yelp"]) == 10 and len(result["reddit"]) == 5
+    assert result["indexed"] == 15
+    assert all(len(batch) <= 4 for batch in indexed)
+    assert sum(len(batch) for batch in indexed) == 15
+
+
+@pytest.mark.asyncio
+async def test_bounded_queues_hold_back_producers(indexed, monkeypatch):
+    progress, lead = {"produced": 0}, []
+    add_to_index = pipeline.add_to_index
+
+    def slow_add(documents, embeddings):
+        time.sleep(0.005)
+        lead.append(progress["produced"] - sum(len(batch) for batch in indexed))
+        return add_to_index(documents, embeddings)
+
+    monkeypatch.setattr(pipeline, "add_to_index", slow_add)
+    result = await pipeline.run_ingestion_pipeline(
+        {"yelp": reviews(200, progress)}, batch_size=2, queue_size=2, flush_interval=0.01
+    )
+
+    assert result["indexed"] == 200
+    # Producers run ahead by the queues (2 + 2 + 1 batch) plus what each stage holds, not the whole stream
+    assert max(lead) <= 16
+
+
+@pytest.mark.asyncio
+async def test_failing_producer_does_not_stop_other_sources(indexed):
+    result = await pipeline.run_ingestion_pipeline(
+        {"yelp": reviews(10, fail_after=3), "reddit": reviews(4)}, batch_size=4, flush_interval=0.01
+    )
+
+    assert len(result["yelp"]) == 3
+    assert result["indexed"] == 7
+
+
+@pytest.mark.asyncio
+async def test_stage_failure_propagates_and_cancels_the_pipeline(indexed, monkeypatch):
+    def broken_encode(texts):
+        raise ValueError("model crashed")
+
+    monkeypatch.setattr(pipeline, "encode_texts", broken_encode)
+    with pytest.raises(ValueError, match="model crashed"):
+        await asyncio.wait_for(
+            pipeline.run_ingestion_pipeline({"yelp": reviews(500)}, batch_size=4, queue_size=4), timeout=5
+        )
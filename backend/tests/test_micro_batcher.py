@@ -0,0 +1,50 @@
+import threading
+import time
+import pytest
+from utils.micro_batcher import MicroBatcher
+
+
+def run_concurrently(function, count):
+    results = [None] * count
+
+    def call(position):
+        results[position] = function(position)
+
+    threads = [threading.Thread(target=call, args=(position,)) for position in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_calls_share_batches_and_get_their_own_results():
+    batches = []
+
+    def square(items):
+        batches.append(len(items))
+        time.sleep(0.01)  # Fixed per-call cost, like a forward pass
+        return [item * item for item in items]
+
+    batcher = MicroBatcher(square, max_batch_size=8, max_wait_ms=5)
+    results = run_concurrently(lambda position: batcher.submit([position, position + 100]), 16)
+
+    assert results == [[position ** 2, (position + 100) ** 2] for position in range(16)]
+    assert sum(batches) == 32
+    assert max(batches) <= 8
+    assert len(batches) < 16
+
+
+def test_errors_reach_every_caller_in_the_batch():
+    def fail(items):
+        raise ValueError("model failed")
+
+    batcher = MicroBatcher(fail, max_wait_ms=5)
+
+    def call(position):
+        with pytest.raises(ValueError):
+            batcher.submit([position])
+        return True
+
+    assert all(run_concurrently(call, 4))
+    assert batcher.leading is False
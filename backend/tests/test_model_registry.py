@@ -0,0 +1,68 @@
+import os
+import threading
+import time
+import pytest
+from services.model_registry import ModelRegistry
+
+
+def test_model_loads_once_across_threads():
+    loads = []
+
+    def loader(name):
+        loads.append(name)
+        time.sleep(0.05)
+        return object()
+
+    registry = ModelRegistry({"embedder": ("fake-model", loader)}, cache_dir="")
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get("embedder"))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert loads == ["fake-model"]
+    assert all(result is results[0] for result in results)
+    assert registry.get_stats()["embedder"]["loaded"] is True
+
+
+def test_models_load_lazily():
+    registry = ModelRegistry({"summarizer": ("fake-summarizer", lambda name: object())}, cache_dir="")
+
+    assert not registry.is_loaded("summarizer")
+    assert registry.get_stats() == {"summarizer": {"name": "fake-summarizer", "loaded": False}}
+
+
+def test_second_boot_loads_the_local_copy(tmp_path):
+    sources = []
+
+    def loader(source):
+        sources.append(source)
+        return object()
+
+    def saver(model, path):
+        os.makedirs(path)
+
+    warmed = []
+    for _ in range(2):
+        registry = ModelRegistry(
+            {"embedder": ("org/fake-model", loader)},
+            savers={"embedder": saver},
+            warmups={"embedder": warmed.append},
+            cache_dir=str(tmp_path),
+        )
+        registry.preload(warmup=True)
+
+    assert sources == ["org/fake-model", str(tmp_path / "org_fake-model")]
+    assert registry.get_stats()["embedder"]["source"] == "local"
+    assert len(warmed) == 2
+
+
+def test_onnx_backend_without_onnxruntime_raises(monkeypatch):
+    from services import model_registry
+
+    monkeypatch.setattr(model_registry.importlib.util, "find_spec", lambda name: None)
+    load = model_registry.with_backend("embedder", lambda source: object(), "onnx-int8")
+
+    with pytest.raises(ImportError, match="onnxruntime"):
+        load("fake-model")
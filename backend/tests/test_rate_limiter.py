@@ -0,0 +1,81 @@
+import asyncio
+import time
+import pytest
+from utils.rate_limiter import (
+    AIMDConcurrencyLimit,
+    ProviderRateLimiter,
+    ThrottledError,
+    TokenBucket,
+    parse_retry_after,
+)
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_paces_requests_beyond_burst():
+    bucket = TokenBucket(rate=20, capacity=2)
+
+    start = time.monotonic()
+    waits = [await bucket.acquire() for _ in range(4)]
+    elapsed = time.monotonic() - start
+
+    assert waits[:2] == [0.0, 0.0]
+    assert elapsed >= 0.09  # two extra tokens at 20/s
+
+
+@pytest.mark.asyncio
+async def test_aimd_limit_caps_in_flight_and_backs_off():
+    limit = AIMDConcurrencyLimit(initial=2, max_limit=4)
+    peak = 0
+
+    async def worker():
+        nonlocal peak
+        await limit.acquire()
+        peak = max(peak, limit.in_flight)
+        await asyncio.sleep(0.01)
+        limit.release()
+
+    await asyncio.gather(*(worker() for _ in range(6)))
+    assert peak == 2
+
+    limit.on_throttle()
+    assert limit.limit == 1
+    limit.on_success()
+    assert limit.limit == 2
+
+
+@pytest.mark.asyncio
+async def test_provider_limiter_retries_throttled_requests():
+    limiter = ProviderRateLimiter("test", rate=1000, burst=1000, initial_concurrency=4, max_concurrency=8)
+    attempts = []
+
+    async def request():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ThrottledError(429, retry_after=0.01)
+        return "ok"
+
+    assert await limiter.call(request) == "ok"
+    stats = limiter.stats()
+    assert stats["throttled"] == 2
+    assert stats["retries"] == 2
+    assert stats["requests"] == 3
+
+
+@pytest.mark.asyncio
+async def test_provider_limiter_reraises_after_max_retries():
+    limiter = ProviderRateLimiter("test", rate=1000, burst=1000, initial_concurrency=4,
+                                  max_concurrency=8, max_retries=1, base_backoff=0.01)
+
+    async def request():
+        raise ThrottledError(503)
+
+    with pytest.raises(ThrottledError):
+        await limiter.call(request)
+    assert limiter.stats()["server_errors"] == 2
+    assert limiter.stats()["failed"] == 1
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") is None
+    assert parse_retry_after(None) is None
@@ -0,0 +1,89 @@
+import time
+import pytest
+import services.reddit_store_service as store
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    async def to_list(self, length=None):
+        return self.documents
+
+
+class FakeCollection:
+    """
+    In-memory stand-in for the few Motor calls the Reddit store makes.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.documents = {}
+
+    def _matches(self, document, query):
+        for field, condition in query.items():
+            value = document.get(field)
+            if isinstance(condition, dict):
+                if "$gte" in condition and not (value is not None and value >= condition["$gte"]):
+                    return False
+                if "$in" in condition and value not in condition["$in"]:
+                    return False
+            elif value != condition:
+                return False
+        return True
+
+    async def find_one(self, query, projection=None):
+        return next((dict(d) for d in self.documents.values() if self._matches(d, query)), None)
+
+    def find(self, query, projection=None):
+        return FakeCursor([dict(d) for d in self.documents.values() if self._matches(d, query)])
+
+    async def update_one(self, query, update, upsert=False):
+        key = query[self.key]
+        document = self.documents.setdefault(key, {self.key: key})
+        document.update(update.get("$set", {}))
+        for field, value in update.get("$max", {}).items():
+            document[field] = max(document.get(field, value), value)
+        for field, value in update.get("$addToSet", {}).items():
+            existing = document.setdefault(field, [])
+            existing.extend(item for item in value["$each"] if item not in existing)
+
+    async def bulk_write(self, operations, ordered=True):
+        for operation in operations:
+            await self.update_one(operation._filter, operation._doc, upsert=True)
+
+
+@pytest.fixture
+def collections(monkeypatch):
+    posts, queries = FakeCollection("post_id"), FakeCollection("_id")
+    monkeypatch.setattr(store, "reddit_posts_collection", posts)
+    monkeypatch.setattr(store, "reddit_queries_collection", queries)
+    return posts, queries
+
+
+@pytest.mark.asyncio
+async def test_search_watermark_only_moves_forward(collections):
+    subreddits = ["food", "Cooking"]
+    assert await store.get_stored_search("Ramen", subreddits) is None
+
+    await store.save_search("Ramen", subreddits, [{"id": "a", "created_utc": 100}, {"id": "b", "created_utc": 300}])
+    await store.save_search("ramen ", ["cooking", "food"], [{"id": "c", "created_utc": 200}])
+    await store.save_search("Ramen", subreddits, [])  # Empty refresh keeps the watermark
+
+    posts, watermark, is_fresh = await store.get_stored_search("Ramen", subreddits)
+    assert watermark == 300
+    assert is_fresh
+    assert sorted(post["id"] for post in posts) == ["a", "b", "c"]
+
+
+@pytest.mark.asyncio
+async def test_stale_search_and_comments_are_reported(collections, monkeypatch):
+    await store.save_search("Ramen", ["food"], [{"id": "a", "created_utc": 100}])
+    await store.save_comments("a", [{"id": "c1", "body": "Rich broth"}])
+    assert await store.get_stored_comments("a") == [{"id": "c1", "body": "Rich broth"}]
+
+    later = time.time() + store.REDDIT_SUBMISSION_MAX_AGE + store.REDDIT_QUERY_MAX_AGE + 1
+    monkeypatch.setattr(store.time, "time", lambda: later)
+    _, watermark, is_fresh = await store.get_stored_search("Ramen", ["food"])
+    assert (watermark, is_fresh) == (100, False)
+    assert await store.get_stored_comments("a") is None
@@ -0,0 +1,55 @@
+import numpy as np
+from services.RAG.rerank_cache import RerankCache, cascade_rerank
+
+
+class FakeCrossEncoder:
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, pairs):
+        self.calls.append([text for _, text in pairs])
+        return np.array([float(text.count("spicy")) for _, text in pairs])
+
+
+def test_score_only_predicts_uncached_pairs():
+    model = FakeCrossEncoder()
+    cache = RerankCache()
+
+    first = cache.score(model, "Spicy Ramen", ["spicy spicy", "mild"])
+    second = cache.score(model, "spicy  ramen", ["mild", "spicy tofu"])
+
+    assert model.calls == [["spicy spicy", "mild"], ["spicy tofu"]]
+    np.testing.assert_allclose(first, [2.0, 0.0])
+    np.testing.assert_allclose(second, [0.0, 1.0])
+    assert cache.get_stats()["hits"] == 1
+
+
+def spicy_scorer(scored):
+    def score(chunk):
+        scored.extend(chunk)
+        return [hit["text"].count("spicy") for hit in chunk]
+    return score
+
+
+def test_cascade_keeps_a_clearly_better_late_candidate():
+    texts = ["spicy"] * 5 + ["mild"] * 13 + ["spicy spicy spicy spicy", "plain"]
+    hits = [{"text": text} for text in texts]
+    scored = []
+
+    # Default step / patience: one unchanged round is not enough to stop
+    reranked = cascade_rerank(spicy_scorer(scored), hits, k=5, limit=len(hits))
+
+    assert len(scored) == len(hits)
+    assert reranked[0]["text"] == "spicy spicy spicy spicy"
+
+
+def test_cascade_stops_after_patience_unchanged_rounds():
+    hits = [{"text": text} for text in ["spicy", "spicy spicy"] + ["mild"] * 8 + ["spicy spicy spicy"]]
+    scored = []
+
+    reranked = cascade_rerank(spicy_scorer(scored), hits, k=2, limit=len(hits), step=2, patience=2)
+
+    # Two rounds after the first left the top 2 unchanged, so the rest was never scored
+    assert len(scored) == 6
+    assert [hit["text"] for hit in reranked[:2]] == ["spicy spicy", "spicy"]
+    assert reranked[-5:] == hits[6:]
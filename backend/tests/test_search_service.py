@@ -0,0 +1,84 @@
+import faiss
+import pytest
+import services.RAG.search_service as search
+
+
+def bm25(*ids):
+    return [{"id": document_id, "text": f"doc {document_id}", "bm25_score": 10.0 - rank} for rank, document_id in enumerate(ids)]
+
+
+def faiss_hits(*ids):
+    return [{"id": document_id, "text": f"doc {document_id}", "distance": 0.1 * (rank + 1)} for rank, document_id in enumerate(ids)]
+
+
+def test_rrf_ranks_documents_found_by_both_retrievers_first():
+    fused = search.fuse_results(bm25(1, 2, 3), faiss_hits(3, 4), method="rrf")
+
+    assert [hit["id"] for hit in fused] == [3, 1, 2, 4]
+    assert fused[0]["bm25_score"] == 8.0 and fused[0]["distance"] == pytest.approx(0.1)
+    expected = search.BM25_WEIGHT / (search.RRF_K + 3) + search.FAISS_WEIGHT / (search.RRF_K + 1)
+    assert fused[0]["fused_score"] == pytest.approx(expected)
+
+
+def test_rrf_ties_keep_bm25_order_first(monkeypatch):
+    monkeypatch.setattr(search, "BM25_WEIGHT", 0.5)
+    monkeypatch.setattr(search, "FAISS_WEIGHT", 0.5)
+
+    fused = search.fuse_results(bm25(1, 2), faiss_hits(3, 4), method="rrf")
+
+    assert [hit["id"] for hit in fused] == [1, 3, 2, 4]
+    assert fused[0]["fused_score"] == fused[1]["fused_score"]
+
+
+def test_weighted_fusion_normalizes_scores_and_distances():
+    fused = search.fuse_results(bm25(1, 2, 3), faiss_hits(3, 2, 1), method="weighted")
+    scores = {hit["id"]: hit["fused_score"] for hit in fused}
+
+    # BM25 best is 1, nearest vector is 3; the BM25 weight is larger
+    assert [hit["id"] for hit in fused] == [1, 2, 3]
+    assert scores == pytest.approx({1: search.BM25_WEIGHT, 2: 0.5, 3: search.FAISS_WEIGHT})
+    # A single hit (no spread) counts fully
+    assert search.fuse_results(bm25(7), [], method="weighted")[0]["fused_score"] == pytest.approx(search.BM25_WEIGHT)
+
+
+@pytest.mark.asyncio
+async def test_hybrid_search_fetches_a_full_rerank_pool_per_retriever(monkeypatch):
+    depths, reranked = [], []
+    index = faiss.IndexIDMap2(faiss.IndexFlatL2(4))
+    index.add_with_ids(faiss.rand((1, 4)), faiss.randint(1).astype("int64"))
+
+    def lexical_search(query, k, filters):
+        depths.append(k)
+        return bm25(*range(k))
+
+    def vector_search(query, k, filters, nprobe, ef_search):
+        depths.append(k)
+        return faiss_hits(*range(100, 100 + k))
+
+    def rerank_hits(query, hits, k):
+        reranked.append(len(hits))
+        return hits
+
+    monkeypatch.setattr(search, "RERANK_POOL", 20)
+    monkeypatch.setattr(search, "get_faiss_index", lambda: index)
+    monkeypatch.setattr(search, "lexical_search", lexical_search)
+    monkeypatch.setattr(search, "vector_search", vector_search)
+    monkeypatch.setattr(search, "rerank_hits", rerank_hits)
+
+    results = await search.hybrid_search("ramen", k=5)
+
+    assert depths == [20, 20]
+    assert reranked == [20]
+    assert len(results) == 5
+
+
+def test_faiss_only_search_reranks_vector_hits(monkeypatch):
+    index = faiss.IndexIDMap2(faiss.IndexFlatL2(4))
+    index.add_with_ids(faiss.rand((1, 4)), faiss.randint(1).astype("int64"))
+    monkeypatch.setattr(search, "get_faiss_index", lambda: index)
+    monkeypatch.setattr(search, "vector_search", lambda query, k, *args: faiss_hits(*range(k)))
+    monkeypatch.setattr(search, "rerank_hits", lambda query, hits, k: hits[::-1])
+
+    assert search.faiss_only_search("ramen", k=2) == ["doc 1", "doc 0"]
+    monkeypatch.setattr(search, "get_faiss_index", lambda: faiss.IndexIDMap2(faiss.IndexFlatL2(4)))
+    assert search.faiss_only_search("ramen", k=2) == []
@@ -0,0 +1,36 @@
+import asyncio
+import pytest
+from utils.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+
+    async def load(post_id):
+        calls.append(post_id)
+        await asyncio.sleep(0.01)
+        return [post_id]
+
+    results = await asyncio.gather(*(flight.do(("comments", "abc"), load, "abc") for _ in range(5)))
+
+    assert calls == ["abc"]
+    assert results == [["abc"]] * 5
+    assert flight.in_flight() == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_shared_call():
+    flight = SingleFlight()
+
+    async def load():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    first = asyncio.ensure_future(flight.do("key", load))
+    second = asyncio.ensure_future(flight.do("key", load))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == "done"
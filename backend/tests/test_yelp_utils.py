@@ -0,0 +1,149 @@
+import asyncio
+import pytest
+from utils import yelp_utils
+from utils.rate_limiter import ProviderRateLimiter
+
+
+class FakeResponse:
+    def __init__(self, status, payload):
+        self.status = status
+        self._payload = payload
+        self.headers = {}
+
+    async def json(self):
+        return self._payload
+
+    async def text(self):
+        return str(self._payload)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    """
+    Serves `total` fake businesses from the search endpoint.
+    """
+
+    def __init__(self, total, delay=0.01):
+        self.total = total
+        self.delay = delay
+        self.requested_offsets = []
+        self.closed = False
+
+    def get(self, url, params=None, **kwargs):
+        return self._request(params)
+
+    def _request(self, params):
+        session = self
+
+        class _Context:
+            async def __aenter__(self_inner):
+                offset, limit = params["offset"], params["limit"]
+                session.requested_offsets.append(offset)
+                await asyncio.sleep(session.delay)
+                end = min(session.total, offset + limit)
+                businesses = [{"id": f"biz-{i}"} for i in range(offset, end)]
+                return FakeResponse(200, {"businesses": businesses})
+
+            async def __aexit__(self_inner, *exc):
+                return False
+
+        return _Context()
+
+
+@pytest.fixture(autouse=True)
+def fresh_limiter(monkeypatch):
+    limiter = ProviderRateLimiter("yelp", rate=1000, burst=1000, initial_concurrency=32, max_concurrency=64)
+    monkeypatch.setattr(yelp_utils, "yelp_limiter", limiter)
+    return limiter
+
+
+@pytest.fixture
+def fake_session(monkeypatch):
+    def install(session):
+        monkeypatch.setattr(yelp_utils, "yelp_session", session)
+        return session
+    return install
+
+
+@pytest.mark.asyncio
+async def test_concurrent_pages_merge_in_order(fake_session):
+    session = fake_session(FakeSession(total=500))
+
+    results = await yelp_utils.fetch_yelp_data("tacos", "Austin", limit=150, concurrent=True)
+
+    assert [b["id"] for b in results] == [f"biz-{i}" for i in range(150)]
+    assert sorted(session.requested_offsets) == [0, 50, 100]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_pages_stop_on_short_page(fake_session):
+    fake_session(FakeSession(total=70))
+
+    results = await yelp_utils.fetch_yelp_data("tacos", "Austin", limit=200, concurrent=True)
+
+    assert [b["id"] for b in results] == [f"biz-{i}" for i in range(70)]
+
+
+@pytest.mark.asyncio
+async def test_serial_pages_match_concurrent(fake_session):
+    fake_session(FakeSession(total=120))
+
+    results = await yelp_utils.fetch_yelp_data("tacos", "Austin", limit=200, concurrent=False)
+
+    assert [b["id"] for b in results] == [f"biz-{i}" for i in range(120)]
+
+
+class FakeReviewSession:
+    """
+    Returns three reviews per business; some businesses are slow.
+    """
+
+    def __init__(self, delays):
+        self.delays = delays
+        self.started = []
+        self.finished = []
+        self.closed = False
+
+    def get(self, url, params=None, **kwargs):
+        session = self
+        business_id = url.rstrip("/").split("/")[-2]
+
+        class _Context:
+            async def __aenter__(self_inner):
+                session.started.append(business_id)
+                await asyncio.sleep(session.delays.get(business_id, 0.01))
+                session.finished.append(business_id)
+                reviews = [{"text": f"{business_id} review {i}"} for i in range(3)]
+                return FakeResponse(200, {"reviews": reviews})
+
+            async def __aexit__(self_inner, *exc):
+                return False
+
+        return _Context()
+
+
+@pytest.mark.asyncio
+async def test_gather_reviews_stops_at_budget(fake_session):
+    ids = [f"biz-{i}" for i in range(10)]
+    session = fake_session(FakeReviewSession({i: 0.01 if i in ids[:2] else 1.0 for i in ids}))
+
+    reviews = await yelp_utils.gather_yelp_reviews(ids, review_budget=6, deadline=5)
+
+    assert len(reviews) == 6
+    assert {r["business_id"] for r in reviews} == {"biz-0", "biz-1"}
+    assert set(session.finished) == {"biz-0", "biz-1"}
+
+
+@pytest.mark.asyncio
+async def test_gather_reviews_respects_cap_and_deadline(fake_session):
+    ids = ["fast", "slow"]
+    fake_session(FakeReviewSession({"fast": 0.01, "slow": 1.0}))
+
+    reviews = await yelp_utils.gather_yelp_reviews(ids, review_budget=10, per_business_cap=2, deadline=0.2)
+
+    assert [r["business_id"] for r in reviews] == ["fast", "fast"]
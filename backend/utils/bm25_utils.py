@@ -1,61 +1,340 @@
-from rank_bm25 import BM25Okapi
+import json
+import os
+import re
+import threading
+import unicodedata
+from array import array
+from collections import Counter
+import numpy as np
+from scipy.sparse import csr_matrix
+from services.RAG.document_store import document_store
 
-bm25_index = None  # BM25 instance
-indexed_texts = []  # Store text data for BM25
+# Okapi BM25 parameters
+BM25_K1 = float(os.getenv("BM25_K1", 1.5))
+BM25_B = float(os.getenv("BM25_B", 0.75))
 
 
-def build_bm25_index(yelp_reviews, reddit_comments):
+def tokenize(text: str):
     """
-    Build or update BM25 index from Yelp and Reddit data.
+    Tokens shared by indexing and querying: lower-cased, accents folded
+    ("jalapeño" -> "jalapeno"), apostrophes joined ("don't" -> "dont"),
+    other punctuation treated as a separator.
     """
-    global bm25_index, indexed_texts
+    text = unicodedata.normalize("NFKD", (text or "").lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return re.findall(r"\w+", re.sub(r"['\u2019]", "", text))
 
-    try:
-        # Prepare and tokenize data
-        new_texts = [review["text"] for review in yelp_reviews] + \
-                    [comment["body"] for comment in reddit_comments]
-        
-        if not new_texts:
-            print("[INFO] No new data to index for BM25.")
+
+def top_k(ids, scores, k: int):
+    """
+    The k best (ids, scores) with positive score, best first; argpartition keeps it O(n + k log k).
+    """
+    if len(scores) > k:
+        selected = np.argpartition(-scores, k - 1)[:k]
+        ids, scores = ids[selected], scores[selected]
+    order = np.argsort(-scores, kind="stable")
+    ids, scores = ids[order], scores[order]
+    positive = scores > 0
+    return ids[positive], scores[positive]
+
+
+class InvertedIndex:
+    """
+    Incremental BM25 index: per-term postings (document ids + term frequencies in
+    compact arrays), per-document lengths and running corpus statistics.
+
+    Adds cost O(new tokens); removals only mark the document (O(1) each), and dead
+    postings are dropped the next time their term is queried or the index is saved.
+    Document frequencies are counted from live postings at query time, so they stay
+    exact across removals. Scoring touches only the postings of the query terms.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.lock = threading.RLock()
+        self.postings = {}  # term -> (array("q") document ids, array("i") term frequencies)
+        self.doc_lengths = np.full(0, -1, dtype="int32")  # By document id; -1 = not indexed
+        self.num_docs = 0
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return self.num_docs
+
+    def __contains__(self, document_id) -> bool:
+        document_id = int(document_id)
+        return 0 <= document_id < len(self.doc_lengths) and self.doc_lengths[document_id] >= 0
+
+    def _grow(self, document_id: int):
+        if document_id < len(self.doc_lengths):
             return
-        
-        # Tokenize the new data
-        tokenized_corpus = [text.split() for text in new_texts]
-        
-        if bm25_index is None:
-            # Create BM25 index if it doesn't exist
-            bm25_index = BM25Okapi(tokenized_corpus)
-            indexed_texts.extend(new_texts)
-            print(f"[INFO] BM25 index built with {len(indexed_texts)} items.")
-        else:
-            # Update the existing index
-            indexed_texts.extend(new_texts)
-            bm25_index = BM25Okapi([text.split() for text in indexed_texts])
-            print(f"[INFO] BM25 index updated. Total items: {len(indexed_texts)}.")
+        capacity = max(1024, len(self.doc_lengths) * 2, document_id + 1)
+        lengths = np.full(capacity, -1, dtype="int32")
+        lengths[:len(self.doc_lengths)] = self.doc_lengths
+        self.doc_lengths = lengths
+
+    def add(self, document_id: int, text: str) -> bool:
+        """
+        Index one document. Already indexed ids and empty texts are skipped.
+        """
+        document_id = int(document_id)
+        if document_id in self:
+            return False
+        tokens = tokenize(text)
+        if not tokens:
+            return False
+
+        with self.lock:
+            if document_id in self:
+                return False
+            self._grow(document_id)
+            for term, frequency in Counter(tokens).items():
+                if term not in self.postings:
+                    self.postings[term] = (array("q"), array("i"))
+                ids, frequencies = self.postings[term]
+                ids.append(document_id)
+                frequencies.append(frequency)
+            self.doc_lengths[document_id] = len(tokens)
+            self.num_docs += 1
+            self.total_length += len(tokens)
+        return True
+
+    def remove(self, document_ids) -> int:
+        """
+        Remove documents; their postings are purged lazily. Returns how many were indexed.
+        """
+        removed = 0
+        with self.lock:
+            for document_id in document_ids:
+                if document_id in self:
+                    self.total_length -= int(self.doc_lengths[int(document_id)])
+                    self.doc_lengths[int(document_id)] = -1
+                    self.num_docs -= 1
+                    removed += 1
+        return removed
+
+    def _live_postings(self, term: str):
+        """
+        (ids, frequencies, lengths) of the live postings for a term, compacting
+        the stored postings when removals have left them mostly dead.
+        """
+        ids, frequencies = self.postings[term]
+        ids_array = np.array(ids, dtype="int64")
+        frequencies_array = np.array(frequencies, dtype="float32")
+        lengths = self.doc_lengths[ids_array]
+        live = lengths >= 0
+
+        if not live.all():
+            ids_array, frequencies_array, lengths = ids_array[live], frequencies_array[live], lengths[live]
+            if len(ids_array) * 2 <= len(ids):
+                if len(ids_array):
+                    self.postings[term] = (array("q", ids_array.tolist()), array("i", frequencies_array.astype("int32").tolist()))
+                else:
+                    del self.postings[term]
+        return ids_array, frequencies_array, lengths
+
+    def score_batch(self, queries):
+        """
+        BM25 scores for several queries at once, as one sparse (candidates x terms)
+        matrix of term weights times a dense (terms x queries) matrix of query IDFs.
+        Only the postings of the queries' terms are read, and rows are the documents
+        sharing a term with some query, so cost follows the postings, not the corpus.
+        Returns (candidate document ids, scores[len(ids), len(queries)]).
+        """
+        query_counts = [Counter(tokenize(query)) for query in queries]
+        empty = np.zeros(0, dtype="int64"), np.zeros((0, len(queries)), dtype="float32")
+
+        with self.lock:
+            if not self.num_docs:
+                return empty
+            average_length = self.total_length / self.num_docs
+
+            terms, rows, columns, weights, idfs = [], [], [], [], []
+            for term in {term for counts in query_counts for term in counts}:
+                if term not in self.postings:
+                    continue
+                ids, frequencies, lengths = self._live_postings(term)
+                if not len(ids):
+                    continue
+                norm = np.float32(self.k1 * (1 - self.b)) + np.float32(self.k1 * self.b / average_length) * lengths.astype("float32")
+                rows.append(ids)
+                columns.append(np.full(len(ids), len(terms), dtype="int32"))
+                weights.append(frequencies * (self.k1 + 1) / (frequencies + norm))
+                idfs.append(np.log(1 + (self.num_docs - len(ids) + 0.5) / (len(ids) + 0.5)))
+                terms.append(term)
+
+        if not terms:
+            return empty
+        ids, rows = np.unique(np.concatenate(rows), return_inverse=True)
+        matrix = csr_matrix(
+            (np.concatenate(weights), (rows, np.concatenate(columns))), shape=(len(ids), len(terms))
+        )
+        query_matrix = np.zeros((len(terms), len(queries)), dtype="float32")
+        for position, term in enumerate(terms):
+            for column, counts in enumerate(query_counts):
+                query_matrix[position, column] = counts.get(term, 0) * idfs[position]
+        return ids, np.asarray(matrix @ query_matrix)
+
+    def score(self, query: str):
+        """
+        BM25 scores of every document sharing a term with the query.
+        Returns (document ids, scores).
+        """
+        ids, scores = self.score_batch([query])
+        return ids, scores[:, 0]
+
+    def search_batch(self, queries, k: int = 5, document_ids=None):
+        """
+        Top-k (document ids, scores) per query, best first.
+        `document_ids` restricts the results to those documents (e.g. a location partition).
+        """
+        ids, scores = self.score_batch(queries)
+        if document_ids is not None:
+            # Membership of the candidates only; a large partition is never materialized
+            allowed = document_ids if isinstance(document_ids, (set, frozenset)) else set(document_ids)
+            keep = np.fromiter((document_id in allowed for document_id in ids.tolist()), dtype=bool, count=len(ids))
+            ids, scores = ids[keep], scores[keep]
+        return [top_k(ids, scores[:, column], k) for column in range(len(queries))]
+
+    def search(self, query: str, k: int = 5, document_ids=None):
+        """
+        Top-k (document ids, scores) for a query, best first.
+        """
+        return self.search_batch([query], k, document_ids)[0]
+
+    def export(self) -> dict:
+        """
+        Live postings as flat arrays (terms, per-term offsets, ids, frequencies) plus lengths.
+        """
+        with self.lock:
+            terms, offsets, ids, frequencies = [], [0], [], []
+            for term in list(self.postings):
+                term_ids, term_frequencies, _ = self._live_postings(term)
+                if not len(term_ids):
+                    continue
+                terms.append(term)
+                ids.append(term_ids)
+                frequencies.append(term_frequencies.astype("int32"))
+                offsets.append(offsets[-1] + len(term_ids))
+            return {
+                "terms": np.array(json.dumps(terms)),
+                "offsets": np.array(offsets, dtype="int64"),
+                "ids": np.concatenate(ids) if ids else np.zeros(0, dtype="int64"),
+                "frequencies": np.concatenate(frequencies) if frequencies else np.zeros(0, dtype="int32"),
+                "doc_lengths": self.doc_lengths.copy(),
+            }
+
+    def save(self, path: str, exported: dict = None):
+        """
+        Write the index (or a previous `export()`) to `path` atomically.
+        """
+        exported = exported or self.export()
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, **exported)
+        os.replace(path + ".tmp", path)
+
+    def load(self, path: str):
+        """
+        Replace the index contents with a file written by `save`.
+        """
+        with np.load(path) as data:
+            terms = json.loads(str(data["terms"]))
+            offsets, ids, frequencies = data["offsets"], data["ids"], data["frequencies"]
+            doc_lengths = data["doc_lengths"].astype("int32")
 
+        postings = {
+            term: (array("q", ids[offsets[i]:offsets[i + 1]].tolist()),
+                   array("i", frequencies[offsets[i]:offsets[i + 1]].tolist()))
+            for i, term in enumerate(terms)
+        }
+        live = doc_lengths >= 0
+        with self.lock:
+            self.postings = postings
+            self.doc_lengths = doc_lengths
+            self.num_docs = int(live.sum())
+            self.total_length = int(doc_lengths[live].sum())
+
+    def clear(self):
+        with self.lock:
+            self.postings = {}
+            self.doc_lengths = np.full(0, -1, dtype="int32")
+            self.num_docs = self.total_length = 0
+
+
+# Covers documents of the shared document store, by document id
+bm25_index = InvertedIndex()
+
+
+def add_to_bm25_index(documents):
+    """
+    Index new documents (dicts with "id" and "text"). Cost is proportional to the new documents only.
+    """
+    added = sum(bm25_index.add(document["id"], document["text"]) for document in documents)
+    if added:
+        print(f"[INFO] BM25 index updated. Total items: {len(bm25_index)}.")
+    return added
+
+
+def build_bm25_index(document_ids):
+    """
+    Index documents already in the shared document store.
+    """
+    try:
+        return add_to_bm25_index(document_store.get_many(document_ids))
     except Exception as e:
         print(f"[ERROR] Failed to build BM25 index: {str(e)}")
+        return 0
+
+
+def remove_from_bm25_index(document_ids):
+    """
+    Drop evicted documents from the BM25 index.
+    """
+    removed = bm25_index.remove(document_ids)
+    if removed:
+        print(f"[INFO] Removed {removed} documents from BM25. Total items: {len(bm25_index)}.")
+
+
+def save_bm25_index(path: str, exported: dict = None):
+    bm25_index.save(path, exported)
+
+
+def load_bm25_index(path: str):
+    bm25_index.load(path)
+    print(f"[INFO] Loaded BM25 index with {len(bm25_index)} documents.")
+
+
+def search_bm25_batch(queries, k=5):
+    """
+    BM25 search for several queries in one scoring pass.
+    Returns a list of (document ids, texts) per query.
+    """
+    if not len(bm25_index):
+        raise ValueError("BM25 index is empty. Please index data first.")
+
+    results = []
+    for top_ids, _ in bm25_index.search_batch(queries, k):
+        top_ids = top_ids.tolist()
+        results.append((top_ids, [document_store.text(document_id) for document_id in top_ids]))
+    return results
 
 
 def search_bm25(query, k=5):
     """
     Perform BM25 search for keyword matching.
+    Returns (document ids, texts) of the top-k documents.
     """
-    if not bm25_index:
+    if not len(bm25_index):
         raise ValueError("BM25 index is empty. Please index data first.")
-    
+
     try:
-        # Tokenize the query
-        tokenized_query = query.split()
-        
-        # Perform BM25 scoring
-        scores = bm25_index.get_scores(tokenized_query)
-        top_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k]
-        
-        # Retrieve top-k results
-        results = [indexed_texts[i] for i in top_indices]
+        top_ids, _ = bm25_index.search(query, k)
+
+        # Retrieve top-k results (decoding only the hits)
+        top_ids = top_ids.tolist()
+        results = [document_store.text(document_id) for document_id in top_ids]
         print(f"[INFO] BM25 search returned {len(results)} results for query '{query}'.")
-        return top_indices, results
+        return top_ids, results
 
     except Exception as e:
         print(f"[ERROR] BM25 search failed: {str(e)}")
@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+from collections import deque
+
+MICRO_BATCH_MAX_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", 32))  # Items per batched call
+# Extra wait for more items before running a batch. 0 = dispatch as soon as the model is
+# free; requests arriving while a batch runs still form the next batch
+MICRO_BATCH_WAIT_MS = float(os.getenv("MICRO_BATCH_WAIT_MS", 0))
+
+
+class _Request:
+    def __init__(self, items):
+        self.items = items
+        self.arrived = time.monotonic()
+        self.done = threading.Event()
+        self.lead = False
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """
+    Merge concurrent calls of `function(items) -> results` (one result per item)
+    into one batched call. Callers block in `submit` (from worker threads, e.g.
+    `asyncio.to_thread`), so async requests await their slice without blocking the loop.
+
+    The first caller leads: it waits until `max_wait_ms` after the oldest pending
+    request (or a full batch), runs the batch and hands leadership to the next
+    pending request. Requests arriving while a batch runs form the next one, so
+    batches grow with load while a lone request runs immediately.
+    """
+
+    def __init__(self, function, max_batch_size: int = MICRO_BATCH_MAX_SIZE, max_wait_ms: float = MICRO_BATCH_WAIT_MS):
+        self.function = function
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.condition = threading.Condition()
+        self.pending = deque()
+        self.pending_items = 0
+        self.leading = False
+        self.stats = {"calls": 0, "batches": 0, "items": 0}
+
+    def submit(self, items):
+        """
+        Results for `items`, computed in a batch shared with concurrent callers.
+        """
+        request = _Request(list(items))
+        if not request.items:
+            return self.function(request.items)
+
+        with self.condition:
+            self.pending.append(request)
+            self.pending_items += len(request.items)
+            self.stats["calls"] += 1
+            lead = not self.leading
+            self.leading = True
+            self.condition.notify_all()  # A leader waiting for a full batch re-checks
+
+        while True:
+            if lead:
+                self._run_batch()
+            request.done.wait()
+            with self.condition:
+                lead, request.lead = request.lead, False
+                if not lead:
+                    break
+                request.done.clear()
+
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _take_batch(self):
+        with self.condition:
+            while self.pending_items < self.max_batch_size:
+                remaining = self.pending[0].arrived + self.max_wait - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+
+            batch, size = [], 0
+            while self.pending and (not batch or size + len(self.pending[0].items) <= self.max_batch_size):
+                request = self.pending.popleft()
+                batch.append(request)
+                size += len(request.items)
+            self.pending_items -= size
+            self.stats["batches"] += 1
+            self.stats["items"] += size
+            return batch
+
+    def _run_batch(self):
+        batch = self._take_batch()
+        try:
+            results = self.function([item for request in batch for item in request.items])
+            offset = 0
+            for request in batch:
+                request.result = results[offset:offset + len(request.items)]
+                offset += len(request.items)
+        except Exception as e:
+            for request in batch:
+                request.error = e
+        finally:
+            with self.condition:
+                # Hand over to the oldest waiting request, or stand down
+                if self.pending:
+                    self.pending[0].lead = True
+                    self.pending[0].done.set()
+                else:
+                    self.leading = False
+            for request in batch:
+                request.done.set()
+
+    def get_stats(self) -> dict:
+        batches = self.stats["batches"]
+        return {
+            **self.stats,
+            "mean_batch_size": round(self.stats["items"] / batches, 2) if batches else 0.0,
+        }
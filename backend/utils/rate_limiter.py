@@ -0,0 +1,240 @@
+import asyncio
+import os
+import time
+from collections import deque
+
+
+class ThrottledError(Exception):
+    """
+    Raised by a wrapped request when the provider answers 429 or 5xx.
+    """
+
+    def __init__(self, status: int, retry_after: float = None):
+        self.status = status
+        self.retry_after = retry_after
+        message = f"Provider throttled request: HTTP {status}"
+        if retry_after is not None:
+            message += f" (retry after {retry_after}s)"
+        super().__init__(message)
+
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header given in seconds. HTTP-date values are ignored.
+    """
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate` tokens/second, holding at most `capacity`.
+    Tokens are reserved up front, so callers queue in arrival order without a lock.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self) -> float:
+        """
+        Take one token, sleeping until it is available. Returns the time waited.
+        """
+        self._refill()
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+
+        wait = -self.tokens / self.rate
+        await asyncio.sleep(wait)
+        return wait
+
+
+class AIMDConcurrencyLimit:
+    """
+    Concurrency limit that grows additively on success and shrinks
+    multiplicatively when the provider pushes back (AIMD).
+    """
+
+    def __init__(self, initial: int, min_limit: int = 1, max_limit: int = 64, backoff: float = 0.5):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.in_flight = 0
+        self._waiters = deque()
+
+    async def acquire(self) -> bool:
+        """
+        Wait for a free slot. Returns True if the caller had to queue.
+        """
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed to us just before cancellation
+                self.release()
+            else:
+                self._waiters.remove(waiter)
+            raise
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def on_success(self):
+        self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        self._wake()
+
+    def on_throttle(self):
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+
+class ProviderRateLimiter:
+    """
+    Per-provider limiter: token bucket for request rate plus AIMD concurrency.
+    429/5xx responses shrink the concurrency limit, honour Retry-After and are
+    retried with exponential backoff before being re-raised.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: float,
+        initial_concurrency: int,
+        max_concurrency: int,
+        max_retries: int = 3,
+        base_backoff: float = 0.5,
+    ):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = AIMDConcurrencyLimit(initial_concurrency, max_limit=max_concurrency)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.cooldown_until = 0.0
+        self.counters = {
+            "requests": 0,
+            "queued": 0,
+            "throttled": 0,
+            "server_errors": 0,
+            "retries": 0,
+            "failed": 0,
+        }
+
+    async def _wait_for_cooldown(self) -> float:
+        wait = self.cooldown_until - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+            return wait
+        return 0.0
+
+    def _record_throttle(self, error: ThrottledError):
+        if error.status == 429:
+            self.counters["throttled"] += 1
+            if error.retry_after is not None:
+                self.cooldown_until = max(self.cooldown_until, time.monotonic() + error.retry_after)
+        else:
+            self.counters["server_errors"] += 1
+        self.concurrency.on_throttle()
+
+    async def call(self, request):
+        """
+        Run `request` (a zero-argument coroutine function) under the limiter.
+        """
+        attempt = 0
+        while True:
+            waited = await self._wait_for_cooldown()
+            waited += await self.bucket.acquire()
+            queued = await self.concurrency.acquire()
+            if waited or queued:
+                self.counters["queued"] += 1
+            self.counters["requests"] += 1
+
+            try:
+                result = await request()
+            except ThrottledError as e:
+                self.concurrency.release()
+                self._record_throttle(e)
+                if attempt >= self.max_retries:
+                    self.counters["failed"] += 1
+                    print(f"[WARN] {self.name} still throttled after {attempt} retries: {e}")
+                    raise
+                attempt += 1
+                self.counters["retries"] += 1
+                delay = e.retry_after if e.retry_after is not None else self.base_backoff * 2 ** (attempt - 1)
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self.concurrency.release()
+                raise
+
+            self.concurrency.release()
+            self.concurrency.on_success()
+            return result
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "concurrency_limit": round(self.concurrency.limit, 2),
+            "in_flight": self.concurrency.in_flight,
+            "waiting": len(self.concurrency._waiters),
+        }
+
+
+def _limiter_from_env(name: str, rate: float, burst: float, initial: int, maximum: int) -> ProviderRateLimiter:
+    prefix = name.upper()
+    return ProviderRateLimiter(
+        name=name,
+        rate=float(os.getenv(f"{prefix}_RATE_LIMIT_RPS", rate)),
+        burst=float(os.getenv(f"{prefix}_RATE_LIMIT_BURST", burst)),
+        initial_concurrency=int(os.getenv(f"{prefix}_INITIAL_CONCURRENCY", initial)),
+        max_concurrency=int(os.getenv(f"{prefix}_MAX_CONCURRENCY", maximum)),
+        max_retries=int(os.getenv(f"{prefix}_MAX_RETRIES", 3)),
+    )
+
+
+# Shared limiters, one per outbound provider
+rate_limiters = {
+    "yelp": _limiter_from_env("yelp", rate=10, burst=10, initial=8, maximum=32),
+    "reddit": _limiter_from_env("reddit", rate=1.5, burst=10, initial=4, maximum=8),
+}
+
+
+def get_rate_limiter(provider: str) -> ProviderRateLimiter:
+    """
+    Retrieve the shared limiter for a provider.
+    """
+    return rate_limiters[provider]
+
+
+def get_rate_limiter_stats() -> dict:
+    """
+    Counters for every provider limiter (requests, queued, throttled, ...).
+    """
+    return {name: limiter.stats() for name, limiter in rate_limiters.items()}
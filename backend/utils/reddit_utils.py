@@ -4,7 +4,12 @@ from dotenv import load_dotenv
 import aiohttp
 import certifi
 import ssl
-from asyncio import gather
+from asyncio import as_completed, ensure_future, gather
+from functools import partial
+from asyncprawcore.exceptions import ServerError, TooManyRequests
+from utils.rate_limiter import ThrottledError, get_rate_limiter, parse_retry_after
+from utils.singleflight import SingleFlight
+from services.reddit_store_service import get_stored_comments, get_stored_search, save_comments, save_search
 
 # SSL Context to Avoid Certificate Verification Errors
 ssl_context = ssl.create_default_context(cafile=certifi.where())
@@ -21,6 +26,49 @@ reddit = asyncpraw.Reddit(
     user_agent=os.getenv("REDDIT_USER_AGENT")
 )
 
+# Shared limiter for every outbound Reddit API call
+reddit_limiter = get_rate_limiter("reddit")
+
+# Coalesces identical concurrent searches / submission loads
+reddit_inflight = SingleFlight()
+
+
+async def _reddit_call(request):
+    """
+    Run a Reddit API request under the shared rate limiter.
+    429/5xx errors from asyncprawcore are retried by the limiter.
+    """
+    async def attempt():
+        try:
+            return await request()
+        except TooManyRequests as e:
+            raise ThrottledError(429, parse_retry_after(e.retry_after))
+        except ServerError as e:
+            raise ThrottledError(e.response.status)
+
+    return await reddit_limiter.call(attempt)
+
+
+async def _load_submission(post_id: str):
+    submission = await reddit.submission(id=post_id)
+    await submission.load()
+    return submission
+
+
+async def _search_subreddits(subreddits: list, query: str, limit: int, newer_than: float = None):
+    # "food+restaurants+Cooking" searches all listed subreddits in one request
+    subreddit_obj = await reddit.subreddit("+".join(subreddits))
+    if newer_than is None:
+        return [post async for post in subreddit_obj.search(query, limit=limit, sort="relevance")]
+
+    # Incremental refresh: walk newest-first and stop at the stored watermark
+    posts = []
+    async for post in subreddit_obj.search(query, limit=limit, sort="new"):
+        if post.created_utc <= newer_than:
+            break
+        posts.append(post)
+    return posts
+
 
 async def fetch_multiple_reddit_comments(posts):
     """
@@ -34,24 +82,40 @@ async def fetch_multiple_reddit_comments(posts):
     return [comment for comments in all_comments for comment in comments if comments]
 
 
+async def stream_reddit_comments(posts):
+    """
+    Fetch comments for multiple Reddit posts concurrently,
+    yielding each post's comments as soon as they are loaded.
+
+    :param posts: List of Reddit posts (with IDs).
+    :return: Async iterator of comment lists.
+    """
+    tasks = [ensure_future(fetch_reddit_comments(post["id"])) for post in posts]
+    try:
+        for next_done in as_completed(tasks):
+            comments = await next_done
+            if comments:
+                yield comments
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
 # Fetch Reddit posts based on a query
 async def fetch_reddit_posts(query: str, subreddits: list = None, limit: int = 5):
     """
-    Fetch Reddit posts by querying multiple subreddits concurrently.
+    Fetch Reddit posts with a single multi-subreddit search.
 
     :param query: Search term (e.g., dish or restaurant name).
     :param subreddits: List of subreddits to search in.
     :param limit: Max number of posts to fetch from each subreddit.
     :return: List of matching posts.
     """
-    posts = []
     subreddits = subreddits or ["food", "Cooking", "AskCulinary", "FoodPorn", "restaurants"]
 
-    tasks = [search_reddit_multiple_subs(query, [subreddit], limit) for subreddit in subreddits]
-    results = await gather(*tasks)
+    all_posts = await search_reddit_multiple_subs(query, subreddits, limit)
 
-    # Flatten results and remove duplicates by post ID
-    all_posts = [post for subreddit_posts in results for post in subreddit_posts]
+    # Remove duplicates by post ID
     unique_posts = list({post["id"]: post for post in all_posts}.values())
 
     print(f"Fetched {len(unique_posts)} Reddit posts for '{query}'")
@@ -62,24 +126,38 @@ async def fetch_reddit_posts(query: str, subreddits: list = None, limit: int = 5
 async def fetch_reddit_comments(post_id: str):
     """
     Fetch comments from a specific Reddit post by ID.
+    Concurrent requests for the same post share one API call.
 
     :param post_id: Reddit post ID.
     :return: List of comments from the post.
     """
+    return await reddit_inflight.do(("comments", post_id), _fetch_reddit_comments, post_id)
+
+
+async def _fetch_reddit_comments(post_id: str):
+    stored_comments = await get_stored_comments(post_id)
+    if stored_comments is not None:
+        print(f"Loaded {len(stored_comments)} stored Reddit comments for post '{post_id}'")
+        return stored_comments
+
     comments = []
     try:
-        submission = await reddit.submission(id=post_id)
-        await submission.load()
+        submission = await _reddit_call(partial(_load_submission, post_id))
 
         for top_level_comment in submission.comments:
             if isinstance(top_level_comment, asyncpraw.models.Comment):
                 comments.append({
+                    "id": top_level_comment.id,
                     "body": top_level_comment.body,
                     "score": top_level_comment.score,
                     "created_at": top_level_comment.created_utc
                 })
         print(f"Fetched {len(comments)} Reddit comments for post '{post_id}'")
+        await save_comments(post_id, comments)
         return comments
+    except ThrottledError as e:
+        print(f"[WARN] Reddit rate limit exhausted fetching comments for '{post_id}': {str(e)}")
+        return []
     except Exception as e:
         print(f"Error fetching Reddit comments: {str(e)}")
         return []
@@ -105,20 +183,15 @@ async def fetch_reddit_reviews(dish_name: str, restaurant_name: str = None, loca
     query = f"{dish_name} {restaurant_name or ''}".strip()
 
     try:
-        tasks = [fetch_reddit_posts(query,  subreddits=[subreddit] , limit = limit) for subreddit in subreddits]
-        results = await gather(*tasks)
-
-        for posts in results:
-            tasks = [fetch_reddit_comments(post["id"]) for post in posts]
-            comments = await gather(*tasks)
+        posts = await fetch_reddit_posts(query, subreddits=subreddits, limit=limit)
+        comments = await fetch_multiple_reddit_comments(posts)
 
-            # Flatten and filter matching comments
-            for post_comments in comments:
-                for comment in post_comments:
-                    if dish_name.lower() in comment["body"].lower() or (
-                        restaurant_name and restaurant_name.lower() in comment["body"].lower()
-                    ):
-                        reviews.append(comment)
+        # Filter matching comments
+        for comment in comments:
+            if dish_name.lower() in comment["body"].lower() or (
+                restaurant_name and restaurant_name.lower() in comment["body"].lower()
+            ):
+                reviews.append(comment)
 
         print(f"Fetched {len(reviews)} Reddit reviews for '{dish_name}'")
         return reviews
@@ -130,31 +203,52 @@ async def fetch_reddit_reviews(dish_name: str, restaurant_name: str = None, loca
 # Perform a search across multiple subreddits
 async def search_reddit_multiple_subs(query: str, subreddits: list, limit: int = 5):
     """
-    Perform a full-text search across multiple subreddits.
+    Perform a full-text search across multiple subreddits in one request.
+    Concurrent identical searches share one API call.
 
     :param query: Search term (dish or restaurant).
     :param subreddits: List of subreddits to search.
     :param limit: Number of posts to return per subreddit.
     :return: List of search results.
     """
+    key = ("search", query, tuple(subreddits), limit)
+    return await reddit_inflight.do(key, _search_reddit_multiple_subs, query, subreddits, limit)
+
+
+async def _search_reddit_multiple_subs(query: str, subreddits: list, limit: int):
+    stored = await get_stored_search(query, subreddits)
+    if stored:
+        stored_posts, watermark, is_fresh = stored
+        if is_fresh:
+            print(f"Loaded {len(stored_posts)} stored results for '{query}' across subreddits.")
+            return stored_posts
+    else:
+        stored_posts, watermark = [], None
+
     results = []
     try:
-        for subreddit in subreddits:
-            subreddit_obj = await reddit.subreddit(subreddit)
-            async for post in subreddit_obj.search(query, limit=limit, sort="relevance"):
-                results.append({
-                    "title": post.title,
-                    "url": post.url,
-                    "body": post.selftext,
-                    "subreddit": subreddit,
-                    "score": post.score,
-                    "id": getattr(post, "id", None)
-                })
+        posts = await _reddit_call(
+            partial(_search_subreddits, subreddits, query, limit * len(subreddits), newer_than=watermark)
+        )
+        for post in posts:
+            results.append({
+                "title": post.title,
+                "url": post.url,
+                "body": post.selftext,
+                "subreddit": post.subreddit.display_name,
+                "score": post.score,
+                "created_utc": post.created_utc,
+                "id": getattr(post, "id", None)
+            })
         print(f"Fetched {len(results)} results for '{query}' across subreddits.")
-        return results
+        await save_search(query, subreddits, results)
+        return results + stored_posts
+    except ThrottledError as e:
+        print(f"[WARN] Reddit rate limit exhausted searching '{query}': {str(e)}")
+        return stored_posts
     except Exception as e:
         print(f"Error searching Reddit: {str(e)}")
-        return []
+        return stored_posts
 
 
 # Fallback to comment search if post search fails
@@ -0,0 +1,24 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one in-flight task.
+    Every caller awaits the same result; the entry is dropped once it settles.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+
+    async def do(self, key, fn, *args, **kwargs):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        # Shield so one caller's cancellation doesn't cancel the shared call
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
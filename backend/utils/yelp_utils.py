@@ -1,6 +1,8 @@
 import aiohttp
+import asyncio
 import os
 from utils.error_utils import handle_api_error
+from utils.rate_limiter import ThrottledError, get_rate_limiter, parse_retry_after
 from dotenv import load_dotenv
 import ssl
 import certifi
@@ -13,53 +15,211 @@ YELP_API_KEY = os.getenv("YELP_API_KEY")
 YELP_SEARCH_ENDPOINT = "https://api.yelp.com/v3/businesses/search"
 YELP_REVIEWS_ENDPOINT = "https://api.yelp.com/v3/businesses/{}/reviews"
 
-# Pagination for Yelp Search (fetch up to 50 businesses)
-async def fetch_yelp_data(query: str, location: str, limit: int = 20):
+# HTTP client tuning (shared, app-scoped session)
+YELP_CONNECT_TIMEOUT = float(os.getenv("YELP_CONNECT_TIMEOUT", 5))
+YELP_READ_TIMEOUT = float(os.getenv("YELP_READ_TIMEOUT", 10))
+YELP_TOTAL_TIMEOUT = float(os.getenv("YELP_TOTAL_TIMEOUT", 30))
+YELP_MAX_CONNECTIONS = int(os.getenv("YELP_MAX_CONNECTIONS", 100))
+YELP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("YELP_MAX_CONNECTIONS_PER_HOST", 20))
+YELP_KEEPALIVE_TIMEOUT = float(os.getenv("YELP_KEEPALIVE_TIMEOUT", 30))
+YELP_DNS_CACHE_TTL = int(os.getenv("YELP_DNS_CACHE_TTL", 300))
+
+# Search pagination
+YELP_PAGE_SIZE = 50  # Yelp's maximum page size
+YELP_PAGE_CONCURRENCY = int(os.getenv("YELP_PAGE_CONCURRENCY", 4))
+YELP_CONCURRENT_PAGES = os.getenv("YELP_CONCURRENT_PAGES", "true").lower() == "true"
+
+# Review gathering (global budget across businesses)
+YELP_REVIEW_BUDGET = int(os.getenv("YELP_REVIEW_BUDGET", 12))
+YELP_REVIEWS_PER_BUSINESS = int(os.getenv("YELP_REVIEWS_PER_BUSINESS", 0)) or None
+YELP_REVIEW_DEADLINE = float(os.getenv("YELP_REVIEW_DEADLINE", 8))
+YELP_REVIEW_CONCURRENCY = int(os.getenv("YELP_REVIEW_CONCURRENCY", 5))
+
+# Singleton session, created at FastAPI startup and closed at shutdown
+yelp_session = None
+yelp_limiter = get_rate_limiter("yelp")
+
+
+async def init_yelp_session():
+    """
+    Create the shared Yelp HTTP session (keep-alive, per-host limits, DNS cache).
+    """
+    global yelp_session
+
+    if yelp_session is None or yelp_session.closed:
+        connector = aiohttp.TCPConnector(
+            ssl=ssl_context,
+            limit=YELP_MAX_CONNECTIONS,
+            limit_per_host=YELP_MAX_CONNECTIONS_PER_HOST,
+            use_dns_cache=True,
+            ttl_dns_cache=YELP_DNS_CACHE_TTL,
+            keepalive_timeout=YELP_KEEPALIVE_TIMEOUT,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=YELP_TOTAL_TIMEOUT,
+            connect=YELP_CONNECT_TIMEOUT,
+            sock_read=YELP_READ_TIMEOUT,
+        )
+        yelp_session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            headers={
+                "Authorization": f"Bearer {YELP_API_KEY}",
+                "Content-Type": "application/json"
+            },
+        )
+    return yelp_session
+
+
+async def close_yelp_session():
+    """
+    Close the shared Yelp HTTP session and its pooled connections.
+    """
+    global yelp_session
+
+    if yelp_session is not None and not yelp_session.closed:
+        await yelp_session.close()
+    yelp_session = None
+
+
+async def get_yelp_session():
+    """
+    Return the shared Yelp session, creating it lazily outside the app lifecycle.
+    """
+    if yelp_session is None or yelp_session.closed:
+        return await init_yelp_session()
+    return yelp_session
+
+
+async def _yelp_get(session, url: str, params: dict = None):
+    """
+    GET a Yelp endpoint through the shared rate limiter.
+    429/5xx responses are retried by the limiter; returns (status, payload).
+    """
+    async def request():
+        async with session.get(url, params=params) as response:
+            if response.status == 429 or response.status >= 500:
+                raise ThrottledError(response.status, parse_retry_after(response.headers.get("Retry-After")))
+            if response.status == 200:
+                return response.status, await response.json()
+            return response.status, await response.text()
+
+    return await yelp_limiter.call(request)
+
+
+async def _fetch_yelp_page(session, query: str, location: str, offset: int, page_limit: int):
+    """
+    Fetch a single page of businesses from the Yelp search endpoint.
+    """
+    params = {
+        "term": query,
+        "location": location,
+        "limit": page_limit,
+        "offset": offset,
+        "sort_by": "best_match"
+    }
+
+    status, data = await _yelp_get(session, YELP_SEARCH_ENDPOINT, params)
+    if status == 200:
+        return data.get('businesses', [])
+    raise Exception(f"Yelp API Error: {status} - {data}")
+
+
+async def _fetch_yelp_pages_concurrently(session, query: str, location: str, limit: int):
+    """
+    Fire all page offsets at once (bounded by a semaphore) and merge them in order.
+    A short page marks the end of the results, so later pages are cancelled.
+    """
+    semaphore = asyncio.Semaphore(YELP_PAGE_CONCURRENCY)
+    offsets = list(range(0, limit, YELP_PAGE_SIZE))
+
+    async def fetch_page(offset, page_limit):
+        async with semaphore:
+            return await _fetch_yelp_page(session, query, location, offset, page_limit)
+
+    page_limits = {offset: min(YELP_PAGE_SIZE, limit - offset) for offset in offsets}
+    task_offsets = {
+        asyncio.create_task(fetch_page(offset, page_limits[offset])): offset
+        for offset in offsets
+    }
+    pages = {}
+    last_offset = offsets[-1]
+    pending = set(task_offsets)
+
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                offset = task_offsets[task]
+                businesses = task.result()
+                pages[offset] = businesses
+
+                # Short page: nothing exists past this offset
+                if len(businesses) < page_limits[offset] and offset < last_offset:
+                    last_offset = offset
+                    for other in pending:
+                        if task_offsets[other] > offset:
+                            other.cancel()
+                    pending = {t for t in pending if task_offsets[t] <= offset}
+    finally:
+        for task in pending:
+            task.cancel()
+
+    return [
+        business
+        for offset in sorted(pages)
+        if offset <= last_offset
+        for business in pages[offset]
+    ][:limit]
+
+
+# Pagination for Yelp Search (fetch up to 50 businesses per page)
+async def fetch_yelp_data(query: str, location: str, limit: int = 20, concurrent: bool = None):
     """
     Fetch businesses from Yelp matching the dish and location.
 
     :param dish_name: Name of the dish to search for.
     :param location: Location of the restaurant.
     :param limit: Number of businesses to fetch.
+    :param concurrent: Fetch all pages concurrently instead of one by one
+                       (defaults to YELP_CONCURRENT_PAGES).
     :return: List of businesses.
     """
-    headers = {
-        "Authorization": f"Bearer {YELP_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    results = []
-    offset = 0
-    max_results = limit
-
-    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=ssl_context)) as session:
-        try:
-            while len(results) < max_results:
-                params = {
-                    "term": query,
-                    "location": location,
-                    "limit": min(50, max_results - len(results)),  # Max 50 per request
-                    "offset": offset,
-                    "sort_by": "best_match"
-                }
-
-                async with session.get(YELP_SEARCH_ENDPOINT, headers=headers, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        businesses = data.get('businesses', [])
-                        results.extend(businesses)
-                        offset += len(businesses)
-                        
-                        if len(businesses) == 0:  # No more results to fetch
-                            break
-                    else:
-                        raise Exception(f"Yelp API Error: {response.status} - {await response.text()}")
-            print(f"Fetched {len(results)} Yelp businesses for '{query}' in '{location}'")
-            return results
-        except Exception as e:
-            handle_api_error(e)
-            return []
-        finally:
-            await session.close()
+    if concurrent is None:
+        concurrent = YELP_CONCURRENT_PAGES
+
+    session = await get_yelp_session()
+    try:
+        if concurrent and limit > YELP_PAGE_SIZE:
+            results = await _fetch_yelp_pages_concurrently(session, query, location, limit)
+        else:
+            results = []
+            offset = 0
+            while len(results) < limit:
+                businesses = await _fetch_yelp_page(
+                    session, query, location, offset, min(YELP_PAGE_SIZE, limit - len(results))
+                )
+                results.extend(businesses)
+                offset += len(businesses)
+
+                if len(businesses) == 0:  # No more results to fetch
+                    break
+        print(f"Fetched {len(results)} Yelp businesses for '{query}' in '{location}'")
+        return results
+    except Exception as e:
+        handle_api_error(e)
+        return []
+
+
+async def _fetch_business_reviews(session, business_id: str):
+    """
+    Fetch the reviews of a single business. Non-200 responses yield no reviews.
+    """
+    status, data = await _yelp_get(session, YELP_REVIEWS_ENDPOINT.format(business_id))
+    if status == 200:
+        return data.get("reviews", [])
+    print(f"Failed to fetch reviews for {business_id}: {status}")
+    return []
 
 
 # Fetch multiple reviews by iterating through businesses
@@ -71,37 +231,117 @@ async def fetch_yelp_reviews_for_businesses(businesses: list, min_reviews: int =
     :param min_reviews: Minimum reviews required.
     :return: Aggregated list of reviews.
     """
-    headers = {
-        "Authorization": f"Bearer {YELP_API_KEY}",
-        "Content-Type": "application/json"
-    }
     aggregated_reviews = []
 
-    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=ssl_context)) as session:
-        try:
-            print(f"Fetching reviews for {len(businesses)} businesses...")
-            for business_id in businesses:
-                print(f"Fetching reviews for {business_id}...")
-                
-                url = YELP_REVIEWS_ENDPOINT.format(business_id)
-                async with session.get(url, headers=headers) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        reviews = data.get("reviews", [])
-                        aggregated_reviews.extend(reviews)
-
-                        print(f"Fetched {len(reviews)} reviews")
-
-                        # Stop once we reach the required number of reviews
-                        if len(aggregated_reviews) >= min_reviews:
-                            return aggregated_reviews
-                    else:
-                        print(f"Failed to fetch reviews")
-                        continue
-            return aggregated_reviews
-        except Exception as e:
-            handle_api_error(e)
-            return []
-        finally:
-            await session.close()
+    session = await get_yelp_session()
+    try:
+        print(f"Fetching reviews for {len(businesses)} businesses...")
+        for business_id in businesses:
+            print(f"Fetching reviews for {business_id}...")
+
+            reviews = await _fetch_business_reviews(session, business_id)
+            aggregated_reviews.extend(reviews)
+            print(f"Fetched {len(reviews)} reviews")
+
+            # Stop once we reach the required number of reviews
+            if len(aggregated_reviews) >= min_reviews:
+                return aggregated_reviews
+        return aggregated_reviews
+    except Exception as e:
+        handle_api_error(e)
+        return []
+
 
+async def stream_yelp_reviews(
+    business_ids: list,
+    review_budget: int = None,
+    per_business_cap: int = None,
+    deadline: float = None,
+):
+    """
+    Fetch reviews for many businesses concurrently until a global budget is met,
+    yielding each business's reviews as soon as they arrive.
+
+    Businesses are started in ranking order (bounded by YELP_REVIEW_CONCURRENCY).
+    Once `review_budget` reviews are collected or `deadline` seconds pass, the
+    remaining in-flight fetches are cancelled.
+
+    :param business_ids: Yelp business IDs, best match first.
+    :param review_budget: Total reviews wanted (defaults to YELP_REVIEW_BUDGET).
+    :param per_business_cap: Max reviews kept per business (None = no cap).
+    :param deadline: Seconds before giving up on outstanding fetches.
+    :return: Async iterator of review lists, each review tagged with its `business_id`.
+    """
+    review_budget = review_budget or YELP_REVIEW_BUDGET
+    per_business_cap = per_business_cap or YELP_REVIEWS_PER_BUSINESS
+    deadline = deadline or YELP_REVIEW_DEADLINE
+
+    if not business_ids:
+        return
+
+    session = await get_yelp_session()
+    semaphore = asyncio.Semaphore(YELP_REVIEW_CONCURRENCY)
+
+    async def fetch(business_id):
+        async with semaphore:
+            return await _fetch_business_reviews(session, business_id)
+
+    task_ids = {asyncio.create_task(fetch(business_id)): business_id for business_id in business_ids}
+    pending = set(task_ids)
+    collected = 0
+    loop = asyncio.get_running_loop()
+    stop_at = loop.time() + deadline
+
+    try:
+        while pending and collected < review_budget:
+            remaining = stop_at - loop.time()
+            if remaining <= 0:
+                print(f"[WARN] Yelp review deadline reached with {len(pending)} fetches outstanding.")
+                break
+
+            done, pending = await asyncio.wait(
+                pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                business_id = task_ids[task]
+                try:
+                    reviews = task.result()
+                except ThrottledError as e:
+                    print(f"[WARN] Yelp rate limit exhausted for {business_id}: {str(e)}")
+                    continue
+                except Exception as e:
+                    print(f"Error fetching reviews for {business_id}: {str(e)}")
+                    continue
+
+                if per_business_cap:
+                    reviews = reviews[:per_business_cap]
+                reviews = reviews[:review_budget - collected]
+                for review in reviews:
+                    review.setdefault("business_id", business_id)
+                collected += len(reviews)
+                if reviews:
+                    yield reviews
+                if collected >= review_budget:
+                    break
+    finally:
+        for task in pending:
+            task.cancel()
+        print(f"Gathered {collected} Yelp reviews, cancelled {len(pending)} outstanding fetches.")
+
+
+async def gather_yelp_reviews(
+    business_ids: list,
+    review_budget: int = None,
+    per_business_cap: int = None,
+    deadline: float = None,
+):
+    """
+    Collect the output of `stream_yelp_reviews` into a single list.
+
+    :return: List of reviews, each tagged with its `business_id`.
+    """
+    return [
+        review
+        async for reviews in stream_yelp_reviews(business_ids, review_budget, per_business_cap, deadline)
+        for review in reviews
+    ]